@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import mmap
+import contextlib
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from Store_Kochbuch import RecipeStore, write_json_atomic, ID, NAME, KAPITEL
+from Messung_Kochbuch import Messung, count
+
+# not .idx, that is the index file of makeindex next to Kochbuch.tex
+INDEX_SUFFIX = ".archiv"
+DATA_SUFFIX = ".dat"
+# materialised documents kept in memory
+CACHE_SIZE = 256
+# rewrite the data file once more than this share of it is old versions
+GARBAGE_SHARE = 0.5
+
+def data_path(index_path):
+    return index_path[:-len(INDEX_SUFFIX)] + DATA_SUFFIX
+
+def write_archive(index_path, documents, meta=None):
+    """Write documents as Kochbuch.dat (one JSON document per line) and
+    Kochbuch.archiv (ID, name, chapter and byte range of every document)."""
+    recipes = []
+    offset = 0
+    tmp = data_path(index_path) + ".tmp"
+    with Messung("archiv.write", path=index_path), open(tmp, "wb") as f:
+        for doc in documents:
+            line = json.dumps(doc, ensure_ascii=False).encode("utf-8") + b"\n"
+            f.write(line)
+            recipes.append([doc[ID], doc.get(NAME), doc.get(KAPITEL), offset, len(line)])
+            offset += len(line)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, data_path(index_path))
+    write_json_atomic(index_path, {"meta": meta or {}, "size": offset, "recipes": recipes})
+    return len(recipes)
+
+class ArchivRezept(Mapping):
+    """A recipe of an ArchivStore which is only read from the data file when
+    a field beyond ID, Name and Kapitel is used. Reads go through the
+    store's cache, so rendering a whole book does not keep it in memory."""
+
+    __slots__ = ("store", "recipe_id")
+
+    def __init__(self, store, recipe_id):
+        self.store = store
+        self.recipe_id = recipe_id
+
+    def __getitem__(self, key):
+        if key == ID:
+            return self.recipe_id
+        if key == NAME or key == KAPITEL:
+            entry = self.store.entries[self.recipe_id]
+            value = entry[0] if key == NAME else entry[1]
+            if value is not None:
+                return value
+        return self.store.get(self.recipe_id)[key]
+
+    def get(self, key, default=None):
+        # the renderers ask for most fields with get, spare Mapping.get's try/except
+        if key == ID:
+            return self.recipe_id
+        if key == NAME or key == KAPITEL:
+            entry = self.store.entries[self.recipe_id]
+            value = entry[0] if key == NAME else entry[1]
+            if value is not None:
+                return value
+        return self.store.get(self.recipe_id).get(key, default)
+
+    def __iter__(self):
+        return iter(self.store.get(self.recipe_id))
+
+    def __len__(self):
+        return len(self.store.get(self.recipe_id))
+
+class ArchivStore():
+    """RecipeStore on Kochbuch.archiv + Kochbuch.dat.
+
+    Opening reads only the index; documents are parsed from the memory-mapped
+    data file when they are asked for. Changes append the new version of a
+    document to the data file, commit() writes the index. Offers the same
+    operations as Store_Kochbuch.RecipeStore."""
+
+    def __init__(self, path):
+        self.path = path
+        self.data_path = data_path(path)
+        self.journal = None
+        with open(path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        self.meta = index.get("meta", {})
+        # not index["size"]: changes which were never committed (a crash, a
+        # killed GUI) leave lines after it, they count as old versions
+        self.size = os.path.getsize(self.data_path)
+        self.entries = {}       # id -> [name, kapitel, offset, length], in book order
+        self.by_name = {}
+        self.by_chapter = {}
+        self.live = 0
+        for recipe_id, name, kapitel, offset, length in index["recipes"]:
+            self.entries[recipe_id] = [name, kapitel, offset, length]
+            self.index(recipe_id)
+            self.live += length
+        self.next_id = 1 + max(self.entries, default=0)
+        self.cache = OrderedDict()
+        self.file = open(self.data_path, "rb")
+        self.map = None
+
+    def index(self, recipe_id):
+        name, kapitel = self.entries[recipe_id][:2]
+        self.by_name.setdefault(name, {})[recipe_id] = None
+        self.by_chapter.setdefault(kapitel, {})[recipe_id] = None
+
+    def unindex(self, recipe_id):
+        name, kapitel = self.entries[recipe_id][:2]
+        for index, key in ((self.by_name, name), (self.by_chapter, kapitel)):
+            ids = index.get(key)
+            if ids is not None:
+                ids.pop(recipe_id, None)
+                if not ids:
+                    del index[key]
+
+    def close(self):
+        if self.map:
+            self.map.close()
+        self.file.close()
+
+    def read(self, recipe_id):
+        _, _, offset, length = self.entries[recipe_id]
+        if self.map is None or offset + length > len(self.map):
+            # (re)map after the file has grown
+            if self.map:
+                self.map.close()
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        count("archiv.reads")
+        return json.loads(self.map[offset:offset + length])
+
+    # === queries ===
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        # not through the cache, a pass over the book would only flush it
+        for recipe_id in list(self.entries):
+            yield self.cache.get(recipe_id) or self.read(recipe_id)
+
+    def __contains__(self, recipe_id):
+        return recipe_id in self.entries
+
+    @property
+    def documents(self):
+        """All recipes in book order as ArchivRezept, nothing is read yet."""
+        return [ArchivRezept(self, recipe_id) for recipe_id in self.entries]
+
+    def overview(self):
+        """(ID, Name, Kapitel) of every recipe, from the index alone."""
+        for recipe_id, (name, kapitel, _, _) in self.entries.items():
+            yield recipe_id, name, kapitel
+
+    def get(self, recipe_id):
+        doc = self.cache.get(recipe_id)
+        if doc is not None:
+            self.cache.move_to_end(recipe_id)
+            return doc
+        if recipe_id not in self.entries:
+            return None
+        doc = self.cache[recipe_id] = self.read(recipe_id)
+        if len(self.cache) > CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return doc
+
+    def has_name(self, name):
+        return name in self.by_name
+
+    def find(self, name):
+        return [self.get(i) for i in self.by_name.get(name, ())]
+
+    def chapter(self, kapitel):
+        return [self.get(i) for i in self.by_chapter.get(kapitel, ())]
+
+    def chapters(self):
+        return list(self.by_chapter)
+
+    # === changes ===
+    def write(self, doc):
+        line = json.dumps(doc, ensure_ascii=False).encode("utf-8") + b"\n"
+        with open(self.data_path, "ab") as f:
+            # the real end of the file, see __init__
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            f.write(line)
+        entry = [doc.get(NAME), doc.get(KAPITEL), offset, len(line)]
+        self.size = offset + len(line)
+        self.live += len(line)
+        return entry
+
+    def add(self, doc, recipe_id=None):
+        """Append doc to the book and return its ID."""
+        doc[ID] = recipe_id or self.next_id
+        self.next_id = max(self.next_id, doc[ID] + 1)
+        self.entries[doc[ID]] = self.write(doc)
+        self.index(doc[ID])
+        self.cache[doc[ID]] = doc
+        return doc[ID]
+
+    def update(self, recipe_id, changes):
+        doc = dict(self.get(recipe_id))
+        doc.update(changes)
+        doc[ID] = recipe_id
+        self.unindex(recipe_id)
+        self.live -= self.entries[recipe_id][3]
+        # keeps the position of the recipe in the book
+        self.entries[recipe_id] = self.write(doc)
+        self.index(recipe_id)
+        self.cache[recipe_id] = doc
+        return doc
+
+    def remove(self, recipe_id):
+        doc = self.get(recipe_id)
+        self.unindex(recipe_id)
+        self.live -= self.entries.pop(recipe_id)[3]
+        self.cache.pop(recipe_id, None)
+        return doc
+
+    def commit(self, compact=True):
+        """Make the changes durable: sync the data file, then write the index
+        (or rewrite both when most of the data file is old versions, unless
+        compact is False, as for the autosave thread of the GUI)."""
+        if compact and self.size and self.live < self.size * (1 - GARBAGE_SHARE):
+            self.compact()
+            return
+        with open(self.data_path, "ab") as f:
+            os.fsync(f.fileno())
+        recipes = [[recipe_id, *entry] for recipe_id, entry in self.entries.items()]
+        write_json_atomic(self.path, {"meta": self.meta, "size": self.size, "recipes": recipes})
+
+    def compact(self):
+        documents = list(self)
+        if self.map:
+            self.map.close()
+            self.map = None
+        self.file.close()
+        write_archive(self.path, documents, self.meta)
+        self.__init__(self.path)
+
+    @contextlib.contextmanager
+    def batch(self):
+        yield
+        self.commit()
+
+    # === JSON compatibility ===
+    def export_data(self):
+        data = dict(self.meta)
+        keys = data.pop("keys", ["total", "documents"])
+        data["documents"] = list(self)
+        data["total"] = len(data["documents"])
+        return {key: data[key] for key in keys if key in data}
+
+def import_json(json_path, index_path):
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    keys = list(data)
+    documents = data.pop("documents")
+    # assigns IDs to documents which have none yet, the same way the JSON tools do
+    RecipeStore(documents)
+    data.pop("total", None)
+    data["keys"] = keys
+    return write_archive(index_path, documents, data)
+
+def main():
+    if len(sys.argv) != 4 or sys.argv[1] not in ("import", "export"):
+        print("Aufruf: python Archiv_Kochbuch.py import Kochbuch.json Kochbuch.archiv")
+        print("        python Archiv_Kochbuch.py export Kochbuch.archiv Kochbuch.json")
+        sys.exit(1)
+    command, source, target = sys.argv[1:]
+    if command == "import":
+        recipes = import_json(source, target)
+        print(f"✅ Wrote {recipes} recipes to {target} and {data_path(target)}")
+    else:
+        store = ArchivStore(source)
+        write_json_atomic(target, store.export_data())
+        print(f"✅ Exported {len(store)} recipes to {target}")
+        store.close()
+
+if __name__ == "__main__":
+    main()
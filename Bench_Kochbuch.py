@@ -0,0 +1,978 @@
+import io
+import os
+import re
+import sys
+import json
+import time
+import socket
+import asyncio
+import types
+import shutil
+import random
+import argparse
+import platform
+import textwrap
+import itertools
+import subprocess
+import tempfile
+import contextlib
+import urllib.request
+from urllib.parse import quote
+
+try:
+    from PIL import Image
+except ImportError:
+    # only the generated corpus has pictures, the other benchmarks run without
+    Image = None
+
+from TeX_Kochbuch import KochbuchTex
+from Suche_Kochbuch import SuchIndex
+from Store_Kochbuch import KochbuchDatei, write_json_atomic
+from Parser_Kochbuch import parse_ingredients, parse_text, normalize_list, parse_ingredient
+from Einkauf_Kochbuch import ZutatenTabelle, item_key, BASIS
+from Dubletten_Kochbuch import DublettenIndex, signature, similarity
+from Archiv_Kochbuch import ArchivStore, import_json, write_archive
+from Extend_Kochbuch import Kochbuch
+from Vorrat_Kochbuch import ZutatenIndex
+
+ZUTATEN = ["Mehl", "Zucker", "Eier", "Butter", "Milch", "Salz", "Zimt", "Honig", "Quark",
+           "Zwiebeln", "Knoblauch", "Kartoffeln", "Möhren", "Sahne", "Äpfel", "Nüsse"]
+EINHEITEN = ["g", "EL", "TL", "ml", "Prise", "Päckchen", ""]
+
+def load_kapitel():
+    with open("Kapitel.json", "r", encoding="utf-8") as kap_file:
+        return json.load(kap_file)
+
+def synthetic_documents(count, kapitel, seed=42):
+    rnd = random.Random(seed)
+    documents = []
+    for i in range(count):
+        documents.append({
+            "Name": f"Rezept {i}",
+            "Kapitel": rnd.choice(kapitel),
+            "Serves": rnd.randint(1, 8),
+            "Dauer": rnd.choice([10, 20, 30, 45, 60, 90]),
+            "Zutaten": [f"{rnd.randint(1, 500)} {rnd.choice(EINHEITEN)} {rnd.choice(ZUTATEN)}".replace("  ", " ")
+                        for _ in range(rnd.randint(3, 12))],
+            "Anleitung": [f"Schritt {n}: {rnd.choice(ZUTATEN)} verrühren & 5% ziehen lassen."
+                          for n in range(rnd.randint(2, 8))],
+            "Bild": [],
+            "Notes": "",
+        })
+    return documents
+
+def synthetic_kochbuch(count, kapitel):
+    kochbuch = KochbuchTex.__new__(KochbuchTex)
+    documents = synthetic_documents(count, kapitel)
+    kochbuch.kochbuch = {"total": len(documents), "documents": documents}
+    # what __init__ sets besides the book
+    kochbuch.image_paths = None
+    kochbuch.appendix = ""
+    kochbuch.labels = {}
+    return kochbuch
+
+def timed(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def scan_documents(kochbuch, kapitel):
+    # the chapters x documents scan generate_tex used before group_documents
+    return {kap: [doc for doc in kochbuch.kochbuch["documents"] if doc.get("Kapitel") == kap]
+            for kap in kapitel}
+
+def bench_grouping(count=50000):
+    kapitel = load_kapitel()
+    kochbuch = synthetic_kochbuch(count, kapitel)
+    assert scan_documents(kochbuch, kapitel) == kochbuch.group_documents(kapitel)
+
+    old = timed(lambda: scan_documents(kochbuch, kapitel))
+    new = timed(lambda: kochbuch.group_documents(kapitel))
+    print(f"Grouping {count} recipes into {len(kapitel)} chapters")
+    print(f"  scan    : {old * 1000:8.1f} ms")
+    print(f"  grouped : {new * 1000:8.1f} ms  ({old / new:.1f}x)")
+
+    def render():
+        groups = kochbuch.group_documents(kapitel)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()):
+            count = 0
+            for kap in kapitel:
+                count = kochbuch.write_chapter(out, kap, groups[kap], count)
+    print(f"  render  : {timed(render, 1) * 1000:8.1f} ms")
+
+def legacy_render_recipe(doc):
+    # the f.write/re.sub renderer generate_tex used before render_recipe, kept as a reference
+    def latex_escape(s):
+        return re.sub(r'([#\$%&\~_\^\{\\\}])', r'\\\1', str(s))
+    def normalize_list(field):
+        if isinstance(field, str):
+            return [p.strip() for p in re.split(r'[\r\n]+|,', field) if p.strip()]
+        return [str(x) for x in field or []]
+    f = io.StringIO()
+    title_tex = latex_escape(doc.get("Name","Unnamed"))
+    f.write(f"\\section{{{title_tex}}}\n")
+    # was \\index{title} until the index was generated by render_index
+    f.write(f"\\label{{rezept:{doc.get('ID')}}}\n")
+    f.write("\\RecipeMeta{" + f"{doc.get('Serves', 1)}" + "}{" + f"{doc.get('Dauer', 10)}" + "}\n")
+    for env, field in (("ingredients", "Zutaten"), ("directions", "Anleitung")):
+        items = normalize_list(doc.get(field, []))
+        if items:
+            f.write(f"\\begin{{{env}}}\n")
+            for item in items:
+                f.write(f"  \\item {latex_escape(item)}\n")
+            f.write(f"\\end{{{env}}}\n")
+    image_files = doc.get("Bild")
+    if image_files and isinstance(image_files, list):
+        f.write("\\begin{figure}[h]\n")
+        f.write("\\centering\n")
+        for image_file in image_files:
+            file_path = f"Bilder/{image_file}"
+            if os.path.isfile(file_path):
+                f.write(f"\\includegraphics[width=0.8\\textwidth]{{{latex_escape(file_path)}}}\n")
+        f.write(f"\\caption{{{title_tex}}}\n")
+        f.write("\\end{figure}\n")
+    if doc.get("Notes", ""):
+        f.write("\\Notes{" + latex_escape(doc["Notes"]) + "}\n")
+    f.write("\\newpage\n")
+    return f.getvalue()
+
+def bench_render(count=20000):
+    kapitel = load_kapitel()
+    kochbuch = synthetic_kochbuch(count, kapitel)
+    with open("Kochbuch.json", "r", encoding="utf-8") as f:
+        documents = json.load(f)["documents"] + kochbuch.kochbuch["documents"]
+    for doc in documents:
+        assert kochbuch.render_recipe(doc) == legacy_render_recipe(doc), doc.get("Name")
+
+    old = timed(lambda: [legacy_render_recipe(doc) for doc in documents])
+    new = timed(lambda: [kochbuch.render_recipe(doc) for doc in documents])
+    print(f"Rendering {len(documents)} recipes (output identical)")
+    print(f"  legacy   : {old / len(documents) * 1e6:8.1f} us/recipe")
+    print(f"  renderer : {new / len(documents) * 1e6:8.1f} us/recipe  ({old / new:.1f}x)")
+
+def bench_search(count=100000):
+    documents = synthetic_documents(count, load_kapitel())
+    start = time.perf_counter()
+    index = SuchIndex(enumerate(documents))
+    print(f"Indexing {count} recipes: {time.perf_counter() - start:.1f} s, {len(index.words)} words")
+    for query in ("zimt", "zimt mehl", "kartoffeln sahne zwiebeln", "rezept 4711", "äpfel"):
+        hits = len(index.search(query))
+        per_query = timed(lambda: index.search(query), 5)
+        print(f"  {query!r:30} {hits:7} hits {per_query * 1000:8.2f} ms")
+    per_update = timed(lambda: index.update(0, documents[0]), 5)
+    print(f"  update one recipe             {per_update * 1000:8.2f} ms")
+
+def bench_journal(sizes=(1000, 10000, 100000)):
+    print("Edit latency: full rewrite vs. journal entry")
+    kapitel = load_kapitel()
+    for count in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "Kochbuch.json")
+            data = {"total": count, "documents": synthetic_documents(count, kapitel)}
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=4)
+            datei = KochbuchDatei(path, compact_after=10 ** 9)
+            data, store = datei.load(read_only=False)
+
+            def rewrite():
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, indent=4)
+            old = timed(rewrite)
+            new = timed(lambda: store.update(1, {"Notes": "geändert"}), 20)
+            load = timed(datei.load, 1)
+            print(f"  {count:7} recipes: rewrite {old * 1000:9.1f} ms  journal {new * 1000:6.2f} ms  load+replay {load * 1000:8.1f} ms")
+
+def bench_parser(repeat=20):
+    with open("Kochbuch.json", "r", encoding="utf-8") as f:
+        documents = json.load(f)["documents"]
+    zutaten = [normalize_list(doc.get("Zutaten")) for doc in documents]
+    lines = sum(len(z) for z in zutaten)
+    # the recipes as a photo would read: ingredients, then the steps
+    texts = ["\n".join(z + normalize_list(doc.get("Anleitung"))) for z, doc in zip(zutaten, documents)]
+    unparsed = sum(1 for z in zutaten for m in parse_ingredients(z) if m["Menge"] is None)
+
+    per_corpus = timed(lambda: [parse_ingredients(z) for z in zutaten], repeat)
+    print(f"Parsing {lines} ingredients of {len(documents)} recipes ({unparsed} without amount)")
+    print(f"  ingredients : {per_corpus * 1000:8.2f} ms  {lines / per_corpus:10.0f} lines/s")
+    per_text = timed(lambda: [parse_text(t) for t in texts], repeat)
+    print(f"  full texts  : {per_text * 1000:8.2f} ms  {len(texts) / per_text:10.0f} recipes/s")
+
+def einkauf_per_string(documents, portionen):
+    # parse and add up the ingredient strings on every request
+    sums = {}
+    for doc in documents:
+        factor = portionen / doc["Serves"]
+        for text in doc["Zutaten"]:
+            entry = parse_ingredient(text)
+            unit, unit_factor = BASIS.get(entry["Einheit"], (entry["Einheit"], 1))
+            key = (item_key(entry["Zutat"])[1], unit)
+            if entry["Menge"]:
+                von, bis = sums.get(key, (0, 0))
+                sums[key] = (von + entry["Menge"][0] * unit_factor * factor, bis + entry["Menge"][1] * unit_factor * factor)
+            else:
+                sums.setdefault(key, (0, 0))
+    return sums
+
+def bench_einkauf(count=100000, selected=(10, 1000, 100000)):
+    documents = synthetic_documents(count, load_kapitel())
+    for i, doc in enumerate(documents):
+        doc["ID"] = i
+    start = time.perf_counter()
+    tabelle = ZutatenTabelle(documents)
+    print(f"Ingredient table of {count} recipes: {len(tabelle)} rows, {time.perf_counter() - start:.1f} s")
+    for n in selected:
+        ids = list(range(n))
+        old = timed(lambda: einkauf_per_string(documents[:n], 4), 1)
+        new = timed(lambda: tabelle.einkaufsliste(ids, 4), 3)
+        print(f"  {n:7} recipes: per string {old * 1000:9.1f} ms  table {new * 1000:8.1f} ms  ({old / new:.1f}x)")
+
+def bench_dubletten(count=100000, share=0.01):
+    # synthetic_documents repeats a few step phrases; a larger vocabulary
+    # is closer to how real instructions differ
+    rnd = random.Random(7)
+    vocabulary = [f"wort{i}" for i in range(5000)]
+    documents = synthetic_documents(count, load_kapitel())
+    for doc in documents:
+        doc["Anleitung"] = [" ".join(rnd.choices(vocabulary, k=rnd.randint(6, 14))) for _ in doc["Anleitung"]]
+    # retyped copies: one ingredient less, one step reworded
+    copies = []
+    for original in rnd.sample(range(count), int(count * share)):
+        doc = json.loads(json.dumps(documents[original]))
+        doc["Name"] += " (Kopie)"
+        doc["Zutaten"].pop(rnd.randrange(len(doc["Zutaten"])))
+        doc["Anleitung"][0] = " ".join(rnd.choices(vocabulary, k=8))
+        copies.append((original, len(documents)))
+        documents.append(doc)
+
+    start = time.perf_counter()
+    index = DublettenIndex(enumerate(documents))
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    pairs = index.pairs()
+    find = time.perf_counter() - start
+    found = {(a, b) for a, b, _ in pairs}
+    recall = sum((o, c) in found for o, c in copies) / len(copies)
+    print(f"Near-duplicates in {len(documents)} recipes ({len(copies)} retyped copies)")
+    print(f"  signatures + LSH index : {build:8.1f} s")
+    print(f"  all pairs via buckets  : {find:8.1f} s  {len(pairs)} pairs, recall {recall:.1%}")
+    lookup = timed(lambda: index.similar(documents[-1]), 5)
+    print(f"  lookup of one recipe   : {lookup * 1000:8.2f} ms")
+    sig = signature(documents[-1])
+    signatures = list(index.signatures.values())
+    scan = timed(lambda: [similarity(sig, other) for other in signatures], 1)
+    print(f"  linear scan, one recipe: {scan * 1000:8.2f} ms, all pairs would take ~{scan * len(signatures) / 2 / 3600:.1f} h")
+
+def bench_vorrat(count=100000, vocabulary=5000, pantry=40):
+    # a few ingredients in most recipes, a long tail in few (Zipf-like)
+    rnd = random.Random(11)
+    names = ZUTATEN + [f"Zutat{i}" for i in range(vocabulary - len(ZUTATEN))]
+    weights = [1 / (i + 1) for i in range(len(names))]
+    documents = synthetic_documents(count, load_kapitel())
+    for i, doc in enumerate(documents):
+        doc["ID"] = i
+        doc["Zutaten"] = [f"{rnd.randint(1, 500)} g {name}" for name in rnd.choices(names, weights, k=rnd.randint(3, 12))]
+    start = time.perf_counter()
+    index = ZutatenIndex(documents)
+    print(f"Ingredient bitsets of {count} recipes, {len(index.bits)} ingredients: {time.perf_counter() - start:.1f} s")
+    # the per-recipe loop the bitsets replace, ingredients already as sets
+    recipe_items = [set(items) for items in index.items]
+    vorrat = [item_key(name)[1] for name in names[:pantry]]
+    pantry_set = set(vorrat)
+    for max_missing in (0, 1, 2):
+        loop = timed(lambda: [i for i, items in enumerate(recipe_items)
+                              if items and len(items - pantry_set) <= max_missing], 3)
+        bits = timed(lambda: index.cookable(vorrat, max_missing), 3)
+        found = index.cookable(vorrat, max_missing).bit_count()
+        print(f"  pantry of {pantry}, {max_missing} missing: loop {loop * 1000:8.1f} ms  bitsets {bits * 1000:8.1f} ms"
+              f"  ({loop / bits:.1f}x, {found} recipes)")
+    both = vorrat[2:4]
+    limits = {"kapitel": documents[0]["Kapitel"], "dauer": 30, "serves": 4}
+    loop = timed(lambda: [doc for doc, items in zip(documents, recipe_items)
+                          if all(item in items for item in both) and doc["Kapitel"] == limits["kapitel"]
+                          and doc["Dauer"] <= 30 and doc["Serves"] >= 4], 3)
+    bits = timed(lambda: index.using_all(both, **limits), 3)
+    print(f"  all of {len(both)} + chapter/Dauer/Serves: loop {loop * 1000:8.1f} ms  bitsets {bits * 1000:8.2f} ms  ({loop / bits:.0f}x)")
+
+# run in a fresh interpreter each, prints seconds and peak RSS in MB (Linux)
+COLD_START = {
+    # what Review_Kochbuch.py does before the window shows: open the book, list names and chapters
+    "gui": """
+from Review_Kochbuch import RecipeBook
+book = RecipeBook.__new__(RecipeBook)
+book.load_recipes(sys.argv[1])
+list(book.store.overview())
+""",
+    "tex": """
+from TeX_Kochbuch import KochbuchTex
+kochbuch = KochbuchTex(sys.argv[1])
+with open(os.devnull, "w", encoding="utf-8") as f:
+    f.writelines(kochbuch.iter_tex(None, None, verbose=False))
+""",
+}
+COLD_START_FRAME = """
+import os, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+{code}
+# VmHWM, ru_maxrss would include the parent process the benchmark forked from
+with open("/proc/self/status") as status:
+    peak = next(int(line.split()[1]) for line in status if line.startswith("VmHWM"))
+print(time.perf_counter() - start, peak / 1024)
+"""
+
+def check_archiv_crash(tmp):
+    """An add which was never committed must not shift the offsets of later ones."""
+    archiv = os.path.join(tmp, "Absturz.archiv")
+    write_archive(archiv, [{"ID": 1, "Name": "Alt", "Kapitel": "Suppen"}])
+    store = ArchivStore(archiv)
+    store.add({"Name": "Verloren", "Kapitel": "Suppen"})
+    store.close()
+    store = ArchivStore(archiv)
+    recipe_id = store.add({"Name": "Neu", "Kapitel": "Suppen"})
+    store.commit(compact=False)
+    store.close()
+    store = ArchivStore(archiv)
+    assert store.get(recipe_id)["Name"] == "Neu"
+    assert [doc["Name"] for doc in store] == ["Alt", "Neu"]
+    store.close()
+
+def bench_archiv(count=100000):
+    print(f"Cold start on {count} recipes: Kochbuch.json vs. Kochbuch.archiv")
+    root = os.path.dirname(os.path.abspath(__file__))
+    kapitel = load_kapitel()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "Kochbuch.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"total": count, "documents": synthetic_documents(count, kapitel)}, f, ensure_ascii=False, indent=4)
+        with open(os.path.join(tmp, "Kapitel.json"), "w", encoding="utf-8") as f:
+            json.dump(kapitel, f, ensure_ascii=False)
+        check_archiv_crash(tmp)
+        archiv = os.path.join(tmp, "Kochbuch.archiv")
+        import_json(path, archiv)
+        for name, code in COLD_START.items():
+            for book in (path, archiv):
+                script = COLD_START_FRAME.format(root=root, code=code)
+                out = subprocess.run([sys.executable, "-c", script, book], cwd=tmp,
+                                     capture_output=True, text=True, check=True).stdout
+                seconds, rss = (float(v) for v in out.split()[-2:])
+                print(f"  {name:4} {os.path.basename(book):16} {seconds:6.2f} s  {rss:7.0f} MB")
+
+# === Suite: a generated corpus through all three tools, with a history ===
+
+HISTORY_PATH = os.path.join("Build", "bench_history.json")
+# a result counts as a regression when it is this much slower than the median of the last runs
+DEFAULT_THRESHOLD = 0.25
+THRESHOLDS = {
+    # a few milliseconds each, noisier than the rest
+    "search.query": 0.5,
+    "gui.edit": 0.5,
+    # mostly fsync
+    "json.dump": 0.5,
+    "gui.close": 0.5,
+    "import.save": 0.5,
+}
+# differences below this many seconds are noise, whatever the ratio
+MIN_DIFFERENCE = 0.005
+HISTORY_WINDOW = 5
+# share of the imported recipes that are already in the book, by name and retyped
+IMPORT_DUPLICATES = 0.05
+IMPORT_SIMILAR = 0.05
+SEARCH_QUERIES = ["Kartoffel", "Zwiebeln Sahne", "Apfel Zimt", "Lachs", "schnelle Suppe", "Quark"]
+
+# name, units, smallest and largest amount, weight (how often it is used)
+CORPUS_ZUTATEN = [
+    ("Salz", ["Prise", "TL", ""], 1, 2, 40), ("Pfeffer", ["Prise", ""], 1, 2, 30),
+    ("Zwiebeln", [""], 1, 4, 25), ("Knoblauchzehen", [""], 1, 4, 15), ("Butter", ["g", "EL"], 1, 250, 25),
+    ("Olivenöl", ["EL", "ml"], 1, 100, 15), ("Mehl", ["g", "EL"], 2, 500, 25), ("Zucker", ["g", "EL", "TL"], 1, 250, 25),
+    ("Eier", [""], 1, 6, 25), ("Milch", ["ml", "l"], 1, 500, 15), ("Sahne", ["ml", "Becher"], 1, 400, 12),
+    ("Schmand", ["Becher", "g"], 1, 200, 5), ("Quark", ["g", "Päckchen"], 1, 500, 6), ("Backpulver", ["Päckchen", "TL"], 1, 2, 8),
+    ("Vanillezucker", ["Päckchen"], 1, 2, 6), ("Zimt", ["TL", "Prise"], 1, 2, 5), ("Honig", ["EL", "TL"], 1, 4, 5),
+    ("Kartoffeln", ["g", "kg", ""], 1, 1000, 12), ("Möhren", ["", "g"], 1, 500, 10), ("Lauch", ["Stange", ""], 1, 2, 5),
+    ("Sellerie", ["g", "Stange"], 1, 300, 4), ("Tomaten", ["", "g", "Dose"], 1, 800, 10), ("Paprikaschoten", [""], 1, 3, 6),
+    ("Zucchini", [""], 1, 3, 5), ("Champignons", ["g"], 100, 500, 5), ("Spinat", ["g"], 100, 800, 4),
+    ("Rinderhackfleisch", ["g"], 200, 1000, 6), ("Schweinebraten", ["kg", "g"], 1, 1500, 3), ("Hähnchenbrust", ["g", ""], 1, 800, 6),
+    ("Lachsfilet", ["g", ""], 1, 600, 4), ("Speck", ["g"], 50, 200, 5), ("Gemüsebrühe", ["ml", "l", "TL"], 1, 1000, 12),
+    ("Weißwein", ["ml"], 50, 250, 4), ("Reis", ["g"], 150, 400, 5), ("Nudeln", ["g"], 200, 500, 6),
+    ("Parmesan", ["g"], 30, 150, 6), ("Emmentaler", ["g"], 50, 250, 4), ("Petersilie", ["Bund", "EL"], 1, 2, 10),
+    ("Schnittlauch", ["Bund", "EL"], 1, 2, 6), ("Dill", ["Bund", "TL"], 1, 2, 3), ("Zitrone", ["", "EL"], 1, 2, 8),
+    ("Äpfel", ["", "g"], 1, 1000, 6), ("gemahlene Mandeln", ["g"], 50, 200, 5), ("Haselnüsse", ["g"], 50, 200, 4),
+    ("Schokolade", ["g", "Tafel"], 1, 200, 5), ("Puderzucker", ["g", "EL"], 1, 200, 5), ("Hefe", ["Würfel", "Päckchen"], 1, 1, 4),
+    ("Senf", ["TL", "EL"], 1, 2, 5), ("Essig", ["EL"], 1, 4, 5), ("Weißkohl", ["", "g"], 1, 1000, 2),
+    ("Rote Bete", ["", "g"], 1, 500, 2), ("Kichererbsen", ["Dose", "g"], 1, 400, 3), ("Kokosmilch", ["Dose", "ml"], 1, 400, 3),
+    ("Ingwer", ["cm", "TL"], 1, 3, 4), ("Currypulver", ["TL", "EL"], 1, 2, 3), ("Paprikapulver", ["TL"], 1, 2, 6),
+    ("Muskatnuss", ["Prise"], 1, 1, 6), ("Lorbeerblätter", [""], 1, 3, 4), ("Thymian", ["TL", "Zweige"], 1, 3, 4),
+]
+CORPUS_FORMEN = ["nach Belieben", "oder mehr", "zimmerwarm", "frisch", "aus dem Kühlschrank"]
+# seasonings and staples, a dish is named after one of the other ingredients
+CORPUS_GRUNDZUTATEN = {"Salz", "Pfeffer", "Zwiebeln", "Knoblauchzehen", "Butter", "Olivenöl", "Mehl", "Zucker", "Eier", "Milch",
+                       "Backpulver", "Vanillezucker", "Zimt", "Gemüsebrühe", "Petersilie", "Schnittlauch", "Dill", "Senf",
+                       "Essig", "Ingwer", "Currypulver", "Paprikapulver", "Muskatnuss", "Lorbeerblätter", "Thymian",
+                       "Puderzucker", "Hefe", "Weißwein", "Honig", "Zitrone"}
+CORPUS_GERICHTE = ["Auflauf", "Suppe", "Eintopf", "Salat", "Kuchen", "Torte", "Pfanne", "Gratin", "Braten", "Risotto",
+                   "Quiche", "Plätzchen", "Knödel", "Strudel", "Curry", "Frikadellen", "Pfannkuchen", "Muffins", "Dip", "Creme"]
+CORPUS_ART = ["", "", "", "Schneller ", "Omas ", "Bayerischer ", "Einfacher ", "Herbstlicher ", "Feiner ", "Bunter "]
+# a step is put together from these, so that instructions differ like real ones
+CORPUS_SCHRITTE = [
+    "{zutat} waschen, putzen und {schnitt}",
+    "{zutat} schälen und {schnitt}",
+    "{zutat} in {fett} {garen}",
+    "{zutat} mit {zutat2} verrühren",
+    "{zutat} und {zutat2} in einer Schüssel vermengen",
+    "Den Backofen auf {grad} °C vorheizen",
+    "{zutat} mit {zutat2} abschmecken",
+    "{zutat} unterheben",
+    "{zutat} zugeben und {minuten} Minuten köcheln lassen",
+    "Die Masse in eine gefettete Form füllen und {minuten} Minuten bei {grad} °C backen",
+    "Den Teig aus {zutat} und {zutat2} kneten und {minuten} Minuten ruhen lassen",
+    "{zutat} mit {zutat2} bestreuen",
+    "{zutat} pürieren und durch ein Sieb streichen",
+    "{zutat} mit {zutat2} ablöschen",
+    "{zutat} im heißen Wasser blanchieren",
+    "{zutat} auf einem Blech verteilen",
+]
+CORPUS_SCHNITT = ["fein würfeln", "in Scheiben schneiden", "grob hacken", "in Streifen schneiden", "reiben", "vierteln"]
+CORPUS_GAREN = ["glasig dünsten", "scharf anbraten", "goldbraun rösten", "bei kleiner Hitze schmoren", "kurz andünsten"]
+CORPUS_ZUSATZ = ["", "", "", "dabei gelegentlich umrühren", "bis die Masse bindet", "nicht zu lange",
+                 "am besten über Nacht", "bis alles weich ist", "zugedeckt", "nach Geschmack", "vorsichtig",
+                 "bis sich Blasen bilden", "ohne Deckel", "bei mittlerer Hitze", "und warm stellen"]
+
+def corpus(count, bilder=0.0, seed=42, kapitel=None):
+    """Yield count recipes that look like the real ones: German names,
+    ingredients with amounts and units, a few steps, on average bilder
+    pictures (bild_0000001.jpg, ...) per recipe. The same arguments always
+    give the same recipes; names are unique. The chapters are used in turn,
+    so every chapter of kapitel gets the same share."""
+    rnd = random.Random(seed)
+    kapitel = kapitel or load_kapitel()
+    zutaten = [z[:4] for z in CORPUS_ZUTATEN]
+    weights = [z[4] for z in CORPUS_ZUTATEN]
+    names = set()
+    image = 0
+    for i in range(count):
+        picked = []
+        for z in rnd.choices(zutaten, weights, k=rnd.randint(3, 14)):
+            if z not in picked:
+                picked.append(z)
+        lines = []
+        for name, units, low, high, in picked:
+            unit = rnd.choice(units)
+            amount = rnd.randint(low, high) if unit in ("g", "ml") else rnd.randint(1, max(1, min(high, 4)))
+            if unit in ("g", "ml") and amount > 20:
+                amount = amount // 10 * 10
+            line = f"{amount} {unit} {name}" if unit else f"{amount} {name}"
+            if unit in ("Prise", "") and name in ("Salz", "Pfeffer", "Muskatnuss"):
+                line = name
+            if rnd.random() < 0.15:
+                line += ", " + rnd.choice(CORPUS_FORMEN)
+            lines.append(line)
+        mains = [z[0] for z in picked if z[0] not in CORPUS_GRUNDZUTATEN]
+        if not mains:
+            z = rnd.choice([z for z in zutaten if z[0] not in CORPUS_GRUNDZUTATEN])
+            mains.append(z[0])
+            lines.append(f"{rnd.randint(1, 4)} {z[0]}")
+        name = f"{rnd.choice(CORPUS_ART)}{mains[0].split()[-1]}-{rnd.choice(CORPUS_GERICHTE)}"
+        if len(mains) > 1 and rnd.random() < 0.5:
+            name += f" mit {rnd.choice(mains[1:])}"
+        unique = name
+        n = 2
+        while unique in names:
+            unique = f"{name} ({n})"
+            n += 1
+        names.add(unique)
+        steps = []
+        for step in rnd.sample(CORPUS_SCHRITTE, rnd.randint(2, 7)):
+            step = step.format(
+                zutat=rnd.choice(picked)[0], zutat2=rnd.choice(picked)[0], fett=rnd.choice(["Butter", "Olivenöl"]),
+                schnitt=rnd.choice(CORPUS_SCHNITT), garen=rnd.choice(CORPUS_GAREN),
+                grad=rnd.choice([160, 170, 180, 200, 220]), minuten=rnd.choice([5, 8, 10, 15, 20, 25, 30, 40, 45, 60]))
+            zusatz = rnd.choice(CORPUS_ZUSATZ)
+            steps.append(f"{step}, {zusatz}." if zusatz else f"{step}.")
+        pictures = int(bilder) + (rnd.random() < bilder % 1)
+        doc = {
+            "Zutaten": lines,
+            "Anleitung": steps,
+            "Bild": [f"bild_{image + k:07d}.jpg" for k in range(pictures)],
+            "Name": unique,
+            "Kapitel": kapitel[i % len(kapitel)],
+            "Serves": rnd.choice([1, 2, 2, 4, 4, 4, 6, 8, 12, 24]),
+            "Dauer": rnd.choice([10, 15, 20, 30, 30, 45, 60, 90, 120]),
+            "Notes": rnd.choice(["", "", "", "Schmeckt auch am nächsten Tag.", "Lässt sich gut einfrieren."]),
+        }
+        image += pictures
+        yield doc
+
+def write_corpus(directory, count, bilder=0.0, seed=42, extra=0):
+    """Write a corpus of count recipes as Kochbuch.json (streamed, also for
+    1M recipes) plus Kapitel.json, Prefix.tex, Postfix.tex and the pictures
+    into directory. The extra recipes after those are returned, e.g. to import.
+    Without Pillow the corpus has no pictures."""
+    if Image is None and bilder:
+        print("PIL (Pillow) not found, the corpus has no pictures.", file=sys.stderr)
+        bilder = 0.0
+    root = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(root, "Kapitel.json"), "r", encoding="utf-8") as f:
+        kapitel = json.load(f)
+    os.makedirs(os.path.join(directory, "Bilder"), exist_ok=True)
+    for name in ("Prefix.tex", "Postfix.tex"):
+        shutil.copyfile(os.path.join(root, name), os.path.join(directory, name))
+    with open(os.path.join(directory, "Kapitel.json"), "w", encoding="utf-8") as f:
+        json.dump(kapitel, f, ensure_ascii=False, indent=4)
+    documents = corpus(count + extra, bilder, seed, kapitel)
+    color = 0
+    # the layout of write_json_atomic, one recipe at a time
+    with open(os.path.join(directory, "Kochbuch.json"), "w", encoding="utf-8") as f:
+        f.write(f'{{\n    "total": {count},\n    "documents": [')
+        for i, doc in zip(range(count), documents):
+            f.write(("\n" if i == 0 else ",\n") + textwrap.indent(json.dumps(doc, ensure_ascii=False, indent=4), " " * 8))
+            for name in doc["Bild"]:
+                color += 1
+                picture = Image.new("RGB", (320, 240), (color % 256, color // 256 % 256, color // 65536 % 256))
+                picture.save(os.path.join(directory, "Bilder", name), quality=80)
+        f.write("\n    ]\n}")
+    return list(documents)
+
+class Stub():
+    """Any Tk widget or variable of the stubbed tkinter: takes every call."""
+
+    def __init__(self, *args, **kwargs):
+        self.value = kwargs.get("value", "")
+
+    def __getattr__(self, name):
+        return Stub
+
+    def get(self, *args):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+class StubText(Stub):
+    def get(self, *args):
+        return self.value + "\n"
+
+    def insert(self, index, text):
+        self.value += text
+
+    def delete(self, *args):
+        self.value = ""
+
+class StubTree(Stub):
+    """The part of ttk.Treeview the recipe list uses, so the list updates are measured."""
+
+    def __init__(self, *args, **kwargs):
+        self.children = {"": []}
+        self.parents = {}
+        self.texts = {}
+        self.selected = ()
+
+    def get_children(self, item=""):
+        return tuple(self.children[item])
+
+    def exists(self, item):
+        return item in self.parents
+
+    def insert(self, parent, index, iid, text="", **kwargs):
+        self.parents[iid] = parent
+        self.children[iid] = []
+        self.texts[iid] = text
+        siblings = self.children[parent]
+        siblings.insert(len(siblings) if index == "end" else index, iid)
+        return iid
+
+    def delete(self, *items):
+        for item in items:
+            for child in self.children[item]:
+                self.delete(child)
+            self.children[self.parents.pop(item)].remove(item)
+            del self.children[item], self.texts[item]
+
+    def move(self, item, parent, index):
+        self.children[self.parents[item]].remove(item)
+        self.parents[item] = parent
+        self.children[parent].insert(index, item)
+
+    def parent(self, item):
+        return self.parents[item]
+
+    def next(self, item):
+        siblings = self.children[self.parents[item]]
+        index = siblings.index(item) + 1
+        return siblings[index] if index < len(siblings) else ""
+
+    def prev(self, item):
+        siblings = self.children[self.parents[item]]
+        index = siblings.index(item) - 1
+        return siblings[index] if index >= 0 else ""
+
+    def item(self, item, option=None, **kwargs):
+        if option == "text":
+            return self.texts[item]
+        if "text" in kwargs:
+            self.texts[item] = kwargs["text"]
+
+    def selection(self):
+        return self.selected
+
+    def selection_set(self, *items):
+        self.selected = items
+
+    def focus(self, *args):
+        return self.selected[0] if self.selected else ""
+
+@contextlib.contextmanager
+def stubbed_tk():
+    """Review_Kochbuch imported against a tkinter without a display; the
+    real modules are back afterwards."""
+    tk = types.ModuleType("tkinter")
+    for name in ("Tk", "Toplevel", "StringVar", "PhotoImage"):
+        setattr(tk, name, Stub)
+    tk.Text = StubText
+    for name, value in dict(END="end", W="w", X="x", Y="y", BOTH="both", LEFT="left", BOTTOM="bottom", NO=False).items():
+        setattr(tk, name, value)
+    ttk = types.ModuleType("tkinter.ttk")
+    for name in ("Frame", "Label", "Entry", "Button", "Scrollbar", "Style", "Combobox", "Spinbox"):
+        setattr(ttk, name, Stub)
+    ttk.Treeview = StubTree
+    messagebox = types.ModuleType("tkinter.messagebox")
+    messagebox.askyesno = lambda *args, **kwargs: True
+    messagebox.showerror = messagebox.showwarning = messagebox.showinfo = lambda *args, **kwargs: None
+    filedialog = types.ModuleType("tkinter.filedialog")
+    filedialog.askopenfilename = lambda *args, **kwargs: ""
+    tk.ttk, tk.messagebox, tk.filedialog = ttk, messagebox, filedialog
+    stubs = {"tkinter": tk, "tkinter.ttk": ttk, "tkinter.messagebox": messagebox, "tkinter.filedialog": filedialog}
+    names = list(stubs) + ["PIL.ImageTk", "Review_Kochbuch"]
+    saved = {name: sys.modules.pop(name) for name in names if name in sys.modules}
+    sys.modules.update(stubs)
+    try:
+        import Review_Kochbuch
+        yield Review_Kochbuch
+    finally:
+        for name in names:
+            sys.modules.pop(name, None)
+        sys.modules.update(saved)
+
+def suite_json(results):
+    datei = KochbuchDatei("Kochbuch.json")
+    results["json.load"] = timed(datei.load)
+    book, _ = datei.load(read_only=False)
+    results["json.dump"] = timed(lambda: datei.save(book))
+
+def suite_archiv(results):
+    start = time.perf_counter()
+    import_json("Kochbuch.json", "Kochbuch.archiv")
+    results["archiv.import"] = time.perf_counter() - start
+    results["archiv.open"] = timed(lambda: list(ArchivStore("Kochbuch.archiv").overview()))
+
+def suite_search(results):
+    _, store = KochbuchDatei("Kochbuch.json").load()
+    start = time.perf_counter()
+    index = SuchIndex((doc["ID"], doc) for doc in store)
+    results["search.index"] = time.perf_counter() - start
+    results["search.query"] = timed(lambda: [index.search(q) for q in SEARCH_QUERIES]) / len(SEARCH_QUERIES)
+
+def suite_tex(results):
+    kochbuch = KochbuchTex("Kochbuch.json")
+    if any(doc.get("Bild") for doc in kochbuch.kochbuch["documents"]):
+        start = time.perf_counter()
+        kochbuch.prepare_images()
+        results["tex.images"] = time.perf_counter() - start
+        results["tex.images_cached"] = timed(kochbuch.prepare_images, 1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        results["tex.generate"] = timed(lambda: kochbuch.generate_tex("Kochbuch.tex"))
+
+def suite_gui(results, edits=20):
+    with stubbed_tk() as review:
+        start = time.perf_counter()
+        book = review.RecipeBook(Stub(), "Kochbuch.json")
+        results["gui.start"] = time.perf_counter() - start
+        start = time.perf_counter()
+        for chapter in list(book.chapters_by_iid):
+            book.load_chapter(chapter)
+        results["gui.open_chapters"] = time.perf_counter() - start
+        start = time.perf_counter()
+        book.find_recipes(SEARCH_QUERIES[0])
+        results["gui.search_index"] = time.perf_counter() - start
+        def filter_and_clear():
+            book.populate_recipe_list(SEARCH_QUERIES[1])
+            book.populate_recipe_list("")
+        results["gui.filter"] = timed(filter_and_clear)
+        ids = [recipe_id for recipe_id, _, _ in itertools.islice(book.store.overview(), edits)]
+        start = time.perf_counter()
+        for recipe_id in ids:
+            book.recipe_list.selection_set(str(recipe_id))
+            book.display_recipe(book.store.get(recipe_id))
+            book.name_var.set(book.name_var.get() + " (bearbeitet)")
+            book.save_recipe()
+        results["gui.edit"] = (time.perf_counter() - start) / len(ids)
+        start = time.perf_counter()
+        book.on_close()
+        results["gui.close"] = time.perf_counter() - start
+
+def suite_import(results, documents):
+    rnd = random.Random(5)
+    _, store = KochbuchDatei("Kochbuch.json").load()
+    originals = list(itertools.islice(store, 10000))
+    for doc in documents[:int(len(documents) * IMPORT_DUPLICATES)]:
+        doc["Name"] = rnd.choice(originals)["Name"]
+    for doc in documents[-int(len(documents) * IMPORT_SIMILAR):]:
+        # retyped: another name, one ingredient less
+        original = rnd.choice(originals)
+        doc.update(json.loads(json.dumps({k: original[k] for k in ("Zutaten", "Anleitung", "Kapitel")})))
+        doc["Zutaten"] = doc["Zutaten"][1:]
+    os.makedirs("Input", exist_ok=True)
+    with open(os.path.join("Input", "neu.jsonl"), "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(doc, ensure_ascii=False) + "\n" for doc in documents)
+    with contextlib.redirect_stdout(io.StringIO()):
+        kochbuch = Kochbuch("Kochbuch.json")
+        report = kochbuch.import_input("Input")
+        start = time.perf_counter()
+        kochbuch.save()
+    results["import.documents"] = report["seconds"]
+    results["import.save"] = time.perf_counter() - start
+    print(f"  import: {report['added']} added, {report['duplicates']} duplicates, {report['similar']} similar of {report['read']}")
+
+SUITE = [suite_json, suite_archiv, suite_search, suite_tex, suite_gui]
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def regressions(runs, run, threshold=None):
+    """[(name, seconds, median)] of the results of run that are slower than
+    the median of the last HISTORY_WINDOW runs of the same corpus."""
+    earlier = [r for r in runs if r["size"] == run["size"] and r["bilder"] == run["bilder"]][-HISTORY_WINDOW:]
+    found = []
+    for name, seconds in run["results"].items():
+        values = sorted(r["results"][name] for r in earlier if name in r["results"])
+        if not values:
+            continue
+        median = values[len(values) // 2]
+        limit = 1 + (threshold if threshold is not None else THRESHOLDS.get(name, DEFAULT_THRESHOLD))
+        if seconds > median * limit and seconds - median > MIN_DIFFERENCE:
+            found.append((name, seconds, median))
+    return found
+
+def bench_suite(size=10000, bilder=0.1, history=HISTORY_PATH, threshold=None, seed=42):
+    """Run every tool on a generated corpus of size recipes, append the times
+    to history and report the regressions; returns False if there are any."""
+    history = os.path.abspath(history)
+    extra = max(100, size // 10)
+    print(f"Suite on {size} generated recipes ({bilder} pictures each), {extra} to import")
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            start = time.perf_counter()
+            imports = write_corpus(tmp, size, bilder, seed, extra)
+            print(f"  corpus written in {time.perf_counter() - start:.1f} s")
+            for step in SUITE:
+                step(results)
+            suite_import(results, imports)
+        finally:
+            os.chdir(cwd)
+    for name, seconds in results.items():
+        print(f"  {name:20} {seconds * 1000:10.2f} ms")
+
+    try:
+        with open(history, "r", encoding="utf-8") as f:
+            runs = json.load(f)
+    except FileNotFoundError:
+        runs = []
+    run = {"commit": git_commit(), "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+           "size": size, "bilder": bilder, "results": {name: round(seconds, 6) for name, seconds in results.items()}}
+    found = regressions(runs, run, threshold)
+    for name, seconds, median in found:
+        print(f"⚠️ Regression {name}: {seconds * 1000:.1f} ms, median of the last runs {median * 1000:.1f} ms")
+    runs.append(run)
+    os.makedirs(os.path.dirname(history) or ".", exist_ok=True)
+    write_json_atomic(history, runs)
+    print(f"  {len(runs)} runs in {history}")
+    return not found
+
+class LastClient(asyncio.Protocol):
+    """One keep-alive connection of the load test: sends the next request
+    as soon as the previous response is complete, until deadline."""
+
+    def __init__(self, requests, deadline, latencies, done):
+        self.requests = requests
+        self.deadline = deadline
+        self.latencies = latencies
+        self.done = done
+        self.buffer = bytearray()
+        self.sent = 0.0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.send()
+
+    def send(self):
+        self.sent = time.perf_counter()
+        if self.sent >= self.deadline:
+            self.transport.close()
+            return
+        self.transport.write(next(self.requests))
+
+    def data_received(self, data):
+        self.buffer += data
+        end = self.buffer.find(b"\r\n\r\n")
+        if end < 0:
+            return
+        length = 0
+        start = self.buffer.find(b"Content-Length: ", 0, end)
+        if start >= 0:
+            length = int(self.buffer[start + 16:self.buffer.index(b"\r\n", start)])
+        if len(self.buffer) < end + 4 + length:
+            return
+        status = int(self.buffer[9:12])
+        del self.buffer[:end + 4 + length]
+        self.latencies.append(time.perf_counter() - self.sent if status < 400 else -1)
+        self.send()
+
+    def connection_lost(self, exc):
+        if not self.done.done():
+            self.done.set_result(None)
+
+async def last(port, requests, seconds, connections):
+    """(latencies of the successful responses, failed) of seconds of load over connections."""
+    loop = asyncio.get_running_loop()
+    deadline = time.perf_counter() + seconds
+    latencies = []
+    waits = []
+    for i in range(connections):
+        done = loop.create_future()
+        # every connection starts at another place of the request list
+        cycle = itertools.islice(itertools.cycle(requests), i * len(requests) // connections, None)
+        await loop.create_connection(lambda: LastClient(cycle, deadline, latencies, done), "127.0.0.1", port)
+        waits.append(done)
+    await asyncio.gather(*waits)
+    return [t for t in latencies if t >= 0], sum(1 for t in latencies if t < 0)
+
+def cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def get_request(target, *headers):
+    lines = [f"GET {target} HTTP/1.1", "Host: localhost", *headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+def bench_server(count=10000, seconds=5, connections=32, bilder=0.1):
+    """Load test of Server_Kochbuch.py on localhost: a generated book of
+    count recipes, connections keep-alive clients, seconds per request kind.
+    The client runs in this process; on a machine with few cores it takes a
+    good part of the CPU, so the requests per CPU second of the server are
+    shown as well."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        write_corpus(tmp, count, bilder)
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        start = time.perf_counter()
+        server = subprocess.Popen([sys.executable, os.path.join(root, "Server_Kochbuch.py"), "--port", str(port)],
+                                  cwd=tmp, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        try:
+            for line in server.stdout:
+                if line.startswith("Serving"):
+                    break
+            else:
+                raise RuntimeError("Server_Kochbuch.py did not start")
+            print(f"Server on {count} recipes ready after {time.perf_counter() - start:.1f} s, "
+                  f"{connections} connections, {seconds} s per kind")
+            base = f"http://127.0.0.1:{port}"
+            def get(target):
+                with urllib.request.urlopen(base + target) as response:
+                    return json.load(response)
+            ids = [entry["ID"] for entry in get("/rezepte")]
+            kapitel = [entry["Kapitel"] for entry in get("/kapitel")]
+            with open(os.path.join(tmp, "Kochbuch.json"), "r", encoding="utf-8") as f:
+                images = sorted({image for doc in json.load(f)["documents"] for image in doc.get("Bild") or []})
+            rnd = random.Random(7)
+            sample = rnd.sample(ids, min(len(ids), 2000))
+            etags = {}
+            for recipe_id in sample[:500]:
+                with urllib.request.urlopen(f"{base}/rezepte/{recipe_id}") as response:
+                    etags[recipe_id] = response.headers["ETag"]
+            words = [name for name, *_ in CORPUS_ZUTATEN]
+            queries = SEARCH_QUERIES + [f"{a} {b}" for a, b in zip(words, words[1:] + words[:1])]
+            kinds = {
+                "rezept": [get_request(f"/rezepte/{i}") for i in sample],
+                "rezept_304": [get_request(f"/rezepte/{i}", f"If-None-Match: {etag}") for i, etag in etags.items()],
+                "kapitel_gzip": [get_request("/kapitel/" + quote(kap), "Accept-Encoding: gzip") for kap in kapitel],
+                "suche": [get_request("/suche?q=" + quote(query)) for query in queries],
+                "bild": [get_request(f"/bilder/{quote(image)}?breite={width}") for image in images[:200] for width in (320, 640)],
+            }
+            kinds["gemischt"] = [request for group in zip(*(itertools.cycle(r) for r in kinds.values() if r), range(500)) for request in group[:-1]]
+            for name, requests in kinds.items():
+                if not requests:
+                    continue
+                # fill the caches of the server first, cold answers are not what is measured
+                asyncio.run(last(port, requests, min(seconds, 2), 1))
+                cpu = cpu_seconds(server.pid)
+                latencies, failed = asyncio.run(last(port, requests, seconds, connections))
+                cpu = cpu_seconds(server.pid) - cpu
+                latencies.sort()
+                p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+                p99 = latencies[len(latencies) * 99 // 100] * 1000 if latencies else 0
+                print(f"  {name:12} {len(latencies) / seconds:8.0f} req/s  {len(latencies) / max(cpu, 1e-9):8.0f} req/CPU-s of the server"
+                      f"  p50 {p50:6.2f} ms  p99 {p99:6.2f} ms" + (f"  {failed} failed" if failed else ""))
+        finally:
+            server.terminate()
+            server.wait()
+
+BENCHMARKS = {
+    "grouping": bench_grouping,
+    "render": bench_render,
+    "search": bench_search,
+    "journal": bench_journal,
+    "parser": bench_parser,
+    "einkauf": bench_einkauf,
+    "dubletten": bench_dubletten,
+    "archiv": bench_archiv,
+    "vorrat": bench_vorrat,
+    "suite": bench_suite,
+    "server": bench_server,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks des Kochbuchs")
+    parser.add_argument("names", nargs="*", metavar="name", help=f"Benchmarks (Standard: alle): {', '.join(BENCHMARKS)}")
+    parser.add_argument("--size", type=int, default=10000, help="suite, server: Anzahl erzeugter Rezepte (1000 bis 1000000)")
+    parser.add_argument("--bilder", type=float, default=0.1, help="suite, server: Bilder je Rezept im Mittel")
+    parser.add_argument("--seed", type=int, default=42, help="suite: Startwert des Generators")
+    parser.add_argument("--history", default=HISTORY_PATH, help=f"suite: Verlauf der Messungen (Standard {HISTORY_PATH})")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help=f"suite: so viel langsamer als der Median der letzten Läufe gilt als Regression (Standard {DEFAULT_THRESHOLD})")
+    parser.add_argument("--seconds", type=float, default=5, help="server: Dauer je Anfrageart in Sekunden")
+    parser.add_argument("--connections", type=int, default=32, help="server: gleichzeitige Verbindungen")
+    parser.add_argument("--corpus", metavar="VERZEICHNIS", help="nur ein Korpus aus --size Rezepten und --bilder Bildern erzeugen")
+    args = parser.parse_args()
+    if args.corpus:
+        write_corpus(args.corpus, args.size, args.bilder, args.seed)
+        print(f"{args.size} Rezepte in {args.corpus}")
+        return
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unbekannte Benchmarks: {', '.join(unknown)}")
+    ok = True
+    for name in args.names or list(BENCHMARKS):
+        if name == "suite":
+            ok = bench_suite(args.size, args.bilder, args.history, args.threshold, args.seed)
+        elif name == "server":
+            bench_server(args.size, args.seconds, args.connections, args.bilder)
+        else:
+            BENCHMARKS[name]()
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
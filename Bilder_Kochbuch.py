@@ -0,0 +1,446 @@
+import os
+import sys
+import json
+import queue
+import shutil
+import hashlib
+import argparse
+import contextlib
+import threading
+from collections import OrderedDict, Counter
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    print("PIL (Pillow) not found, images will not be scaled.", file=sys.stderr)
+    Image = None
+    ImageOps = None
+try:
+    import fcntl
+except ImportError:
+    # Windows: no reflinks
+    fcntl = None
+
+from Store_Kochbuch import KochbuchDatei, ID, JOURNAL_SUFFIX
+from Datenbank_Kochbuch import SQLiteStore
+from Archiv_Kochbuch import ArchivStore, INDEX_SUFFIX, data_path
+from Messung_Kochbuch import Messung, count
+
+PICTURES_PATH = "Bilder"
+# photos uploaded by Extend_Kochbuch.py before they were copied into Bilder/
+SOURCES_PATH = "Quellen"
+STORE_INDEX_PATH = os.path.join("Build", "bilder.json")
+CHUNK_SIZE = 1 << 20
+# ioctl of Linux to share the blocks of one file with another (btrfs, xfs)
+FICLONE = 0x40049409
+CACHE_PATH = os.path.join("Build", "Bilder")
+PRINT_DPI = 150
+# images are placed with width=0.8\textwidth, the text is 160mm wide (A4, 2.5cm margins)
+PRINT_WIDTH_MM = 0.8 * 160
+JPEG_QUALITY = 85
+PREVIEW_PATH = os.path.join("Build", "Vorschau")
+PREVIEW_SIZE = (800, 1400)
+PREVIEW_BUDGET = 128 * 1024 * 1024
+
+def file_hash(file_path, cache, lock=None):
+    """sha1 of a file, cached by path in `cache` as [size, mtime_ns, sha1] so
+    a file is only read again when its size or mtime changed. With a lock
+    shared by threads, only the lookup and the update of cache hold it."""
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    with lock or contextlib.nullcontext():
+        cached = cache.get(file_path)
+    if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        return cached[2]
+    h = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    with lock or contextlib.nullcontext():
+        cache[file_path] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+    return h.hexdigest()
+
+def image_list(recipe):
+    # uploads from Quellen/ store a single file name instead of a list
+    images = recipe.get("Bild") or []
+    return [images] if isinstance(images, str) else list(images)
+
+def resolve(image_file):
+    """Path of a Bild entry: Bilder/<image_file>, for old uploads Quellen/<image_file>, None if missing."""
+    for folder in (PICTURES_PATH, SOURCES_PATH):
+        path = f"{folder}/{image_file}"
+        if os.path.isfile(path):
+            return path
+    return None
+
+def place_file(src, dst):
+    """Put the content of src at dst without reading it into memory: as a
+    reflink (copy on write) where the file system can, else as a hard link,
+    else as a copy in chunks."""
+    tmp = f"{dst}.{threading.get_ident()}.tmp"
+    try:
+        if fcntl is None:
+            raise OSError("no reflinks")
+        with open(src, "rb") as s, open(tmp, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    except OSError:
+        try:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            os.link(src, tmp)
+        except OSError:
+            with open(src, "rb") as s, open(tmp, "wb") as d:
+                shutil.copyfileobj(s, d, CHUNK_SIZE)
+    os.replace(tmp, dst)
+
+class BildSpeicher():
+    """The pictures in Bilder/, stored by content.
+
+    add() names a new picture after the sha1 of its content, so the same
+    photo added twice (under any name) is stored once and the Bild entries
+    share it. Pictures already in Bilder/ keep their names. refs counts the
+    Bild entries per file (built by count()), gc() removes the files no
+    recipe refers to. The hashes are cached in Build/bilder.json by size
+    and mtime, like file_hash."""
+
+    def __init__(self, path=PICTURES_PATH, index_path=STORE_INDEX_PATH):
+        self.path = path
+        self.index_path = index_path
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                self.hashes = json.load(f)
+        except Exception:
+            self.hashes = {}
+        self.by_hash = None     # sha1 -> file name, see files()
+        self.refs = None        # file name -> number of Bild entries
+
+    def save_index(self):
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        with open(self.index_path, "w", encoding="utf-8") as f:
+            json.dump(self.hashes, f, indent=4, ensure_ascii=False)
+
+    def names(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(entry.name for entry in os.scandir(self.path)
+                      if entry.is_file() and not entry.name.startswith(".") and not entry.name.endswith(".tmp"))
+
+    def files(self):
+        """{sha1: file name} of the pictures in Bilder/, the first name for duplicates."""
+        if self.by_hash is None:
+            self.by_hash = {}
+            for name in self.names():
+                digest = file_hash(f"{self.path}/{name}", self.hashes)
+                if digest:
+                    self.by_hash.setdefault(digest, name)
+        return self.by_hash
+
+    def add(self, src):
+        """Store the picture src (streamed, not read into memory) and return
+        its Bild entry, the name of an identical stored picture if there is one."""
+        h = hashlib.sha1()
+        with open(src, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        name = self.files().get(digest)
+        if name and os.path.isfile(f"{self.path}/{name}"):
+            count("bilder.deduplicated")
+            return name
+        name = digest + os.path.splitext(src)[1].lower()
+        os.makedirs(self.path, exist_ok=True)
+        place_file(src, f"{self.path}/{name}")
+        self.by_hash[digest] = name
+        file_hash(f"{self.path}/{name}", self.hashes)
+        return name
+
+    def count(self, documents):
+        self.refs = Counter(name for doc in documents for name in image_list(doc))
+
+    def remove(self, name):
+        path = f"{self.path}/{name}"
+        if os.path.isfile(path):
+            os.remove(path)
+        self.hashes.pop(path, None)
+        if self.by_hash is not None:
+            for digest, other in list(self.by_hash.items()):
+                if other == name:
+                    del self.by_hash[digest]
+
+    def duplicates(self):
+        """{file name: stored name with the same content} for pictures stored twice."""
+        found = {}
+        for name in self.names():
+            digest = file_hash(f"{self.path}/{name}", self.hashes)
+            if digest and self.files().get(digest, name) != name:
+                found[name] = self.by_hash[digest]
+        return found
+
+    def gc(self, documents, dry_run=False, since=None):
+        """Remove the pictures in Bilder/ without a Bild entry. Returns
+        ([(name, bytes)] removed, number of pictures kept as newer than since).
+
+        since is the time the book was last saved: a newer picture may belong
+        to a Bild entry that is not saved yet, so it is kept."""
+        self.count(documents)
+        garbage = []
+        kept = 0
+        for name in self.names():
+            if name not in self.refs:
+                st = os.stat(f"{self.path}/{name}")
+                # a hard link keeps the mtime of the original, linking it changes the ctime
+                if since is not None and max(st.st_mtime, st.st_ctime) >= since:
+                    kept += 1
+                    continue
+                garbage.append((name, st.st_size))
+                if not dry_run:
+                    self.remove(name)
+        return garbage, kept
+
+class BildCache():
+    """Downscaled, recompressed copies of the pictures in Bilder/ for the TeX
+    build, stored under the hash of the source file and the target width.
+    Pictures that are used as they are get the width appended to their
+    entry in the hash index, so the next build does not open them again."""
+
+    def __init__(self, cache_path=CACHE_PATH, dpi=PRINT_DPI, width_mm=PRINT_WIDTH_MM, quality=JPEG_QUALITY, max_width=None, index_path=None):
+        self.cache_path = cache_path
+        self.dpi = dpi
+        # max_width in pixels instead of the print width, e.g. for the thumbnails of the HTML pages
+        self.max_width = max_width or round(width_mm / 25.4 * dpi)
+        self.quality = quality
+        self.index_path = index_path or os.path.join(cache_path, "index.json")
+        self.lock = threading.Lock()
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.hashes = json.load(f)
+        except Exception:
+            self.hashes = {}
+
+    def save_index(self):
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        with open(self.index_path, "w", encoding="utf-8") as f:
+            json.dump(self.hashes, f, indent=4, ensure_ascii=False)
+
+    def derivative(self, image_file):
+        """Path of the print version of Bilder/<image_file>, None if the picture is missing."""
+        src = resolve(image_file)
+        if src is None:
+            return None
+        digest = file_hash(src, self.hashes, self.lock)
+        if digest is None:
+            return None
+        if Image is None:
+            return src
+        with self.lock:
+            # [size, mtime_ns, sha1, widths the original is used for ...], see file_hash
+            entry = self.hashes.get(src, [])
+            if self.max_width in entry[3:]:
+                return src
+
+        for ext in (".jpg", ".png"):
+            target = f"{self.cache_path}/{digest}-{self.max_width}{ext}"
+            if os.path.isfile(target):
+                return target
+
+        try:
+            with Messung("bild.scale", image=image_file), Image.open(src) as img:
+                # pdflatex ignores the EXIF orientation of phone photos, the copy is rotated upright
+                upright = img.getexif().get(0x0112, 1) == 1
+                if upright and img.width <= self.max_width and img.format in ("JPEG", "PNG"):
+                    with self.lock:
+                        entry.append(self.max_width)
+                    return src
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail((self.max_width, img.height), Image.Resampling.LANCZOS)
+                # keep transparency, everything else becomes a JPEG
+                if img.mode in ("RGBA", "LA", "P"):
+                    target = f"{self.cache_path}/{digest}-{self.max_width}.png"
+                    options = {"format": "PNG", "optimize": True}
+                else:
+                    target = f"{self.cache_path}/{digest}-{self.max_width}.jpg"
+                    img = img.convert("RGB")
+                    options = {"format": "JPEG", "quality": self.quality, "optimize": True,
+                               "dpi": (self.dpi, self.dpi)}
+                os.makedirs(self.cache_path, exist_ok=True)
+                tmp = f"{target}.{threading.get_ident()}.tmp"
+                img.save(tmp, **options)
+                os.replace(tmp, target)
+                return target
+        except Exception as e:
+            print(f"⚠️ Could not scale {src}: {e}", file=sys.stderr)
+            return src
+
+    def prepare(self, image_files, workers=None):
+        """Create the print versions of all image_files in a thread pool.
+        Returns {image_file: path to use in the TeX}, missing pictures are left out."""
+        image_files = list(dict.fromkeys(image_files))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            paths = dict(zip(image_files, pool.map(self.derivative, image_files)))
+        self.save_index()
+        return {image_file: path for image_file, path in paths.items() if path}
+
+class VorschauCache():
+    """Preview images for the Review_Kochbuch viewer.
+
+    Decoded previews are kept in an in-memory LRU limited to `budget` bytes
+    and on disk under PREVIEW_PATH, keyed by path, mtime and size of the
+    original. Originals are decoded in worker threads; finished previews are
+    collected with results() on the Tk thread."""
+
+    def __init__(self, max_size=PREVIEW_SIZE, budget=PREVIEW_BUDGET, cache_path=PREVIEW_PATH, workers=2):
+        self.max_size = max_size
+        self.budget = budget
+        self.cache_path = cache_path
+        self.memory = OrderedDict()
+        self.used = 0
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.finished = queue.Queue()
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+    def key(self, path):
+        st = os.stat(path)
+        return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+    def get(self, path):
+        """The preview of path if it is in memory, otherwise None."""
+        try:
+            key = self.key(path)
+        except OSError:
+            return None
+        with self.lock:
+            image = self.memory.get(key)
+            if image is not None:
+                self.memory.move_to_end(key)
+            return image
+
+    def remember(self, key, image):
+        size = image.width * image.height * len(image.getbands())
+        with self.lock:
+            if key in self.memory:
+                return
+            self.memory[key] = image
+            self.used += size
+            while self.used > self.budget and len(self.memory) > 1:
+                _, old = self.memory.popitem(last=False)
+                self.used -= old.width * old.height * len(old.getbands())
+
+    def load(self, path):
+        """Return the preview of path, from memory, from disk or by decoding the original."""
+        key = self.key(path)
+        image = self.get(path)
+        if image is not None:
+            return image
+
+        name = hashlib.sha1(repr((key, self.max_size)).encode("utf-8")).hexdigest()
+        for ext in (".jpg", ".png"):
+            cached = os.path.join(self.cache_path, name + ext)
+            if os.path.isfile(cached):
+                with Messung("bild.preview", path=cached), Image.open(cached) as img:
+                    img.load()
+                    self.remember(key, img)
+                    return img
+
+        with Messung("bild.decode", path=path), Image.open(path) as img:
+            img.draft("RGB", self.max_size)  # lets the JPEG decoder skip most of the pixels
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail(self.max_size, Image.Resampling.LANCZOS)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "A" in img.getbands() or img.mode == "P" else "RGB")
+        ext = ".png" if img.mode == "RGBA" else ".jpg"
+        os.makedirs(self.cache_path, exist_ok=True)
+        tmp = os.path.join(self.cache_path, f"{name}.{threading.get_ident()}.tmp")
+        img.save(tmp, format="PNG" if ext == ".png" else "JPEG", quality=90)
+        os.replace(tmp, os.path.join(self.cache_path, name + ext))
+        self.remember(key, img)
+        return img
+
+    def request(self, path):
+        """Decode path in the background, the result shows up in results()."""
+        if path in self.pending:
+            return
+        self.pending.add(path)
+        def work():
+            try:
+                self.finished.put((path, self.load(path), None))
+            except Exception as e:
+                self.finished.put((path, None, e))
+        self.pool.submit(work)
+
+    def prefetch(self, paths):
+        for path in paths:
+            if os.path.isfile(path) and self.get(path) is None:
+                self.request(path)
+
+    def results(self):
+        """Yield (path, image, error) for every finished request, called on the Tk thread."""
+        while True:
+            try:
+                path, image, error = self.finished.get_nowait()
+            except queue.Empty:
+                return
+            self.pending.discard(path)
+            yield path, image, error
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bilder/ aufräumen: doppelte Bilder zusammenlegen, unbenutzte löschen")
+    parser.add_argument("command", choices=["gc"], help="gc: doppelte zusammenlegen und Bilder ohne Rezept löschen")
+    parser.add_argument("book", nargs="?", default="Kochbuch.json", help="Kochbuch.json, eine SQLite-Datenbank (*.db) oder ein Archiv (*.archiv)")
+    parser.add_argument("--dry-run", action="store_true", help="nur anzeigen, nichts ändern")
+    args = parser.parse_args()
+
+    # pictures added after the book was last saved are kept, see BildSpeicher.gc
+    book_files = [args.book, args.book + JOURNAL_SUFFIX, args.book + "-wal"]
+    if args.book.endswith(INDEX_SUFFIX):
+        book_files.append(data_path(args.book))
+    since = max((os.path.getmtime(path) for path in book_files if os.path.exists(path)), default=None)
+
+    datei = None
+    if args.book.endswith(".db"):
+        store = SQLiteStore(args.book)
+    elif args.book.endswith(INDEX_SUFFIX):
+        store = ArchivStore(args.book)
+    else:
+        datei = KochbuchDatei(args.book)
+        data, store = datei.load(read_only=args.dry_run)
+        store.journal = None
+    sys.stdout.reconfigure(encoding="utf-8")
+    bilder = BildSpeicher()
+
+    # point the Bild entries of identical pictures at one file, the others become garbage
+    duplicates = bilder.duplicates()
+    changed = 0
+    references = []
+    for doc in list(store):
+        images = image_list(doc)
+        merged = list(dict.fromkeys(duplicates.get(name, name) for name in images))
+        references.append({"Bild": merged})
+        if merged != images:
+            changed += 1
+            if not args.dry_run:
+                store.update(doc[ID], {"Bild": merged})
+    if changed and not args.dry_run:
+        if datei:
+            datei.save(data)
+        else:
+            store.commit()
+    print(f"{len(duplicates)} duplicate pictures, Bild entries of {changed} recipes {'to merge' if args.dry_run else 'merged'}")
+
+    garbage, kept = bilder.gc(references, args.dry_run, since)
+    for name, size in garbage:
+        print(f"{'would remove' if args.dry_run else 'removed'} {name} ({size / 1024:.0f} KiB)")
+    print(f"{len(garbage)} unused pictures, {sum(size for _, size in garbage) / 1024 / 1024:.1f} MiB")
+    if kept:
+        print(f"{kept} unused pictures newer than {args.book} kept, their recipes may not be saved yet")
+    if not args.dry_run:
+        bilder.save_index()
+
+if __name__ == "__main__":
+    main()
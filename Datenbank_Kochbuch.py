@@ -0,0 +1,267 @@
+import re
+import sys
+import json
+import sqlite3
+import contextlib
+
+from Store_Kochbuch import RecipeStore, write_json_atomic, ID, NAME, KAPITEL
+
+DB_PATH = "Kochbuch.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS chapters (name TEXT PRIMARY KEY, position INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS recipes (
+    id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    name TEXT,
+    kapitel TEXT,
+    serves TEXT,
+    dauer TEXT,
+    notes TEXT,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS recipes_position ON recipes (position);
+CREATE INDEX IF NOT EXISTS recipes_name ON recipes (name);
+CREATE INDEX IF NOT EXISTS recipes_kapitel ON recipes (kapitel, position);
+CREATE TABLE IF NOT EXISTS ingredients (
+    recipe_id INTEGER NOT NULL REFERENCES recipes (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ingredients_recipe ON ingredients (recipe_id);
+CREATE TABLE IF NOT EXISTS steps (
+    recipe_id INTEGER NOT NULL REFERENCES recipes (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS steps_recipe ON steps (recipe_id);
+CREATE TABLE IF NOT EXISTS images (
+    recipe_id INTEGER NOT NULL REFERENCES recipes (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    file TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_recipe ON images (recipe_id);
+CREATE INDEX IF NOT EXISTS images_file ON images (file);
+CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5 (
+    name, kapitel, zutaten, anleitung, notes,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+def as_list(field):
+    if field is None:
+        return []
+    if isinstance(field, list):
+        return [str(x) for x in field]
+    return [str(field)]
+
+def as_text(value):
+    return None if value is None else str(value)
+
+class SQLiteStore():
+    """RecipeStore on an SQLite database (WAL mode).
+
+    Offers the same operations as Store_Kochbuch.RecipeStore. Every
+    document is kept verbatim as JSON in recipes.doc, so import and export
+    of Kochbuch.json are lossless. Name, chapter, ingredients, steps and
+    images go into indexed columns and tables, and the text into an FTS5
+    index for search()."""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        # may be committed from another thread that holds the lock of a
+        # Store_Kochbuch.Autosave, see Review_Kochbuch.py
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.executescript(SCHEMA)
+        self.journal = None
+        self.batching = False
+
+    def close(self):
+        self.db.close()
+
+    def commit(self):
+        self.db.commit()
+
+    def transaction(self):
+        # inside batch() the surrounding transaction commits
+        return contextlib.nullcontext() if self.batching else self.db
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Run many changes in one transaction."""
+        self.batching = True
+        try:
+            with self.db:
+                yield
+        finally:
+            self.batching = False
+
+    def load_doc(row):
+        return json.loads(row[0])
+
+    # === queries ===
+    def __len__(self):
+        return self.db.execute("SELECT count(*) FROM recipes").fetchone()[0]
+
+    def __iter__(self):
+        for row in self.db.execute("SELECT doc FROM recipes ORDER BY position"):
+            yield SQLiteStore.load_doc(row)
+
+    def __contains__(self, recipe_id):
+        return self.db.execute("SELECT 1 FROM recipes WHERE id = ?", (recipe_id,)).fetchone() is not None
+
+    @property
+    def documents(self):
+        """All documents in book order, a fresh list on every access."""
+        return list(self)
+
+    def overview(self):
+        """(ID, Name, Kapitel) of every recipe, in book order, without loading the documents."""
+        return self.db.execute("SELECT id, name, kapitel FROM recipes ORDER BY position")
+
+    def get(self, recipe_id):
+        row = self.db.execute("SELECT doc FROM recipes WHERE id = ?", (recipe_id,)).fetchone()
+        return SQLiteStore.load_doc(row) if row else None
+
+    def has_name(self, name):
+        return self.db.execute("SELECT 1 FROM recipes WHERE name IS ?", (name,)).fetchone() is not None
+
+    def find(self, name):
+        rows = self.db.execute("SELECT doc FROM recipes WHERE name IS ? ORDER BY position", (name,))
+        return [SQLiteStore.load_doc(row) for row in rows]
+
+    def chapter(self, kapitel):
+        rows = self.db.execute("SELECT doc FROM recipes WHERE kapitel IS ? ORDER BY position", (kapitel,))
+        return [SQLiteStore.load_doc(row) for row in rows]
+
+    def chapters(self):
+        """Chapters in the order of the chapters table, followed by any others used by recipes."""
+        names = [row[0] for row in self.db.execute("SELECT name FROM chapters ORDER BY position")]
+        known = set(names)
+        for (kapitel,) in self.db.execute("SELECT kapitel FROM recipes GROUP BY kapitel ORDER BY min(position)"):
+            if kapitel not in known:
+                names.append(kapitel)
+        return names
+
+    def search(self, query, limit=None):
+        """IDs of the recipes containing all words of query (as prefixes), best match first."""
+        words = re.findall(r"\w+", query.lower())
+        if not words:
+            return [row[0] for row in self.db.execute("SELECT id FROM recipes ORDER BY position")]
+        match = " AND ".join(f'"{word}"*' for word in words)
+        sql = "SELECT rowid FROM recipes_fts WHERE recipes_fts MATCH ? ORDER BY rank"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [row[0] for row in self.db.execute(sql, (match,))]
+
+    # === changes ===
+    def write(self, doc, position=None):
+        recipe_id = doc[ID]
+        if position is None:
+            row = self.db.execute("SELECT position FROM recipes WHERE id = ?", (recipe_id,)).fetchone()
+            position = row[0]
+        self.db.execute("INSERT OR REPLACE INTO recipes VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (
+            recipe_id, position, doc.get(NAME), doc.get(KAPITEL), as_text(doc.get("Serves")),
+            as_text(doc.get("Dauer")), as_text(doc.get("Notes")), json.dumps(doc, ensure_ascii=False)))
+        for table, field in (("ingredients", "Zutaten"), ("steps", "Anleitung")):
+            self.db.execute(f"DELETE FROM {table} WHERE recipe_id = ?", (recipe_id,))
+            self.db.executemany(f"INSERT INTO {table} VALUES (?, ?, ?)",
+                                [(recipe_id, i, text) for i, text in enumerate(as_list(doc.get(field)))])
+        self.db.execute("DELETE FROM images WHERE recipe_id = ?", (recipe_id,))
+        self.db.executemany("INSERT INTO images VALUES (?, ?, ?)",
+                            [(recipe_id, i, f) for i, f in enumerate(as_list(doc.get("Bild")))])
+        self.db.execute("DELETE FROM recipes_fts WHERE rowid = ?", (recipe_id,))
+        self.db.execute("INSERT INTO recipes_fts (rowid, name, kapitel, zutaten, anleitung, notes) VALUES (?, ?, ?, ?, ?, ?)", (
+            recipe_id, doc.get(NAME), doc.get(KAPITEL), "\n".join(as_list(doc.get("Zutaten"))),
+            "\n".join(as_list(doc.get("Anleitung"))), as_text(doc.get("Notes"))))
+
+    def add(self, doc, recipe_id=None):
+        """Append doc to the book and return its ID."""
+        with self.transaction():
+            next_id, position = self.db.execute(
+                "SELECT coalesce(max(id), 0) + 1, coalesce(max(position), 0) + 1 FROM recipes").fetchone()
+            doc[ID] = recipe_id or next_id
+            self.write(doc, position)
+        return doc[ID]
+
+    def update(self, recipe_id, changes):
+        with self.transaction():
+            doc = self.get(recipe_id)
+            if doc is None:
+                raise KeyError(recipe_id)
+            doc.update(changes)
+            doc[ID] = recipe_id
+            self.write(doc)
+        return doc
+
+    def remove(self, recipe_id):
+        with self.transaction():
+            doc = self.get(recipe_id)
+            if doc is None:
+                raise KeyError(recipe_id)
+            self.db.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,))
+            self.db.execute("DELETE FROM recipes_fts WHERE rowid = ?", (recipe_id,))
+        return doc
+
+    # === JSON compatibility ===
+    def import_json(self, path="Kochbuch.json", kapitel_path="Kapitel.json"):
+        """Replace the database contents with Kochbuch.json (and the chapter order of Kapitel.json)."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        keys = list(data)
+        documents = data.pop("documents")
+        # assigns IDs to documents which have none yet, the same way the JSON tools do
+        RecipeStore(documents)
+        with self.db:
+            for table in ("recipes", "recipes_fts", "chapters", "meta"):
+                self.db.execute(f"DELETE FROM {table}")
+            for position, doc in enumerate(documents):
+                self.write(doc, position)
+            self.db.executemany("INSERT INTO meta VALUES (?, ?)",
+                                [(key, json.dumps(value, ensure_ascii=False)) for key, value in data.items()])
+            self.db.execute("INSERT INTO meta VALUES ('keys', ?)", (json.dumps(keys),))
+            if kapitel_path:
+                try:
+                    with open(kapitel_path, "r", encoding="utf-8") as f:
+                        kapitel = json.load(f)
+                except FileNotFoundError:
+                    kapitel = []
+                self.db.executemany("INSERT OR IGNORE INTO chapters VALUES (?, ?)",
+                                    [(name, i) for i, name in enumerate(kapitel)])
+        return len(documents)
+
+    def export_data(self):
+        meta = {key: json.loads(value) for key, value in self.db.execute("SELECT key, value FROM meta")}
+        keys = meta.pop("keys", ["total", "documents"])
+        meta["documents"] = self.documents
+        meta["total"] = len(meta["documents"])
+        return {key: meta[key] for key in keys if key in meta}
+
+    def export_json(self, path="Kochbuch.json", kapitel_path=None):
+        write_json_atomic(path, self.export_data())
+        if kapitel_path:
+            names = [row[0] for row in self.db.execute("SELECT name FROM chapters ORDER BY position")]
+            write_json_atomic(kapitel_path, names)
+
+def main():
+    if len(sys.argv) != 4 or sys.argv[1] not in ("import", "export"):
+        print("Aufruf: python Datenbank_Kochbuch.py import Kochbuch.json Kochbuch.db")
+        print("        python Datenbank_Kochbuch.py export Kochbuch.db Kochbuch.json")
+        sys.exit(1)
+    command, source, target = sys.argv[1:]
+    if command == "import":
+        store = SQLiteStore(target)
+        count = store.import_json(source)
+        print(f"✅ Imported {count} recipes into {target}")
+    else:
+        store = SQLiteStore(source)
+        store.export_json(target)
+        print(f"✅ Exported {len(store)} recipes to {target}")
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import os
+import sys
+import hashlib
+import argparse
+
+from Suche_Kochbuch import tokenize
+from Store_Kochbuch import KochbuchDatei, write_json_atomic, ID, NAME
+from Datenbank_Kochbuch import SQLiteStore
+from Archiv_Kochbuch import ArchivStore, INDEX_SUFFIX
+from Bilder_Kochbuch import image_list
+
+# signature length = BANDS * ROWS; with 16 bands of 4 rows two recipes
+# become candidates from a similarity of about (1/16)^(1/4) = 0.5 on
+THRESHOLD = 0.5
+BANDS = 16
+ROWS = 4
+SIGNATURE = BANDS * ROWS
+# recipes with fewer shingles (image-only uploads, empty drafts) are not compared
+MIN_SHINGLES = 3
+# a band bucket with more recipes is boilerplate, not a duplicate
+MAX_BUCKET = 200
+EMPTY = 1 << 64
+REPORT_PATH = os.path.join("Build", "dubletten.json")
+
+def shingles(recipe):
+    """Every ingredient line and every three words of the instructions, folded
+    like the search, so '200g Mehl' and '200 g Mehl' are the same shingle."""
+    found = set()
+    zutaten = recipe.get("Zutaten") or []
+    anleitung = recipe.get("Anleitung") or []
+    if isinstance(zutaten, str):
+        zutaten = zutaten.split("\n")
+    if isinstance(anleitung, list):
+        anleitung = " ".join(str(a) for a in anleitung)
+    for line in zutaten:
+        words = tokenize(line)
+        if words:
+            found.add("z " + " ".join(words))
+    words = tokenize(anleitung)
+    for i in range(max(len(words) - 2, 1 if words else 0)):
+        found.add("a " + " ".join(words[i:i + 3]))
+    return found
+
+def signature(recipe):
+    """MinHash signature of the shingles, or None if there are too few.
+
+    One-permutation hashing: each shingle is hashed once, the hash picks one
+    of the SIGNATURE bins and the bin keeps the smallest value. Empty bins
+    take the value of the next filled one (rotation densification), so two
+    signatures agree in a bin with the probability of their Jaccard
+    similarity, at one hash per shingle instead of one per bin."""
+    found = shingles(recipe)
+    if len(found) < MIN_SHINGLES:
+        return None
+    blake2b = hashlib.blake2b
+    sig = [EMPTY] * SIGNATURE
+    for h in [int.from_bytes(blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little") for shingle in found]:
+        b = h % SIGNATURE
+        if h < sig[b]:
+            sig[b] = h
+    if EMPTY in sig:
+        # one pass from the right, carrying the next filled bin (wrapping around)
+        filled = sig.index(next(v for v in sig if v != EMPTY)) + SIGNATURE
+        dense = list(sig)
+        for i in range(SIGNATURE - 1, -1, -1):
+            if sig[i] != EMPTY:
+                filled = i
+            else:
+                dense[i] = sig[filled % SIGNATURE] + filled - i
+        sig = dense
+    return tuple(sig)
+
+def similarity(a, b):
+    return sum(x == y for x, y in zip(a, b)) / SIGNATURE
+
+class DublettenIndex():
+    """LSH index over the MinHash signatures of the recipes.
+
+    A signature is cut into BANDS bands of ROWS values; recipes sharing any
+    band land in the same bucket and are candidates, which are then checked
+    with the estimated similarity. Looking up a new recipe touches only its
+    BANDS buckets instead of comparing it with the whole book."""
+
+    def __init__(self, recipes=None):
+        self.signatures = {}                            # key -> signature
+        self.buckets = [{} for _ in range(BANDS)]       # band -> {rows: [keys]}
+        for key, recipe in recipes or []:
+            self.add(key, recipe)
+
+    def bands(sig):
+        return [sig[b * ROWS:(b + 1) * ROWS] for b in range(BANDS)]
+
+    def add(self, key, recipe):
+        if key in self.signatures:
+            self.remove(key)
+        sig = signature(recipe)
+        if sig is None:
+            return
+        self.signatures[key] = sig
+        for buckets, band in zip(self.buckets, DublettenIndex.bands(sig)):
+            buckets.setdefault(band, []).append(key)
+
+    def remove(self, key):
+        sig = self.signatures.pop(key, None)
+        if sig is None:
+            return
+        for buckets, band in zip(self.buckets, DublettenIndex.bands(sig)):
+            keys = buckets[band]
+            keys.remove(key)
+            if not keys:
+                del buckets[band]
+
+    update = add
+
+    def similar(self, recipe, threshold=THRESHOLD, exclude=None):
+        """[(key, similarity)] of the indexed recipes similar to recipe, most similar first."""
+        sig = signature(recipe)
+        if sig is None:
+            return []
+        candidates = set()
+        for buckets, band in zip(self.buckets, DublettenIndex.bands(sig)):
+            candidates.update(buckets.get(band, ()))
+        candidates.discard(exclude)
+        found = [(key, similarity(sig, self.signatures[key])) for key in candidates]
+        found = [(key, s) for key, s in found if s >= threshold]
+        found.sort(key=lambda e: e[1], reverse=True)
+        return found
+
+    def pairs(self, threshold=THRESHOLD):
+        """All pairs (key, key, similarity) at or above threshold, most similar first."""
+        seen = set()
+        found = []
+        for buckets in self.buckets:
+            for keys in buckets.values():
+                if len(keys) < 2 or len(keys) > MAX_BUCKET:
+                    continue
+                for i, a in enumerate(keys):
+                    for b in keys[i + 1:]:
+                        pair = (a, b) if a < b else (b, a)
+                        if pair in seen:
+                            continue
+                        seen.add(pair)
+                        s = similarity(self.signatures[a], self.signatures[b])
+                        if s >= threshold:
+                            found.append((pair[0], pair[1], s))
+        found.sort(key=lambda e: e[2], reverse=True)
+        return found
+
+def groups(pairs):
+    """Connected groups of keys from pairs, each sorted."""
+    parent = {}
+    def find(k):
+        while parent.setdefault(k, k) != k:
+            parent[k] = parent[parent[k]]
+            k = parent[k]
+        return k
+    for a, b, _ in pairs:
+        parent[find(a)] = find(b)
+    found = {}
+    for k in parent:
+        found.setdefault(find(k), []).append(k)
+    return sorted((sorted(g) for g in found.values()), key=lambda g: g[0])
+
+def merge(keep, other):
+    """Changes for keep when other is merged into it: the longer ingredient
+    and instruction lists, all pictures and both notes."""
+    changes = {}
+    for field in ("Zutaten", "Anleitung"):
+        if len(other.get(field) or []) > len(keep.get(field) or []):
+            changes[field] = other[field]
+    kept = image_list(keep)
+    images = kept + [image for image in image_list(other) if image not in kept]
+    if images != kept:
+        changes["Bild"] = images
+    notes = [n for n in (keep.get("Notes"), other.get("Notes")) if n]
+    if len(notes) == 2 and notes[0] != notes[1]:
+        changes["Notes"] = "\n".join(notes)
+    elif notes and not keep.get("Notes"):
+        changes["Notes"] = notes[0]
+    return changes
+
+def main():
+    parser = argparse.ArgumentParser(description="Ähnliche Rezepte (Dubletten) finden")
+    parser.add_argument("book", nargs="?", default="Kochbuch.json", help="Kochbuch.json, eine SQLite-Datenbank (*.db) oder ein Archiv (*.archiv)")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="geschätzte Ähnlichkeit ab der zwei Rezepte gemeldet werden")
+    parser.add_argument("--report", default=REPORT_PATH, help="Bericht (JSON)")
+    args = parser.parse_args()
+
+    if args.book.endswith(".db"):
+        store = SQLiteStore(args.book)
+    elif args.book.endswith(INDEX_SUFFIX):
+        store = ArchivStore(args.book)
+    else:
+        _, store = KochbuchDatei(args.book).load()
+    recipes = {doc[ID]: doc for doc in store}
+    index = DublettenIndex(recipes.items())
+    pairs = index.pairs(args.threshold)
+    report = {
+        "threshold": args.threshold,
+        "pairs": [{"ids": [a, b], "names": [recipes[a].get(NAME), recipes[b].get(NAME)], "similarity": round(s, 3)}
+                  for a, b, s in pairs],
+        "groups": [[{"id": k, "name": recipes[k].get(NAME)} for k in group] for group in groups(pairs)],
+    }
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    write_json_atomic(args.report, report)
+    sys.stdout.reconfigure(encoding="utf-8")
+    for group in report["groups"]:
+        print(" ~ ".join(f"{entry['name']} ({entry['id']})" for entry in group))
+    print(f"{len(pairs)} similar pairs in {len(report['groups'])} groups, report in {args.report}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import re
+import sys
+import argparse
+from array import array
+
+from Extend_Kochbuch import Kochbuch
+from Parser_Kochbuch import ingredients
+from Store_Kochbuch import ID, NAME
+
+# units which are added up in a common base unit
+BASIS = {
+    "mg": ("g", 0.001), "g": ("g", 1), "kg": ("g", 1000),
+    "ml": ("ml", 1), "cl": ("ml", 10), "dl": ("ml", 100), "l": ("ml", 1000),
+}
+# base unit -> (larger unit, factor) used for the output from that amount on
+GROSS = {"g": ("kg", 1000), "ml": ("l", 1000)}
+NONE = float("nan")
+# 'Parmesan, gerieben' and 'Parmesan (gerieben)' go on the list as 'Parmesan'
+ITEM_SUFFIX = re.compile(r"\s*(?:,|\(|\bzum\b|\bfür\b|\bnach\b).*$", re.IGNORECASE)
+
+def item_key(zutat):
+    item = ITEM_SUFFIX.sub("", zutat).strip() or zutat.strip()
+    return " ".join(item.split()), item.lower()
+
+def serves_of(doc):
+    try:
+        serves = float(doc.get("Serves") or 1)
+    except (TypeError, ValueError):
+        return 1.0
+    return serves if serves > 0 else 1.0
+
+class ZutatenTabelle():
+    """All parsed ingredients of the book as columns, one row per ingredient.
+
+    The rows of a recipe are contiguous, start[i]:start[i + 1] for the
+    recipe at position i. von/bis hold the amount in the base unit of
+    BASIS (NaN without amount), key the index into self.keys, which are
+    the normalised (item, unit) pairs the shopping list adds up.
+
+    Built once per book; scaling and summing a selection of recipes then
+    only touches these arrays, the ingredient strings are not parsed again."""
+
+    def __init__(self, documents):
+        self.positions = {}         # recipe ID -> position
+        self.serves = array("d")
+        self.start = array("l", [0])
+        self.von = array("d")
+        self.bis = array("d")
+        self.key = array("l")
+        self.keys = []              # [(item, unit)]
+        self.names = []             # display name per key
+        key_index = {}
+        for doc in documents:
+            self.positions[doc.get(ID)] = len(self.serves)
+            self.serves.append(serves_of(doc))
+            for entry in ingredients(doc):
+                name, item = item_key(entry["Zutat"] or entry["Text"])
+                unit, factor = BASIS.get(entry["Einheit"], (entry["Einheit"], 1))
+                k = key_index.get((item, unit))
+                if k is None:
+                    k = key_index[(item, unit)] = len(self.keys)
+                    self.keys.append((item, unit))
+                    self.names.append(name)
+                self.key.append(k)
+                menge = entry["Menge"]
+                self.von.append(menge[0] * factor if menge else NONE)
+                self.bis.append(menge[1] * factor if menge else NONE)
+            self.start.append(len(self.key))
+
+    def __len__(self):
+        return len(self.key)
+
+    def rows(self, recipe_ids):
+        """(row range, position) of every recipe in recipe_ids."""
+        for recipe_id in recipe_ids:
+            position = self.positions[recipe_id]
+            yield range(self.start[position], self.start[position + 1]), position
+
+    def einkaufsliste(self, recipe_ids, portionen=None):
+        """Sum the ingredients of recipe_ids, each scaled from its Serves to
+        portionen (unscaled if None). Returns [(name, unit, von, bis)] sorted
+        by name; von/bis are None for items without amount ('Salz')."""
+        von_sum = [0.0] * len(self.keys)
+        bis_sum = [0.0] * len(self.keys)
+        used = bytearray(len(self.keys))
+        von, bis, key = self.von, self.bis, self.key
+        for rows, position in self.rows(recipe_ids):
+            factor = portionen / self.serves[position] if portionen else 1.0
+            for row in rows:
+                k = key[row]
+                used[k] = 1
+                # NaN marks 'no amount'; NaN != NaN keeps the sums clean
+                if von[row] == von[row]:
+                    von_sum[k] += von[row] * factor
+                    bis_sum[k] += bis[row] * factor
+                    used[k] = 2
+        liste = []
+        for k, state in enumerate(used):
+            if not state:
+                continue
+            unit = self.keys[k][1]
+            if state == 2:
+                liste.append((self.names[k], unit, von_sum[k], bis_sum[k]))
+            else:
+                liste.append((self.names[k], unit, None, None))
+        liste.sort(key=lambda e: (e[0].lower(), e[1] or ""))
+        return liste
+
+def format_number(value):
+    """German notation with at most two decimals: 1.5 -> '1,5'."""
+    if value >= 10:
+        value = round(value)
+    text = f"{value:.2f}".rstrip("0").rstrip(".")
+    return text.replace(".", ",")
+
+def format_entry(name, unit, von, bis):
+    """('Mehl', 'g', 1500, 1500) -> '1,5 kg Mehl'."""
+    if von is None:
+        return name
+    if unit in GROSS and von >= GROSS[unit][1]:
+        unit, factor = GROSS[unit]
+        von, bis = von / factor, bis / factor
+    menge = format_number(von)
+    if format_number(bis) != menge:
+        menge += "–" + format_number(bis)
+    return " ".join(part for part in (menge, unit, name) if part)
+
+def select(store, selection):
+    """Recipe IDs for a list of IDs or names."""
+    recipe_ids = []
+    for entry in selection:
+        if str(entry).isdigit() and int(entry) in store:
+            recipe_ids.append(int(entry))
+            continue
+        found = store.find(entry)
+        if not found:
+            raise KeyError(f"Kein Rezept '{entry}'")
+        recipe_ids.extend(doc[ID] for doc in found)
+    return recipe_ids
+
+def main():
+    parser = argparse.ArgumentParser(description="Einkaufsliste für ausgewählte Rezepte")
+    parser.add_argument("rezepte", nargs="+", help="Namen oder IDs der Rezepte")
+    parser.add_argument("--book", default="Kochbuch.json", help="Kochbuch.json, eine SQLite-Datenbank (*.db) oder ein Archiv (*.archiv)")
+    parser.add_argument("--portionen", type=float, default=None, help="jedes Rezept auf so viele Portionen umrechnen")
+    args = parser.parse_args()
+
+    kochbuch = Kochbuch(args.book, read_only=True)
+    try:
+        recipe_ids = select(kochbuch.store, args.rezepte)
+    except KeyError as e:
+        print(f"❌ {e.args[0]}", file=sys.stderr)
+        sys.exit(1)
+    tabelle = ZutatenTabelle(kochbuch.store.get(recipe_id) for recipe_id in dict.fromkeys(recipe_ids))
+    sys.stdout.reconfigure(encoding="utf-8")
+    for recipe_id in recipe_ids:
+        print("#", kochbuch.store.get(recipe_id).get(NAME))
+    for entry in tabelle.einkaufsliste(recipe_ids, args.portionen):
+        print("-", format_entry(*entry))
+
+if __name__ == "__main__":
+    main()
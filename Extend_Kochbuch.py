@@ -1,13 +1,38 @@
 import os
+import sys
 import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from Store_Kochbuch import KochbuchDatei, write_json_atomic, ID
+from Datenbank_Kochbuch import SQLiteStore
+from Archiv_Kochbuch import ArchivStore, INDEX_SUFFIX
+from Bilder_Kochbuch import BildSpeicher, file_hash
+from Parser_Kochbuch import parse_text, parse_ingredients, MENGEN
+from Dubletten_Kochbuch import DublettenIndex
+import Messung_Kochbuch
+from Messung_Kochbuch import Messung, count, record, event, now, TRACE_PATH, PROFILE_PATH
 
 try:
     import pytesseract
+    from PIL import Image, ImageOps
 except ImportError:
-    print("pytesseract not found, OCR functionality will be disabled.")
+    print("pytesseract not found, OCR functionality will be disabled.", file=sys.stderr)
     pytesseract = None
 
 IMAGES_FOLDER = "Quellen"
+INPUT_FOLDER = "Input"
+INPUT_SUFFIXES = (".json", ".jsonl")
+REPORT_PATH = os.path.join("Build", "import.json")
+# recipes per journal write / database transaction of a bulk import
+BATCH_SIZE = 500
+OCR_CACHE_PATH = os.path.join("Build", "ocr.json")
+# tesseract does not get better beyond roughly 300 dpi for an A4 page
+OCR_MAX_SIZE = 2500
+# deskew: angles (in degrees) tried on a small copy of the page
+OCR_ANGLES = [a / 2 for a in range(-10, 11)]
 LOST_AND_FOUND = "Lost and Found"
 NAME = "Name"
 ANLEITUNG = "Anleitung"
@@ -15,97 +40,311 @@ ZUTATEN = "Zutaten"
 NOTES = "Notes"
 
 class Kochbuch():
-    def __init__(self):
-        with open("Kochbuch.json", "r", encoding="utf-8") as f:
-            self.kochbuch = json.load(f)
-        self.known_names = [doc[NAME] for doc in self.kochbuch["documents"]]
+    def __init__(self, path="Kochbuch.json", read_only=False):
+        # near-duplicate index, built on the first import, see similar_recipes
+        self.dubletten = None
+        # photos of new recipes are copied into Bilder/ by content
+        self.bilder = BildSpeicher()
+        if path.endswith(".db") or path.endswith(INDEX_SUFFIX):
+            self.datei = None
+            self.store = SQLiteStore(path) if path.endswith(".db") else ArchivStore(path)
+            # snapshot for rendering (documents of an archive are read on use), changes go through the store
+            self.kochbuch = {"total": len(self.store), "documents": self.store.documents}
+            return
+        self.datei = KochbuchDatei(path)
+        self.kochbuch, self.store = self.datei.load(read_only)
+        # bulk changes are not journaled, save() writes the whole book
+        self.store.journal = None
+
+    def save(self):
+        if self.datei:
+            self.datei.save(self.kochbuch)
+        else:
+            self.store.commit()
+        self.bilder.save_index()
+
+    def batch(self):
+        return self.datei.batch() if self.datei else self.store.batch()
+
+    def add_document(self, doc):
+        """Apply the defaults and add doc unless a recipe of that name exists.
+        Returns the new ID or None for a duplicate."""
+        name = doc.get(NAME,"Unnamed")
+        if self.store.has_name(name):
+            return None
+        if doc.get("Kapitel") is None:
+            doc["Kapitel"] = LOST_AND_FOUND
+        if doc.get("Serves") is None:
+            doc["Serves"] = 1
+        doc.setdefault(NAME, name)
+        doc[MENGEN] = parse_ingredients(doc.get(ZUTATEN))
+        recipe_id = self.store.add(doc)
+        if self.dubletten is not None:
+            self.dubletten.add(recipe_id, doc)
+        return recipe_id
+
+    def similar_recipes(self, doc):
+        """Names of the recipes in the book which look like doc under another name."""
+        if self.dubletten is None:
+            self.dubletten = DublettenIndex((recipe[ID], recipe) for recipe in self.store)
+        return [self.store.get(key).get(NAME) for key, _ in self.dubletten.similar(doc, exclude=doc.get(ID))]
 
     def upload_documents(self, documents):
         for doc in documents:
             name = doc.get(NAME,"Unnamed")
-            if name in self.known_names:
+            print("Uploading receipy: ", name)
+            similar = self.similar_recipes(doc)
+            if self.add_document(doc) is None:
                 print("Existing document found!", name)
                 continue
-            print("Uploading receipy: ", name)
-            if doc.get("Kapitel") is None:  
-                doc["Kapitel"] = LOST_AND_FOUND
-            if doc.get("Serves") is None:  
-                doc["Serves"] = 1
-
-            self.kochbuch["documents"].append(doc)
             print("Uploaded document: ", doc[NAME])
-            self.known_names.append(name)
+            if similar:
+                print("⚠️ Looks like: ", ", ".join(similar))
+
+    def import_input(self, directory=INPUT_FOLDER, workers=None, batch_size=BATCH_SIZE):
+        """Bulk import: parse the input files in a thread pool and stream their
+        recipes through add_document, committing every batch_size recipes.
+        A broken file or line is recorded in the report and skipped.
+        Returns the report."""
+        start = time.perf_counter()
+        files = {}
+        def documents():
+            for path, docs, errors in read_input_files(input_files(directory), workers):
+                entry = files[path] = {"read": len(docs), "added": 0, "duplicates": [], "similar": {}, "errors": errors}
+                for doc in docs:
+                    yield entry, doc
+
+        # journal the batches, so an interrupted import keeps what it committed
+        if self.datei:
+            self.store.journal = self.datei
+        try:
+            stream = documents()
+            done = False
+            while not done:
+                done = True
+                with self.batch(), Messung("import.batch"):
+                    for entry, doc in itertools.islice(stream, batch_size):
+                        done = False
+                        similar = self.similar_recipes(doc)
+                        if self.add_document(doc) is None:
+                            entry["duplicates"].append(doc.get(NAME, "Unnamed"))
+                        else:
+                            entry["added"] += 1
+                            if similar:
+                                entry["similar"][doc[NAME]] = similar
+        finally:
+            if self.datei:
+                self.store.journal = None
+        return {
+            "seconds": round(time.perf_counter() - start, 3),
+            "read": sum(entry["read"] for entry in files.values()),
+            "added": sum(entry["added"] for entry in files.values()),
+            "duplicates": sum(len(entry["duplicates"]) for entry in files.values()),
+            "similar": sum(len(entry["similar"]) for entry in files.values()),
+            "errors": sum(len(entry["errors"]) for entry in files.values()),
+            "files": files,
+        }
 
     # === OCR Function ===
     def extract_text_from_image(self, image_path):
+        return ocr_image(image_path)
+
+    def extract_texts(self, image_paths, workers=None, cache_path=OCR_CACHE_PATH):
+        """OCR all image_paths in a process pool and return {path: text}.
+        Texts are cached by the hash of the image, so a photo is only read
+        once; photos which could not be read are left out and tried again
+        on the next run."""
+        if pytesseract is None:
+            return {}
         try:
-            img = Image.open(image_path)
-            text = pytesseract.image_to_string(img, lang="deu")  # change 'deu' to 'eng' or another language if needed
-            return text.strip()
-        except Exception as e:
-            print(f"⚠️ OCR failed for {image_path}: {e}")
-            return ""
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        except Exception:
+            cache = {}
+        hashes = cache.setdefault("hashes", {})
+        texts = cache.setdefault("texts", {})
+
+        digests = {path: file_hash(path, hashes) for path in image_paths}
+        todo = [path for path, digest in digests.items() if digest not in texts]
+        print(f"OCR: {len(image_paths) - len(todo)} cached, {len(todo)} to read")
+        count("ocr.cached", len(image_paths) - len(todo))
+        if todo:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for path, (text, span) in zip(todo, pool.map(ocr_job, todo)):
+                    print("OCR done: ", path)
+                    record(span)
+                    if text is not None:
+                        texts[digests[path]] = text
+
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            write_json_atomic(cache_path, cache)
+        return {path: texts[digest] for path, digest in digests.items() if digest in texts}
         
     # === Function to upload image and link to document ===
-    def upload_image_and_link(self, image_path, name):
-        image_name = os.path.basename(image_path)
+    def upload_image_and_link(self, image_path, name, notes=None):
+        # stored under its content hash, the same photo twice is one file
+        image_name = self.bilder.add(image_path)
 
         # Link file ID to the document in the database
-        #notes = self.extract_text_from_image(image_path)
-        notes = ""
-        print(f"Create document with image for {name}...", notes)
+        print(f"Create document with image for {name}...", notes or "")
         
-        self.kochbuch["documents"].append({
-                "Bild": image_name,
+        doc = {
+                "Bild": [image_name],
                 "Name": name,
-                "Notes": None,
+                "Notes": notes or None,
                 "Serves": 1,
                 "Kapitel": LOST_AND_FOUND
                 }
-        )
+        if notes:
+            # draft from the OCR text, the raw text stays in Notes for the review
+            doc.update(parse_text(notes))
+            doc[MENGEN] = parse_ingredients(doc[ZUTATEN])
+        self.store.add(doc)
         print(f"✅ Linked {image_name} to document {name}")
 
+# === Input files ===
+def input_files(directory=INPUT_FOLDER):
+    return sorted(entry.path for entry in os.scandir(directory)
+                  if entry.is_file() and entry.name.endswith(INPUT_SUFFIXES))
+
+def read_input_file(path):
+    """(path, documents, errors) of one .json (a recipe or a list of them)
+    or .jsonl file (a recipe per line)."""
+    errors = []
+    docs = []
+    try:
+        with Messung("import.read", path=path), open(path, "r", encoding="utf-8") as f:
+            if not path.endswith(".jsonl"):
+                data = json.load(f)
+                docs = [data] if isinstance(data, dict) else data if isinstance(data, list) else None
+                if docs is None:
+                    return path, [], [f"expected a recipe or a list of recipes, not {type(data).__name__}"]
+            else:
+                for number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        docs.append(json.loads(line))
+                    except json.JSONDecodeError as e:
+                        errors.append(f"line {number}: {e}")
+    except (OSError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        return path, [], [str(e)]
+    recipes = [doc for doc in docs if isinstance(doc, dict)]
+    if len(recipes) != len(docs):
+        errors.append(f"{len(docs) - len(recipes)} entries are not recipes")
+    return path, recipes, errors
+
+def read_input_files(paths, workers=None):
+    """read_input_file for all paths in a thread pool, in order. Only a few
+    files are read ahead, so a large Input/ is not held in memory at once."""
+    # the default of ThreadPoolExecutor
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        window = workers * 2
+        futures = [pool.submit(read_input_file, path) for path in paths[:window]]
+        for i in range(len(paths)):
+            result = futures[i].result()
+            futures[i] = None
+            if i + window < len(paths):
+                futures.append(pool.submit(read_input_file, paths[i + window]))
+            yield result
+
+# === OCR worker, runs in the process pool ===
+def deskew_angle(img):
+    """Angle which makes the text lines horizontal: the rotation whose row
+    means vary the most, i.e. alternate most clearly between text and gaps."""
+    small = img.copy()
+    small.thumbnail((600, 600))
+    small = small.point(lambda p: 255 if p < 128 else 0)
+    best, best_score = 0, -1
+    for angle in OCR_ANGLES:
+        rows = list(small.rotate(angle, fillcolor=0).resize((1, small.height), Image.BOX).getdata())
+        mean = sum(rows) / len(rows)
+        score = sum((r - mean) ** 2 for r in rows)
+        if score > best_score:
+            best, best_score = angle, score
+    return best
+
+def preprocess(img):
+    """Upright, grayscale, at most OCR_MAX_SIZE pixels and deskewed."""
+    img = ImageOps.exif_transpose(img).convert("L")
+    img.thumbnail((OCR_MAX_SIZE, OCR_MAX_SIZE), Image.Resampling.LANCZOS)
+    angle = deskew_angle(img)
+    if angle:
+        img = img.rotate(angle, resample=Image.Resampling.BICUBIC, expand=True, fillcolor=255)
+    return img
+
+def ocr_job(image_path):
+    # the text and the span of one image, recorded by the parent process
+    start = now()
+    text = ocr_image(image_path)
+    return text, event("ocr.image", start, now() - start, path=image_path)
+
+def ocr_image(image_path):
+    """The text of the photo, None if tesseract failed (not "", which would be cached)."""
+    try:
+        with Image.open(image_path) as img:
+            img.draft("L", (OCR_MAX_SIZE, OCR_MAX_SIZE))
+            text = pytesseract.image_to_string(preprocess(img), lang="deu")  # change 'deu' to 'eng' or another language if needed
+        return text.strip()
+    except Exception as e:
+        print(f"⚠️ OCR failed for {image_path}: {e}")
+        return None
+
 def main():
-    kochbuch = Kochbuch()
+    parser = argparse.ArgumentParser(description="Rezepte aus Input/ und Quellen/ ins Kochbuch übernehmen")
+    parser.add_argument("book", nargs="?", default="Kochbuch.json", help="Kochbuch.json, eine SQLite-Datenbank (*.db) oder ein Archiv (*.archiv)")
+    parser.add_argument("--no-ocr", action="store_true", help="Fotos nicht mit tesseract lesen")
+    parser.add_argument("--workers", type=int, default=None, help="Anzahl paralleler OCR-Prozesse bzw. Threads beim Einlesen")
+    parser.add_argument("--bulk", action="store_true", help="Input/ parallel und in Stapeln importieren, Bericht statt Ausgabe je Rezept")
+    parser.add_argument("--report", default=REPORT_PATH, help="Importbericht (JSON) für --bulk")
+    parser.add_argument("--trace", nargs="?", const=TRACE_PATH, help=f"Zeitmessung als Chrome-Trace (Standard {TRACE_PATH}) und Übersicht auf stderr")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_PATH, help=f"mit cProfile messen (Standard {PROFILE_PATH})")
+    args = parser.parse_args()
+    Messung_Kochbuch.start(args.trace, args.profile)
+
+    kochbuch = Kochbuch(args.book)
     print("Starting Uploader")
-    receipies = []
-    directory = "Input"
-    files = json_files = [f for f in os.listdir(directory) if f.endswith(".json")]
-    print("found files: ", files)
-    for f in files:
-        print("reading ", f)
-        inputfile = os.path.join("Input", f)
-        with open(inputfile, "r", encoding="utf-8") as f:
-            try:
-                input = json.load(f)
-                if isinstance(input, dict):
-                    input = [input]
-                for rec in input:
-                    print("adding recepie: ", rec.get(NAME, "Unnamed"))
-                    receipies.append(rec)
-            except json.JSONDecodeError as e:
-                print(f"❌ Failed to parse {inputfile}: {e}")
-
-    kochbuch.upload_documents(receipies)
+    if args.bulk:
+        report = kochbuch.import_input(INPUT_FOLDER, args.workers)
+        os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+        write_json_atomic(args.report, report)
+        print(f"Imported {report['added']} of {report['read']} recipes from {len(report['files'])} files "
+              f"in {report['seconds']:.1f} s ({report['duplicates']} duplicates, {report['similar']} similar, {report['errors']} errors), "
+              f"report in {args.report}")
+    else:
+        receipies = []
+        files = input_files(INPUT_FOLDER)
+        print("found files: ", files)
+        for path, docs, errors in read_input_files(files, 1):
+            print("reading ", path)
+            for error in errors:
+                print(f"❌ Failed to parse {path}: {error}")
+            for rec in docs:
+                print("adding recepie: ", rec.get(NAME, "Unnamed"))
+                receipies.append(rec)
 
+        with Messung("upload.documents", documents=len(receipies)):
+            kochbuch.upload_documents(receipies)
+
+    new_images = {}
     for filename in os.listdir(IMAGES_FOLDER):
         name = ".".join(filename.split('.')[0:-1])
-        if name in kochbuch.known_names:
+        if kochbuch.store.has_name(name) or name in new_images:
             print("Image for known document found, skipping upload: ", filename)
             continue
         if filename.lower().endswith(".jpg"):
-            file_path = os.path.join(IMAGES_FOLDER, filename)
-
-            try:
-                kochbuch.upload_image_and_link(file_path, name)
-                kochbuch.known_names.append(name)
-            except Exception as e:
-                print(f"❌ Failed to upload {filename}: {e}")
-
-    with open("Kochbuch.json", "w", encoding="utf-8") as f:
-        total = len(kochbuch.kochbuch["documents"])
-        kochbuch.kochbuch["total"] = total
-        json.dump(kochbuch.kochbuch, f, ensure_ascii=False, indent=4)
+            new_images[name] = os.path.join(IMAGES_FOLDER, filename)
+
+    texts = {} if args.no_ocr else kochbuch.extract_texts(list(new_images.values()), args.workers)
+    for name, file_path in new_images.items():
+        try:
+            with Messung("upload.image", name=name):
+                kochbuch.upload_image_and_link(file_path, name, texts.get(file_path))
+        except Exception as e:
+            print(f"❌ Failed to upload {os.path.basename(file_path)}: {e}")
+
+    kochbuch.save()
 
 if __name__ == "__main__":
     main()
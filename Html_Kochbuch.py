@@ -0,0 +1,472 @@
+import os
+import re
+import json
+import time
+import html
+import hashlib
+import zipfile
+import argparse
+from urllib.parse import quote
+from concurrent.futures import ProcessPoolExecutor
+
+from TeX_Kochbuch import KochbuchTex, OUTPUT_PATH, BUILD_PATH
+from Bilder_Kochbuch import BildCache, image_list, place_file, resolve
+from Suche_Kochbuch import SuchIndex, fold, EXACT_BONUS
+from Store_Kochbuch import write_json_atomic
+import Messung_Kochbuch
+from Messung_Kochbuch import Messung, record, event, now, TRACE_PATH, PROFILE_PATH
+
+SITE_PATH = os.path.join(OUTPUT_PATH, "html")
+EPUB_PATH = os.path.join(OUTPUT_PATH, "Kochbuch.epub")
+MANIFEST_PATH = os.path.join(BUILD_PATH, "html.json")
+# hashes of the originals, kept out of the published directory
+THUMB_INDEX_PATH = os.path.join(BUILD_PATH, "html-bilder.json")
+# widths of the thumbnails in the srcset of a picture; the EPUB takes EPUB_WIDTH
+THUMB_WIDTHS = (320, 640, 1280)
+EPUB_WIDTH = 640
+# recipes per job of the process pool
+PAGE_CHUNK = 500
+# results shown by the search of index.html
+SEARCH_LIMIT = 50
+SLUG_PATTERN = re.compile(r"[^a-z0-9]+")
+# the search index files assign to this global, see search_script
+SEARCH_GLOBAL = "KOCHBUCH_SUCHE"
+
+STYLE = """body { font-family: Georgia, serif; max-width: 46rem; margin: 0 auto; padding: 1rem; line-height: 1.5; color: #222; }
+a { color: #7a3b00; }
+nav { font-size: 0.9rem; margin-bottom: 1rem; }
+.meta { color: #666; }
+figure { margin: 1rem 0; }
+figure img { max-width: 100%; height: auto; }
+ul.rezepte { list-style: none; padding: 0; display: grid; grid-template-columns: repeat(auto-fill, minmax(14rem, 1fr)); gap: 1rem; }
+ul.rezepte img { width: 100%; height: 9rem; object-fit: cover; display: block; }
+input[type=search] { width: 100%; font-size: 1.1rem; padding: 0.4rem; box-sizing: border-box; }
+.notiz { background: #f6f1e7; padding: 0.5rem 1rem; }
+"""
+
+# the search of Suche_Kochbuch in the browser, over the shards written by search_files;
+# they are scripts, browsers refuse fetch() for a site opened from disk
+SCRIPT = """const FOLDING = %(folding)s;
+const EXACT_BONUS = %(bonus)d, LIMIT = %(limit)d;
+const loaded = window.%(global)s = {}, shards = {};
+let rezepte = null;
+function fold(text) { return text.toLowerCase().replace(/[^a-z0-9]/g, c => FOLDING[c] || c).normalize("NFKD").replace(/[\\u0300-\\u036f]/g, ""); }
+function tokenize(text) { return fold(text).match(/[a-z0-9]+/g) || []; }
+function load(name) {
+  // a shard that is not there (no word starts with that letter) is empty
+  return new Promise(resolve => {
+    const script = document.createElement("script");
+    script.src = `suche/${name}.js`;
+    script.onload = () => resolve(loaded[name] || []);
+    script.onerror = () => resolve([]);
+    document.head.append(script);
+  });
+}
+async function matches(word) {
+  const key = word[0];
+  if (!(key in shards)) shards[key] = await load(key);
+  const words = shards[key], found = new Map();
+  let lo = 0, hi = words.length;
+  while (lo < hi) { const mid = (lo + hi) >> 1; if (words[mid][0] < word) lo = mid + 1; else hi = mid; }
+  for (let i = lo; i < words.length && words[i][0].startsWith(word); i++) {
+    const bonus = words[i][0] === word ? EXACT_BONUS : 1, postings = words[i][1];
+    for (let j = 0; j < postings.length; j += 2) found.set(postings[j], (found.get(postings[j]) || 0) + postings[j + 1] * bonus);
+  }
+  return found;
+}
+async function search(query) {
+  const words = [...new Set(tokenize(query))];
+  if (!words.length) return [];
+  rezepte = rezepte || await load("rezepte");
+  let scores = null;
+  for (const word of words) {
+    const found = await matches(word);
+    if (scores === null) { scores = found; continue; }
+    for (const [n, score] of scores) { if (found.has(n)) scores.set(n, score + found.get(n)); else scores.delete(n); }
+  }
+  return [...scores].sort((a, b) => b[1] - a[1]).slice(0, LIMIT).map(([n]) => rezepte[n]);
+}
+const input = document.getElementById("suche"), list = document.getElementById("treffer");
+let pending = 0;
+input.addEventListener("input", async () => {
+  const ticket = ++pending, found = await search(input.value);
+  if (ticket !== pending) return;
+  list.replaceChildren(...found.map(([name, url, kapitel]) => {
+    const li = document.createElement("li"), a = document.createElement("a");
+    a.href = url; a.textContent = name; li.append(a, ` – ${kapitel}`); return li;
+  }));
+});
+"""
+
+EPUB_CONTAINER = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>
+"""
+
+def search_script(name, data):
+    """suche/<name>.js, which puts data into SEARCH_GLOBAL[name] when loaded."""
+    return (f"{SEARCH_GLOBAL}[{json.dumps(name)}]="
+            + json.dumps(data, ensure_ascii=False, separators=(",", ":")) + ";\n")
+
+def slug(text):
+    """'Käse-Spätzle (2)' -> 'kaese-spaetzle-2', for file names and URLs."""
+    return SLUG_PATTERN.sub("-", fold(text)).strip("-") or "x"
+
+def page(title, body, root="", head=""):
+    e = html.escape
+    return ("<!DOCTYPE html>\n<html lang=\"de\" xmlns=\"http://www.w3.org/1999/xhtml\">\n<head>\n<meta charset=\"utf-8\"/>\n"
+            "<meta name=\"viewport\" content=\"width=device-width, initial-scale=1\"/>\n"
+            f"<title>{e(title)}</title>\n<link rel=\"stylesheet\" href=\"{root}style.css\"/>\n{head}</head>\n"
+            f"<body>\n{body}</body>\n</html>\n")
+
+def picture(sources, alt, root="", sizes="(max-width: 46rem) 100vw, 46rem"):
+    """<img> with a srcset of the thumbnails [(width, file)], or "" without any."""
+    if not sources:
+        return ""
+    # file names may have spaces and commas, which would split the srcset
+    url = lambda name: html.escape(f"{root}bilder/{quote(name)}")
+    srcset = ", ".join(f"{url(name)} {width}w" for width, name in sources)
+    return (f"<img src=\"{url(sources[0][1])}\" srcset=\"{srcset}\" sizes=\"{sizes}\" "
+            f"alt=\"{html.escape(alt)}\" loading=\"lazy\"/>")
+
+def recipe_body(doc, images, heading="h1", root="../"):
+    """The recipe itself, shared by the pages and the EPUB chapters."""
+    e = html.escape
+    out = [f"<{heading}>{e(doc.get('Name', 'Unnamed'))}</{heading}>\n",
+           f"<p class=\"meta\">{e(str(doc.get('Serves', 1)))} Portionen · {e(str(doc.get('Dauer', 10)))} Minuten</p>\n"]
+    for sources in images:
+        out.append(f"<figure>{picture(sources, doc.get('Name', ''), root)}</figure>\n")
+    ingredients = KochbuchTex.normalize_list(doc.get("Zutaten", []))
+    if ingredients:
+        out.append("<h2>Zutaten</h2>\n<ul>\n")
+        out.extend(f"<li>{e(z)}</li>\n" for z in ingredients)
+        out.append("</ul>\n")
+    instructions = KochbuchTex.normalize_list(doc.get("Anleitung", []))
+    if instructions:
+        out.append("<h2>Zubereitung</h2>\n<ol>\n")
+        out.extend(f"<li>{e(a)}</li>\n" for a in instructions)
+        out.append("</ol>\n")
+    if doc.get("Notes"):
+        out.append(f"<p class=\"notiz\">{e(doc['Notes'])}</p>\n")
+    return "".join(out)
+
+def recipe_page(doc, info):
+    e = html.escape
+    nav = [f"<a href=\"../index.html\">Kochbuch</a> › <a href=\"../{info['kapitel_url']}\">{e(info['kapitel'])}</a>"]
+    if info["prev"]:
+        nav.append(f" · <a href=\"../{info['prev']}\" rel=\"prev\">zurück</a>")
+    if info["next"]:
+        nav.append(f" · <a href=\"../{info['next']}\" rel=\"next\">weiter</a>")
+    body = f"<nav>{''.join(nav)}</nav>\n<article>\n{recipe_body(doc, info['images'])}</article>\n"
+    return page(doc.get("Name", "Unnamed"), body, "../")
+
+def write_if_changed(site, path, text, old_hash):
+    """Write text to site/path unless it has the hash old_hash; returns (hash, written)."""
+    data = text.encode("utf-8")
+    digest = hashlib.sha1(data).hexdigest()
+    target = os.path.join(site, path)
+    if digest == old_hash and os.path.isfile(target):
+        return digest, False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, target)
+    return digest, True
+
+def render_job(site, pages, old_hashes):
+    """Render and write [(path, doc, info)] in a worker process.
+    Returns ({path: hash}, pages written, trace event)."""
+    start = now()
+    hashes = {}
+    written = 0
+    for path, doc, info in pages:
+        hashes[path], changed = write_if_changed(site, path, recipe_page(doc, info), old_hashes.get(path))
+        written += changed
+    return hashes, written, event("html.chunk", start, now() - start, pages=len(pages), written=written)
+
+def postings_job(docs, first):
+    """{word: [recipe, weight, ...]} of docs, numbered from first; the
+    expensive part of the search index, merged by search_files."""
+    postings = {}
+    for n, doc in enumerate(docs, first):
+        for word, weight in SuchIndex.recipe_terms(doc).items():
+            entry = postings.get(word)
+            if entry is None:
+                postings[word] = [n, weight]
+            else:
+                entry += (n, weight)
+    return postings
+
+class KochbuchHtml(KochbuchTex):
+    """Static HTML site (and optionally an EPUB) of the book: one page per
+    recipe, an index page per chapter, a search index for the browser and
+    thumbnails instead of the originals. Chapters come in the order of the
+    TeX build; a page is only written when its content changed."""
+
+    def __init__(self, path="Kochbuch.json", site=SITE_PATH):
+        super().__init__(path)
+        self.site = site
+        self.manifest_path = MANIFEST_PATH
+        # Bild -> [(width, file in site/bilder)], see prepare_thumbnails
+        self.thumbnails = {}
+        self.manifest = self.load_site_manifest()
+
+    def load_site_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except Exception:
+            return {}
+        # built for another output directory
+        return manifest if manifest.get("site") == os.path.abspath(self.site) else {}
+
+    def prepare_thumbnails(self, workers=None):
+        """Scale all pictures to THUMB_WIDTHS into site/bilder. Pictures whose
+        original has the size and mtime of the last build are not opened again."""
+        image_files = list(dict.fromkeys(f for doc in self.kochbuch["documents"] for f in image_list(doc)))
+        target = os.path.join(self.site, "bilder")
+        os.makedirs(target, exist_ok=True)
+        known = self.manifest.get("thumbnails", {})
+        state = {}
+        todo = []
+        for image_file in image_files:
+            src = resolve(image_file)
+            if src is None:
+                continue
+            st = os.stat(src)
+            old = known.get(image_file)
+            if old and old[:3] == [src, st.st_size, st.st_mtime_ns] and \
+                    all(os.path.isfile(os.path.join(target, name)) for _, name in old[3]):
+                state[image_file] = old
+            else:
+                state[image_file] = [src, st.st_size, st.st_mtime_ns, []]
+                todo.append(image_file)
+        with Messung("html.images", images=len(image_files), scaled=len(todo)):
+            for width in THUMB_WIDTHS:
+                paths = BildCache(cache_path=target, max_width=width, index_path=THUMB_INDEX_PATH).prepare(todo, workers) if todo else {}
+                for image_file, path in paths.items():
+                    if os.path.dirname(os.path.abspath(path)) != os.path.abspath(target):
+                        # small enough already (or no PIL): the original goes next to the thumbnails
+                        name = os.path.basename(path)
+                        if not os.path.isfile(os.path.join(target, name)):
+                            place_file(path, os.path.join(target, name))
+                        path = os.path.join(target, name)
+                    sources = state[image_file][3]
+                    if all(os.path.basename(path) != name for _, name in sources):
+                        sources.append([width, os.path.basename(path)])
+        self.manifest["thumbnails"] = state
+        self.thumbnails = {image_file: [tuple(source) for source in entry[3]] for image_file, entry in state.items() if entry[3]}
+
+    def layout(self):
+        """[(Kapitel, chapter page, [(recipe page, doc)])] in the order of the book."""
+        kapitel = self.load_chapters()
+        groups = self.group_documents(kapitel)
+        chapters = []
+        used = set()
+        for kap in kapitel:
+            kapitel_url = f"kapitel/{slug(kap)}.html"
+            recipes = []
+            for doc in groups[kap]:
+                name = str(doc.get("Name", "Unnamed"))
+                url = f"rezepte/{slug(name)}.html"
+                n = 2
+                while url in used:
+                    url = f"rezepte/{slug(name)}-{n}.html"
+                    n += 1
+                used.add(url)
+                recipes.append((url, doc))
+            chapters.append((str(kap), kapitel_url, recipes))
+        return chapters
+
+    def images_of(self, doc):
+        return [self.thumbnails[f] for f in image_list(doc) if f in self.thumbnails]
+
+    def chapter_page(self, kap, recipes):
+        e = html.escape
+        items = []
+        for url, doc in recipes:
+            images = self.images_of(doc)
+            thumb = picture(images[0][:1], "", "../", "14rem") if images else ""
+            items.append(f"<li><a href=\"../{url}\">{thumb}{e(doc.get('Name', 'Unnamed'))}</a> "
+                         f"<span class=\"meta\">{e(str(doc.get('Dauer', 10)))} Min.</span></li>\n")
+        body = (f"<nav><a href=\"../index.html\">Kochbuch</a></nav>\n<h1>{e(kap)}</h1>\n"
+                f"<ul class=\"rezepte\">\n{''.join(items)}</ul>\n")
+        return page(kap, body, "../")
+
+    def index_page(self, chapters):
+        e = html.escape
+        items = "".join(f"<li><a href=\"{url}\">{e(kap)}</a> <span class=\"meta\">({len(recipes)})</span></li>\n"
+                        for kap, url, recipes in chapters if recipes)
+        body = ("<h1>Kochbuch</h1>\n<input type=\"search\" id=\"suche\" placeholder=\"Suchen …\" autofocus=\"autofocus\"/>\n"
+                "<ul id=\"treffer\"></ul>\n<h2>Kapitel</h2>\n"
+                f"<ul>\n{items}</ul>\n<script src=\"suche.js\"></script>\n")
+        return page("Kochbuch", body)
+
+    def search_files(self, chapters, parts):
+        """{path: text} of the search index: suche/rezepte.js with [name, url, Kapitel]
+        per recipe and one shard of [[word, [recipe, weight, ...]]] per first letter.
+        parts are the results of postings_job for the recipes in the order of chapters."""
+        rezepte = [[doc.get("Name", "Unnamed"), url, kap] for kap, _, recipes in chapters for url, doc in recipes]
+        shards = {}
+        for part in parts:
+            for word, postings in part.items():
+                shard = shards.setdefault(word[0], {})
+                if word in shard:
+                    shard[word] += postings
+                else:
+                    shard[word] = postings
+        files = {"suche/rezepte.js": search_script("rezepte", rezepte)}
+        for key, words in shards.items():
+            files[f"suche/{key}.js"] = search_script(key, sorted(words.items()))
+        return files
+
+    def static_files(self):
+        folding = {c: fold(c) for c in "äöüßéèà"}
+        return {
+            "suche.js": SCRIPT % {"folding": json.dumps(folding, ensure_ascii=False), "bonus": EXACT_BONUS, "limit": SEARCH_LIMIT,
+                                  "global": SEARCH_GLOBAL},
+            "style.css": STYLE,
+        }
+
+    def generate_site(self, workers=None):
+        """Write the site into self.site; returns (files, files written)."""
+        old = self.manifest.get("pages", {})
+        chapters = self.layout()
+        hashes = {}
+        written = 0
+
+        jobs = []
+        for kap, kapitel_url, recipes in chapters:
+            for i, (url, doc) in enumerate(recipes):
+                info = {"kapitel": kap, "kapitel_url": kapitel_url, "images": self.images_of(doc),
+                        "prev": recipes[i - 1][0] if i > 0 else None,
+                        "next": recipes[i + 1][0] if i + 1 < len(recipes) else None}
+                # a plain dict, documents of an archive or database do not pickle
+                jobs.append((url, dict(doc), info))
+        chunks = [jobs[i:i + PAGE_CHUNK] for i in range(0, len(jobs), PAGE_CHUNK)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            with Messung("html.pages", pages=len(jobs)):
+                futures = [pool.submit(render_job, self.site, chunk, {path: old.get(path) for path, _, _ in chunk})
+                           for chunk in chunks]
+                for future in futures:
+                    chunk_hashes, chunk_written, span = future.result()
+                    record(span)
+                    hashes.update(chunk_hashes)
+                    written += chunk_written
+
+            # the recipe pages show every field the search looks at; if none
+            # of them changed (nor their order), the search index is the same;
+            # it is read by SCRIPT, which fixes the format of the files
+            digest = hashlib.sha1((SCRIPT + "".join(f"{url}:{hashes[url]}\n" for url, _, _ in jobs)).encode("utf-8")).hexdigest()
+            search = {path: h for path, h in old.items() if path.startswith("suche/")}
+            if digest != self.manifest.get("search") or \
+                    not all(os.path.isfile(os.path.join(self.site, path)) for path in search):
+                with Messung("html.search", recipes=len(jobs)):
+                    parts = pool.map(postings_job, ([doc for _, doc, _ in chunk] for chunk in chunks),
+                                     range(0, len(jobs), PAGE_CHUNK))
+                    search = {}
+                    for path, text in self.search_files(chapters, parts).items():
+                        search[path], changed = write_if_changed(self.site, path, text, old.get(path))
+                        written += changed
+            hashes.update(search)
+
+        with Messung("html.index"):
+            files = {url: self.chapter_page(kap, recipes) for kap, url, recipes in chapters if recipes}
+            files["index.html"] = self.index_page(chapters)
+            files.update(self.static_files())
+            for path, text in files.items():
+                hashes[path], changed = write_if_changed(self.site, path, text, old.get(path))
+                written += changed
+
+        # pages of recipes and chapters that are gone
+        for path in old:
+            if path not in hashes and os.path.isfile(os.path.join(self.site, path)):
+                os.remove(os.path.join(self.site, path))
+        self.manifest.update({"site": os.path.abspath(self.site), "pages": hashes, "search": digest})
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        write_json_atomic(self.manifest_path, self.manifest)
+        return len(hashes), written
+
+    def generate_epub(self, out_path=EPUB_PATH):
+        """EPUB 3 with one XHTML file per chapter and the EPUB_WIDTH thumbnails."""
+        e = html.escape
+        chapters = [c for c in self.layout() if c[2]]
+        with Messung("html.epub", chapters=len(chapters)):
+            items = []
+            images = {}
+            tmp = f"{out_path}.tmp"
+            os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+            with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED) as epub:
+                # the mimetype comes first and uncompressed
+                epub.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+                epub.writestr("META-INF/container.xml", EPUB_CONTAINER)
+                for number, (kap, _, recipes) in enumerate(chapters, 1):
+                    body = [f"<h1>{e(kap)}</h1>\n"]
+                    for _, doc in recipes:
+                        sources = []
+                        for thumbs in self.images_of(doc):
+                            # one picture per image, the largest up to EPUB_WIDTH
+                            width, name = max((t for t in thumbs if t[0] <= EPUB_WIDTH), default=thumbs[0])
+                            images[name] = os.path.join(self.site, "bilder", name)
+                            sources.append([(width, name)])
+                        body.append(f"<section>\n{recipe_body(doc, sources, 'h2', '')}</section>\n")
+                    name = f"kapitel{number:03d}.xhtml"
+                    text = page(kap, "".join(body)).replace("<!DOCTYPE html>", "<?xml version=\"1.0\" encoding=\"utf-8\"?>\n<!DOCTYPE html>")
+                    # lazy loading is for the web pages
+                    epub.writestr(f"OEBPS/{name}", text.replace(" loading=\"lazy\"", ""))
+                    items.append((name, kap))
+                epub.writestr("OEBPS/style.css", STYLE)
+                for name, path in images.items():
+                    if os.path.isfile(path):
+                        epub.write(path, f"OEBPS/bilder/{name}")
+                nav = "".join(f"<li><a href=\"{name}\">{e(kap)}</a></li>\n" for name, kap in items)
+                epub.writestr("OEBPS/nav.xhtml", "<?xml version=\"1.0\" encoding=\"utf-8\"?>\n" + page(
+                    "Inhalt", f"<nav epub:type=\"toc\" xmlns:epub=\"http://www.idpf.org/2007/ops\"><h1>Inhalt</h1>\n<ol>\n{nav}</ol></nav>\n"))
+                identifier = hashlib.sha1("".join(kap for _, kap in items).encode("utf-8")).hexdigest()
+                manifest = ["<item id=\"nav\" href=\"nav.xhtml\" media-type=\"application/xhtml+xml\" properties=\"nav\"/>",
+                            "<item id=\"css\" href=\"style.css\" media-type=\"text/css\"/>"]
+                manifest += [f"<item id=\"k{i}\" href=\"{name}\" media-type=\"application/xhtml+xml\"/>" for i, (name, _) in enumerate(items)]
+                manifest += [f"<item id=\"b{i}\" href=\"bilder/{e(quote(name))}\" media-type=\"{'image/png' if name.endswith('.png') else 'image/jpeg'}\"/>"
+                             for i, name in enumerate(images)]
+                spine = "".join(f"<itemref idref=\"k{i}\"/>" for i in range(len(items)))
+                epub.writestr("OEBPS/content.opf", f"""<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="id" xml:lang="de">
+<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+<dc:identifier id="id">urn:kochbuch:{identifier}</dc:identifier>
+<dc:title>Kochbuch</dc:title>
+<dc:language>de</dc:language>
+<meta property="dcterms:modified">{time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}</meta>
+</metadata>
+<manifest>
+{chr(10).join(manifest)}
+</manifest>
+<spine>{spine}</spine>
+</package>
+""")
+            os.replace(tmp, out_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Kochbuch als statische HTML-Seiten (und EPUB) ausgeben")
+    parser.add_argument("--book", default="Kochbuch.json", help="Kochbuch.json, eine SQLite-Datenbank (*.db) oder ein Archiv (*.archiv)")
+    parser.add_argument("--out", default=SITE_PATH, help=f"Verzeichnis der Seiten (Standard {SITE_PATH})")
+    parser.add_argument("--epub", nargs="?", const=EPUB_PATH, help=f"zusätzlich ein EPUB schreiben (Standard {EPUB_PATH})")
+    parser.add_argument("--jobs", type=int, default=None, help="Anzahl paralleler Prozesse")
+    parser.add_argument("--trace", nargs="?", const=TRACE_PATH, help=f"Zeitmessung als Chrome-Trace (Standard {TRACE_PATH}) und Übersicht auf stderr")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_PATH, help=f"mit cProfile messen (Standard {PROFILE_PATH})")
+    args = parser.parse_args()
+    Messung_Kochbuch.start(args.trace, args.profile)
+
+    start = time.perf_counter()
+    kochbuch = KochbuchHtml(args.book, args.out)
+    kochbuch.prepare_thumbnails(args.jobs)
+    pages, written = kochbuch.generate_site(args.jobs)
+    print(f"Wrote {written} of {pages} files to {args.out} ({pages - written} unchanged) "
+          f"in {time.perf_counter() - start:.1f} s, open {os.path.join(args.out, 'index.html')}")
+    if args.epub:
+        kochbuch.generate_epub(args.epub)
+        print(f"Wrote {args.epub}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+import time
+import atexit
+import pstats
+import cProfile
+import threading
+import multiprocessing
+
+# set to a file name to trace (or profile) any of the tools, e.g. Review_Kochbuch.py
+TRACE_ENV = "KOCHBUCH_TRACE"
+PROFILE_ENV = "KOCHBUCH_PROFILE"
+TRACE_PATH = os.path.join("Build", "trace.json")
+PROFILE_PATH = os.path.join("Build", "profile.prof")
+# functions listed from the profile
+PROFILE_TOP = 25
+
+# Chrome trace events (chrome://tracing, https://ui.perfetto.dev) of this process
+events = []
+counters = {}
+enabled = False
+trace_path = None
+profiler = None
+profile_path = None
+
+def now():
+    # microseconds, the unit of the trace format
+    return time.perf_counter_ns() // 1000
+
+def event(name, start, duration, **args):
+    """A complete ('X') event of the calling process and thread, e.g. to be
+    returned from a worker process and recorded by the parent."""
+    return {"name": name, "cat": name.split(".")[0], "ph": "X", "ts": start, "dur": duration,
+            "pid": os.getpid(), "tid": threading.get_ident(), "args": args}
+
+def record(entry):
+    if enabled:
+        events.append(entry)
+
+class Messung():
+    """Named span, `with Messung("tex.chapter", kapitel=kap): ...`.
+
+    Costs one flag check when tracing is off. Spans of worker threads land
+    in the same trace, list.append is atomic."""
+
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, **args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        if enabled:
+            self.start = now()
+        return self
+
+    def __exit__(self, *exc):
+        if enabled:
+            events.append(event(self.name, self.start, now() - self.start, **self.args))
+
+def count(name, value=1):
+    """Add value to the counter name, shown in the summary and as a counter track."""
+    if not enabled:
+        return
+    counters[name] = counters.get(name, 0) + value
+    events.append({"name": name, "ph": "C", "ts": now(), "pid": os.getpid(), "args": {name: counters[name]}})
+
+def start(trace=None, profile=None):
+    """Trace into the file trace and/or run cProfile (main thread) into the
+    file profile; both are written when the process exits."""
+    global enabled, trace_path, profiler, profile_path
+    if multiprocessing.parent_process() is not None:
+        # worker processes return their events to the parent, see event()
+        return
+    if trace and not enabled:
+        enabled = True
+        trace_path = trace
+        atexit.register(finish)
+    if profile and profiler is None:
+        profile_path = profile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        atexit.register(finish)
+
+def summary():
+    """Lines of a table: calls, total, mean and max per span name, then the counters."""
+    spans = {}
+    for entry in events:
+        if entry["ph"] == "X":
+            spans.setdefault(entry["name"], []).append(entry["dur"])
+    lines = [f"{'span':32} {'calls':>7} {'total ms':>10} {'mean ms':>9} {'max ms':>9}"]
+    for name, durations in sorted(spans.items(), key=lambda e: sum(e[1]), reverse=True):
+        total = sum(durations) / 1000
+        lines.append(f"{name:32} {len(durations):7} {total:10.1f} {total / len(durations):9.2f} {max(durations) / 1000:9.2f}")
+    for name, value in sorted(counters.items()):
+        lines.append(f"{name:32} {value:7}")
+    return lines
+
+def finish():
+    global enabled, profiler
+    if enabled:
+        enabled = False
+        os.makedirs(os.path.dirname(trace_path) or ".", exist_ok=True)
+        with open(trace_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+        print("\n".join(summary()), file=sys.stderr)
+        print(f"Trace of {len(events)} events in {trace_path}", file=sys.stderr)
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(os.path.dirname(profile_path) or ".", exist_ok=True)
+        profiler.dump_stats(profile_path)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        print(f"Profile in {profile_path} (python -m pstats {profile_path})", file=sys.stderr)
+        profiler = None
+
+start(os.environ.get(TRACE_ENV), os.environ.get(PROFILE_ENV))
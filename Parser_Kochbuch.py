@@ -0,0 +1,201 @@
+import re
+import sys
+
+from Store_Kochbuch import KochbuchDatei, BOOK_PATH, ID
+from Datenbank_Kochbuch import SQLiteStore
+from Archiv_Kochbuch import ArchivStore, INDEX_SUFFIX
+
+ZUTATEN = "Zutaten"
+ANLEITUNG = "Anleitung"
+TITEL = "Titel"
+# parsed form of Zutaten, one entry per ingredient string
+MENGEN = "Mengen"
+
+# spelling in the recipes -> unit used in MENGEN; not 'gr.', which in
+# '2 gr. Eier' means groß
+EINHEITEN = {
+    "g": "g", "gramm": "g",
+    "kg": "kg", "kilo": "kg", "mg": "mg",
+    "ml": "ml", "cl": "cl", "dl": "dl", "l": "l", "liter": "l",
+    "el": "EL", "essl.": "EL", "esslöffel": "EL",
+    "tl": "TL", "teel.": "TL", "teelöffel": "TL",
+    "prise": "Prise", "prisen": "Prise", "pr.": "Prise",
+    "päckchen": "Päckchen", "päkchen": "Päckchen", "pck.": "Päckchen", "pkg.": "Päckchen", "p.": "Päckchen",
+    "packung": "Packung", "packungen": "Packung",
+    "messerspitze": "Messerspitze", "msp.": "Messerspitze", "ms": "Messerspitze",
+    "stück": "Stück", "stck.": "Stück", "stk.": "Stück", "st.": "Stück",
+    "bund": "Bund", "dose": "Dose", "dosen": "Dose", "glas": "Glas", "gläser": "Glas",
+    "becher": "Becher", "tasse": "Tasse", "tassen": "Tasse", "tube": "Tube",
+    "zehe": "Zehe", "zehen": "Zehe", "scheibe": "Scheibe", "scheiben": "Scheibe",
+    "stange": "Stange", "stangen": "Stange", "zweig": "Zweig", "zweige": "Zweig",
+    "kopf": "Kopf", "knolle": "Knolle", "staude": "Staude", "schuss": "Schuss",
+    "handvoll": "Handvoll", "cm": "cm",
+}
+ZAHLWORTE = {"ein": 1, "eine": 1, "einen": 1, "einem": 1, "zwei": 2, "drei": 3, "vier": 4,
+             "fünf": 5, "sechs": 6, "halbe": 0.5, "halben": 0.5, "halber": 0.5}
+BRUECHE = {"½": 0.5, "¼": 0.25, "¾": 0.75, "⅓": 1 / 3, "⅔": 2 / 3, "⅛": 0.125}
+
+NUMBER = r"\d+(?:[.,]\d+)?(?:\s*/\s*\d+)?(?:\s*[½¼¾⅓⅔⅛])?|[½¼¾⅓⅔⅛]"
+# longest spelling first, so 'l' does not win over 'liter'
+UNIT = "|".join(re.escape(u) for u in sorted(EINHEITEN, key=len, reverse=True))
+INGREDIENT_PATTERN = re.compile(
+    rf"""^\s*(?:ca\.\s*|(?:ca|etwa)\s+)?
+    (?:(?P<von>{NUMBER})(?:\s*(?:-|–|bis)\s*(?P<bis>{NUMBER}))?|(?P<wort>{"|".join(ZAHLWORTE)})\b)?
+    \s*(?:(?P<einheit>{UNIT})(?=[\s,(]|$))?
+    [\s,]*(?P<zutat>.*?)\s*$""",
+    re.IGNORECASE | re.VERBOSE)
+NUMBER_PATTERN = re.compile(r"(\d+(?:[.,]\d+)?)(?:\s*/\s*(\d+))?\s*([½¼¾⅓⅔⅛])?|([½¼¾⅓⅔⅛])")
+
+# OCR text
+HYPHENATION = re.compile(r"(\w)-\n(?=[a-zäöüß])")
+# 'Zutaten', 'Zutaten für 4 Personen:', 'Zubereitung:' - but not 'Zutaten vermischen'
+HEADING_PATTERN = re.compile(
+    r"^(?:(?P<zutaten>zutaten)|(?P<anleitung>zubereitung|anleitung|so geht'?s|arbeitsschritte))(?:\s+für\b[^.]*)?\s*:?\s*$",
+    re.IGNORECASE)
+SERVES_PATTERN = re.compile(r"\bfür\s+(\d+)\s+(?:personen|portionen|stück)", re.IGNORECASE)
+BULLET_PATTERN = re.compile(r"^[-–•*·]\s*")
+NUMBERED_PATTERN = re.compile(r"^(?:\d+[.)]\s+|[-–•*·]\s*)")
+STARTS_WITH_AMOUNT = re.compile(rf"^(?:ca\.\s*|(?:ca|etwa)\s+)?(?:{NUMBER})", re.IGNORECASE)
+SENTENCE_END = (".", "!", "?")
+# a line without an amount this short is still taken as an ingredient ('Salz, Pfeffer')
+SHORT_LINE = 40
+SPLIT_PATTERN = re.compile(r'[\r\n]+|,')
+
+def parse_number(text):
+    """'2' -> 2, '1,5' -> 1.5, '1/2' -> 0.5, '1 ½' -> 1.5, '¼' -> 0.25."""
+    m = NUMBER_PATTERN.match(text)
+    if m.group(4):
+        return BRUECHE[m.group(4)]
+    value = float(m.group(1).replace(",", "."))
+    if m.group(2):
+        value /= int(m.group(2)) or 1
+    if m.group(3):
+        value += BRUECHE[m.group(3)]
+    return int(value) if value == int(value) else round(value, 3)
+
+def parse_ingredient(text):
+    """'1-2 EL Zucker' -> {"Menge": [1, 2], "Einheit": "EL", "Zutat": "Zucker"}.
+
+    Menge is a [von, bis] range (von == bis for a single amount) or None for
+    'Salz' or 'etwas Zucker', Einheit None for '2 Eier'."""
+    m = INGREDIENT_PATTERN.match(text)
+    menge = None
+    if m.group("von"):
+        von = parse_number(m.group("von"))
+        menge = [von, parse_number(m.group("bis")) if m.group("bis") else von]
+    elif m.group("wort"):
+        menge = [ZAHLWORTE[m.group("wort").lower()]] * 2
+    einheit = m.group("einheit")
+    zutat = m.group("zutat")
+    if einheit and not zutat:
+        # '2 Dose' - no ingredient left, so it was not a unit
+        einheit, zutat = None, text[m.start("einheit"):].strip()
+    return {
+        "Text": text,
+        "Menge": menge,
+        "Einheit": EINHEITEN[einheit.lower()] if einheit else None,
+        "Zutat": zutat,
+    }
+
+def normalize_list(field):
+    if not field:
+        return []
+    if isinstance(field, str):
+        return [p.strip() for p in SPLIT_PATTERN.split(field) if p.strip()]
+    return [str(x) for x in field]
+
+def parse_ingredients(zutaten):
+    return [parse_ingredient(z) for z in normalize_list(zutaten)]
+
+def ingredients(doc):
+    """The parsed ingredients of doc: the stored MENGEN if they still belong
+    to the current Zutaten, otherwise parsed on the fly."""
+    zutaten = normalize_list(doc.get(ZUTATEN))
+    mengen = doc.get(MENGEN)
+    if mengen and len(mengen) == len(zutaten) and all(m.get("Text") == z for m, z in zip(mengen, zutaten)):
+        return mengen
+    return [parse_ingredient(z) for z in zutaten]
+
+def parse_text(text):
+    """Split free text (typically OCR output of a recipe photo) into
+    {"Zutaten": [...], "Anleitung": [...]} and "Serves" if the text says
+    'für 4 Personen'.
+
+    Headings like 'Zutaten' and 'Zubereitung' switch the section. Without
+    them, leading lines starting with an amount or short enough to be an
+    ingredient are Zutaten; the first sentence starts the Anleitung. Lines
+    of a step are joined until a sentence ends."""
+    text = HYPHENATION.sub(r"\1", text.replace("\r", ""))
+    recipe = {ZUTATEN: [], ANLEITUNG: []}
+    m = SERVES_PATTERN.search(text)
+    if m:
+        recipe["Serves"] = int(m.group(1))
+
+    lines = [line.strip() for line in text.split("\n")]
+    # with headings, what comes before them is the title
+    headed = any(HEADING_PATTERN.match(line) and len(line) < SHORT_LINE for line in lines)
+    section = TITEL if headed else None
+    step = []
+    def end_step():
+        if step:
+            recipe[ANLEITUNG].append(" ".join(step))
+            step.clear()
+
+    for i, line in enumerate(lines):
+        if not line:
+            end_step()
+            continue
+        heading = HEADING_PATTERN.match(line)
+        if heading and len(line) < SHORT_LINE:
+            end_step()
+            section = ZUTATEN if heading.group("zutaten") else ANLEITUNG
+            continue
+        if SERVES_PATTERN.fullmatch(line.rstrip(":")):
+            continue
+        numbered = NUMBERED_PATTERN.match(line)
+        if section == TITEL:
+            continue
+        if section is None:
+            amount = STARTS_WITH_AMOUNT.match(line) and not numbered
+            # a sentence wrapped onto the next line continues in lower case
+            wrapped = i + 1 < len(lines) and lines[i + 1][:1].islower()
+            if amount or (len(line) <= SHORT_LINE and not line.endswith(SENTENCE_END) and not wrapped):
+                recipe[ZUTATEN].append(line)
+                continue
+            section = ANLEITUNG
+        if section == ZUTATEN:
+            recipe[ZUTATEN].append(BULLET_PATTERN.sub("", line))
+            continue
+        if numbered:
+            end_step()
+            line = line[numbered.end():]
+        step.append(line)
+        if line.endswith(SENTENCE_END):
+            end_step()
+    end_step()
+    return recipe
+
+def main():
+    # (re)parse the Zutaten of every recipe into MENGEN
+    path = sys.argv[1] if len(sys.argv) > 1 else BOOK_PATH
+    if path.endswith(".db") or path.endswith(INDEX_SUFFIX):
+        datei = None
+        store = SQLiteStore(path) if path.endswith(".db") else ArchivStore(path)
+    else:
+        datei = KochbuchDatei(path)
+        data, store = datei.load(read_only=False)
+        store.journal = None
+    changed = 0
+    for doc in list(store):
+        mengen = parse_ingredients(doc.get(ZUTATEN))
+        if doc.get(MENGEN) != mengen:
+            store.update(doc[ID], {MENGEN: mengen})
+            changed += 1
+    if datei:
+        datei.save(data)
+    else:
+        store.commit()
+    print(f"✅ Parsed the ingredients of {changed} recipes")
+
+if __name__ == "__main__":
+    main()
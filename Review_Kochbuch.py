@@ -1,7 +1,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import json
 import os
+import sys
+import time
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
 try:
     from PIL import Image, ImageTk
 except ImportError:
@@ -9,54 +12,172 @@ except ImportError:
     messagebox.showerror("Error", "Could not load PIL (Pillow) library. Images will not be displayed.")
     Image = None
     ImageTk = None
-
-IMAGE_PATH = "Bilder"
+from Bilder_Kochbuch import VorschauCache, BildSpeicher, image_list, resolve
+from Suche_Kochbuch import SuchIndex
+from Dubletten_Kochbuch import DublettenIndex, merge
+from Vorrat_Kochbuch import ZutatenIndex
+from Store_Kochbuch import KochbuchDatei, RecipeStore, Autosave, ID
+from Datenbank_Kochbuch import SQLiteStore
+from Archiv_Kochbuch import ArchivStore, INDEX_SUFFIX
+# KOCHBUCH_TRACE=Build/trace.json / KOCHBUCH_PROFILE=... measure the GUI, see Messung_Kochbuch
+from Messung_Kochbuch import Messung
+
+# milliseconds to wait after the last keystroke before searching
+SEARCH_DELAY = 150
+# search results up to this many recipes are shown with their chapters opened
+AUTO_OPEN = 200
+PLACEHOLDER = ":leer"
+# milliseconds between updates of the status bar while changes are unsaved
+STATUS_INTERVAL = 200
+# milliseconds between checks whether the pantry index is built
+VORRAT_POLL = 100
 
 class RecipeBook:
     image_index = 0
-    def __init__(self, root):
+    def __init__(self, root, path='Kochbuch.json'):
         self.root = root
         self.root.title("Kochbuch")
         self.root.geometry("1200x800")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Image previews are decoded in the background
+        self.previews = VorschauCache() if Image and ImageTk else None
+        self.pending_image = None
+        self.polling = False
+        # pictures by content, references counted on the first image change
+        self.bilder = BildSpeicher()
+        self.search_job = None
+        self.status_job = None
+        # chapter nodes of the recipe list, see populate_recipe_list
+        self.chapter_iids = {}     # Kapitel -> iid
+        self.chapters_by_iid = {}  # iid -> Kapitel
+        self.list_groups = {}      # Kapitel -> [recipe iid] of the current filter
+        self.list_names = {}       # recipe iid -> Name
+        self.loaded = set()        # chapter iids whose rows are inserted
         
         # Load recipe data
-        self.load_recipes()
+        with Messung("gui.load", path=path):
+            self.load_recipes(path)
+        # changes are written in the background, see change()
+        self.autosave = Autosave(self.flush_book)
+        # built on the first search, so the start does not read every recipe
+        self.search_index = None
+        # ingredient bitsets for the pantry window, a Future of the index
+        # built in the background when the window is opened
+        self.vorrat_index = None
+        self.background = ThreadPoolExecutor(max_workers=1)
         
         # Create main layout
-        self.create_layout()
+        with Messung("gui.layout"):
+            self.create_layout()
         
         # Initial recipe display
-        if self.recipes:
-            self.display_recipe(self.recipes[0])
-
-    def load_recipes(self):
+        first = next(iter(self.store), None)
+        if first:
+            self.display_recipe(first)
+
+    def load_recipes(self, path='Kochbuch.json'):
+        if path.endswith('.db') or path.endswith(INDEX_SUFFIX):
+            # changes go straight into the database (or archive), flush_book commits them
+            self.datei = None
+            self.book = None
+            self.store = SQLiteStore(path) if path.endswith('.db') else ArchivStore(path)
+            if path.endswith('.db'):
+                # committed by flush_book, not after every change
+                self.store.batching = True
+            self.total_recipes = len(self.store)
+            return
+        # changes are appended to Kochbuch.json.journal, see KochbuchDatei
+        self.datei = KochbuchDatei(path)
+        # journal lines are collected and written by flush_book
+        self.datei.buffer = []
         try:
-            with open('Kochbuch.json', 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.recipes = data['documents']
-                self.total_recipes = data['total']
+            self.book, self.store = self.datei.load(read_only=False)
+            self.total_recipes = self.book['total']
         except Exception as e:
             messagebox.showerror("Error", f"Could not load recipe book: {e}")
-            self.recipes = []
+            self.store = RecipeStore(journal=self.datei)
+            self.book = {'total': 0, 'documents': self.store.documents}
             self.total_recipes = 0
 
+    @contextlib.contextmanager
+    def change(self):
+        # change the store in memory, the autosave thread writes it shortly after
+        with self.autosave.change():
+            yield
+        # positions and ingredients may have changed, rebuilt on the next pantry query
+        self.vorrat_index = None
+        self.show_status()
+
+    def flush_book(self):
+        # runs in the autosave thread, holding its lock
+        if self.datei:
+            # the journal lines of the changes, now and then the whole book
+            self.datei.write_buffer()
+            self.datei.maybe_compact(self.book)
+        elif isinstance(self.store, ArchivStore):
+            # compacting would swap the data file under the reading GUI, see on_close
+            self.store.commit(compact=False)
+        else:
+            self.store.commit()
+
+    def show_status(self):
+        if self.status_job:
+            self.root.after_cancel(self.status_job)
+            self.status_job = None
+        changes, saving, saved, error = self.autosave.status()
+        if error:
+            text = f"⚠️ Speichern fehlgeschlagen ({error}), neuer Versuch …"
+        elif saving:
+            text = "Speichern …"
+        elif changes:
+            text = f"{changes} ungespeicherte Änderung(en)"
+        elif saved:
+            text = f"Gespeichert um {time.strftime('%H:%M:%S', time.localtime(saved))}"
+        else:
+            text = ""
+        self.status_var.set(text)
+        if changes or saving:
+            self.status_job = self.root.after(STATUS_INTERVAL, self.show_status)
+
+    def find_recipes(self, query):
+        if self.search_index is None:
+            with Messung("gui.search_index"):
+                self.search_index = SuchIndex((r[ID], r) for r in self.store)
+        with Messung("gui.search", query=query):
+            return self.search_index.search(query)
+
+    def index_recipe(self, recipe_id, recipe=None):
+        # keep the search index (if there is one yet) up to date, recipe None removes
+        if self.search_index is None:
+            return
+        if recipe is None:
+            self.search_index.remove(recipe_id)
+        else:
+            self.search_index.update(recipe_id, recipe)
+
     def create_layout(self):
+        # Status bar: unsaved changes / saved
+        self.status_var = tk.StringVar()
+        ttk.Label(self.root, textvariable=self.status_var, anchor=tk.W, padding=(5, 2)).pack(side=tk.BOTTOM, fill=tk.X)
+
         # Create left panel for recipe list
         left_panel = ttk.Frame(self.root, padding="5")
         left_panel.pack(side=tk.LEFT, fill=tk.Y)
 
         # Search box
         self.search_var = tk.StringVar()
-        self.search_var.trace('w', self.filter_recipes)
+        self.search_var.trace('w', self.schedule_filter)
         search_entry = ttk.Entry(left_panel, textvariable=self.search_var)
         search_entry.pack(fill=tk.X, pady=(0, 5))
 
         # Recipe list
-        self.recipe_list = ttk.Treeview(left_panel, columns=("name",), show="tree")
-        self.recipe_list.heading("#0", text="")
-        self.recipe_list.column("#0", width=0, stretch=tk.NO)
+        # Recipe list: one node per chapter, its recipes are inserted when it is opened
+        self.recipe_list = ttk.Treeview(left_panel, show="tree")
+        self.recipe_list.column("#0", width=250)
         self.recipe_list.pack(fill=tk.BOTH, expand=True)
         self.recipe_list.bind('<<TreeviewSelect>>', self.on_select_recipe)
+        self.recipe_list.bind('<<TreeviewOpen>>', self.on_open_chapter)
 
         # Populate recipe list
         self.populate_recipe_list()
@@ -137,26 +258,141 @@ class RecipeBook:
         add_image_button = ttk.Button(button_frame, text="Bild hinzufügen", command=self.add_image)
         add_image_button.pack(side=tk.LEFT, padx=5)
         
+        # Near-duplicates button
+        duplicates_button = ttk.Button(button_frame, text="Dubletten", command=self.show_duplicates)
+        duplicates_button.pack(side=tk.LEFT, padx=5)
+
+        # Pantry button
+        pantry_button = ttk.Button(button_frame, text="Vorrat", command=self.show_pantry)
+        pantry_button.pack(side=tk.LEFT, padx=5)
+
         # Create a style for the delete button
         style = ttk.Style()
         style.configure("Delete.TButton", foreground="red")
 
     def populate_recipe_list(self, filter_text=""):
-        self.recipe_list.delete(*self.recipe_list.get_children())
-        for recipe in self.recipes:
-            if filter_text.lower() in recipe['Name'].lower():
-                self.recipe_list.insert("", "end", values=(recipe['Name'],))
+        # group the recipes by chapter and apply only the differences to the tree
+        if filter_text.strip():
+            recipes = [self.store.get(key) for key in self.find_recipes(filter_text)]
+            recipes = [(r[ID], r.get('Name'), r.get('Kapitel')) for r in recipes]
+        else:
+            # names and chapters only, an archive does not read the documents for this
+            recipes = list(self.store.overview())
+        groups = {}
+        names = {}
+        for recipe_id, name, kapitel in recipes:
+            iid = str(recipe_id)
+            groups.setdefault(kapitel, []).append(iid)
+            names[iid] = name
+        self.list_groups = groups
+        self.list_names = names
+
+        tree = self.recipe_list
+        self.sync_children("", [self.chapter_iid(kap) for kap in groups], self.insert_chapter)
+        self.loaded &= set(tree.get_children(""))
+        open_all = bool(filter_text.strip()) and len(recipes) <= AUTO_OPEN
+        for kap, iids in groups.items():
+            chapter = self.chapter_iid(kap)
+            text = f"{kap or 'Ohne Kapitel'} ({len(iids)})"
+            if tree.item(chapter, 'text') != text:
+                tree.item(chapter, text=text)
+            if open_all or chapter in self.loaded:
+                self.load_chapter(chapter)
+                if open_all:
+                    tree.item(chapter, open=True)
+            elif not tree.get_children(chapter):
+                # lets Tk draw the expand arrow without inserting the rows
+                tree.insert(chapter, "end", iid=chapter + PLACEHOLDER)
+
+    def chapter_iid(self, kap):
+        iid = self.chapter_iids.get(kap)
+        if iid is None:
+            iid = self.chapter_iids[kap] = f"kap:{len(self.chapter_iids)}"
+            self.chapters_by_iid[iid] = kap
+        return iid
+
+    def insert_chapter(self, parent, index, iid):
+        self.recipe_list.insert(parent, index, iid=iid, open=False)
+
+    def insert_recipe(self, parent, index, iid):
+        self.recipe_list.insert(parent, index, iid=iid, text=self.list_names.get(iid) or '')
+
+    def sync_children(self, parent, wanted, insert):
+        """Make the children of parent the items wanted, in that order, with
+        as few deletes, moves and inserts as possible."""
+        tree = self.recipe_list
+        keep = set(wanted)
+        current = tree.get_children(parent)
+        stale = [iid for iid in current if iid not in keep]
+        if stale:
+            tree.delete(*stale)
+        current = [iid for iid in current if iid in keep]
+        if current == wanted:
+            return
+        present = set(current)
+        for index, iid in enumerate(wanted):
+            if index < len(current) and current[index] == iid:
+                continue
+            if iid in present:
+                current.remove(iid)
+                tree.move(iid, parent, index)
+            elif tree.exists(iid):
+                # a recipe whose chapter changed
+                tree.move(iid, parent, index)
+            else:
+                insert(parent, index, iid)
+            current.insert(index, iid)
+            present.add(iid)
+
+    def load_chapter(self, chapter):
+        # insert (or bring up to date) the rows of an opened chapter
+        if chapter not in self.loaded:
+            self.loaded.add(chapter)
+            placeholder = chapter + PLACEHOLDER
+            if self.recipe_list.exists(placeholder):
+                self.recipe_list.delete(placeholder)
+        self.sync_children(chapter, self.list_groups.get(self.chapters_by_iid[chapter], []), self.insert_recipe)
+
+    def on_open_chapter(self, event):
+        item = self.recipe_list.focus()
+        if item in self.chapters_by_iid:
+            self.load_chapter(item)
+
+    def refresh_recipe(self, recipe_id):
+        # after saving one recipe: rename its row, regroup only if the chapter changed
+        iid = str(recipe_id)
+        recipe = self.store.get(recipe_id)
+        tree = self.recipe_list
+        if tree.exists(iid) and self.chapters_by_iid.get(tree.parent(iid)) == recipe.get('Kapitel'):
+            self.list_names[iid] = recipe.get('Name', '')
+            tree.item(iid, text=self.list_names[iid])
+        else:
+            self.populate_recipe_list(self.search_var.get())
+
+    def selected_recipe_id(self):
+        selection = self.recipe_list.selection()
+        if selection and selection[0].isdigit():
+            return int(selection[0])
+        return None
+
+    def schedule_filter(self, *args):
+        # search once typing pauses instead of on every keystroke
+        if self.search_job:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DELAY, self.filter_recipes)
 
     def filter_recipes(self, *args):
-        self.populate_recipe_list(self.search_var.get())
+        self.search_job = None
+        with Messung("gui.filter"):
+            self.populate_recipe_list(self.search_var.get())
 
     def on_select_recipe(self, event):
-        selection = self.recipe_list.selection()
-        if selection:
-            recipe_name = self.recipe_list.item(selection[0])['values'][0]
-            recipe = next((r for r in self.recipes if r['Name'] == recipe_name), None)
+        recipe_id = self.selected_recipe_id()
+        if recipe_id is not None:
+            recipe = self.store.get(recipe_id)
             if recipe:
-                self.display_recipe(recipe)
+                with Messung("gui.display", recipe=recipe_id):
+                    self.display_recipe(recipe)
 
     def display_recipe(self, recipe):
         self.recipe = recipe
@@ -185,67 +421,301 @@ class RecipeBook:
         self.display_image(index=0)
 
     def display_image(self, index=None):
-        image_names = self.recipe.get('Bild')
-        if image_names and len(image_names) > 0 and Image and ImageTk:
+        image_names = image_list(self.recipe)
+        if image_names and self.previews:
             if not index:
                 index = self.image_index
                 index = (index + 1) % len(image_names)
             image_name = image_names[index]  # Display the first image for now
             self.image_index = index
-            try:
-                # Look for image in Input directory
-                image_path = os.path.join(IMAGE_PATH, image_name)
-                if os.path.exists(image_path):
-                    image = Image.open(image_path)
-                    # Resize image to fit the window while maintaining aspect ratio
-                    max_size = (800, 1400)
-                    image.thumbnail(max_size, Image.Resampling.LANCZOS)
-                    photo = ImageTk.PhotoImage(image)
-                    self.image_label.configure(image=photo)
-                    self.image_label.image = photo  # Keep a reference
+            # Look for image in Bilder directory (or Quellen for old uploads)
+            image_path = resolve(image_name)
+            if image_path:
+                image = self.previews.get(image_path)
+                if image is not None:
+                    self.show_image(image)
                 else:
-                    self.image_label.configure(image='')
-                    if image_name:
-                        self.image_label.configure(text=f"Image not found: {image_path}")
-            except Exception as e:
-                print(f"Error loading image: {e}")
-                self.image_label.configure(image='', text=f"Error loading image: {image_name}")
+                    self.image_label.configure(image='', text="Lade Bild ...")
+                    self.image_label.image = None
+                    self.pending_image = image_path
+                    self.previews.request(image_path)
+                    self.start_polling()
+                self.prefetch_images(image_names[index + 1:index + 2])
+            else:
+                self.pending_image = None
+                self.image_label.configure(image='')
+                if image_name:
+                    self.image_label.configure(text=f"Image not found: {image_name}")
         else:
+            self.pending_image = None
             self.image_label.configure(image='', text="No images available" if image_names else "")
 
-    def delete_recipe(self):
+    def show_image(self, image):
+        self.pending_image = None
+        with Messung("gui.image", size=f"{image.width}x{image.height}"):
+            photo = ImageTk.PhotoImage(image)
+            self.image_label.configure(image=photo, text='')
+        self.image_label.image = photo  # Keep a reference
+
+    def start_polling(self):
+        if not self.polling:
+            self.polling = True
+            self.root.after(20, self.poll_images)
+
+    def poll_images(self):
+        # hand decoded previews from the worker threads over to Tk
+        self.polling = False
+        for image_path, image, error in self.previews.results():
+            if image_path != self.pending_image:
+                continue
+            if error:
+                print(f"Error loading image: {error}")
+                self.pending_image = None
+                self.image_label.configure(image='', text=f"Error loading image: {os.path.basename(image_path)}")
+            else:
+                self.show_image(image)
+        if self.pending_image or self.previews.pending:
+            self.start_polling()
+
+    def prefetch_images(self, extra=()):
+        # decode the first image of the neighbouring recipes before they are selected
+        names = list(extra)
         selection = self.recipe_list.selection()
-        if not selection:
+        if selection:
+            for item in (self.recipe_list.next(selection[0]), self.recipe_list.prev(selection[0])):
+                if not item.isdigit():
+                    continue
+                recipe = self.store.get(int(item))
+                if recipe:
+                    names.extend(image_list(recipe)[:1])
+        self.previews.prefetch(path for path in map(resolve, names) if path)
+        self.start_polling()
+
+    def on_close(self):
+        if self.previews:
+            self.previews.close()
+        self.background.shutdown(wait=False, cancel_futures=True)
+        try:
+            self.autosave.close()
+            if self.datei and self.datei.pending:
+                self.datei.save(self.book)
+            elif isinstance(self.store, ArchivStore):
+                self.store.commit()
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not save recipe book: {e}")
+        self.root.destroy()
+
+    def show_duplicates(self):
+        # window with the pairs of similar recipes and what merging them would do
+        pairs = DublettenIndex((r[ID], r) for r in self.store).pairs()
+        window = tk.Toplevel(self.root)
+        window.title(f"Dubletten ({len(pairs)})")
+        window.geometry("700x400")
+        tree = ttk.Treeview(window, columns=("similarity", "keep", "other"), show="headings")
+        tree.heading("similarity", text="Ähnlichkeit")
+        tree.heading("keep", text="Rezept")
+        tree.heading("other", text="ähnlich zu")
+        tree.column("similarity", width=90, stretch=tk.NO)
+        tree.pack(fill=tk.BOTH, expand=True)
+        for a, b, similarity in pairs:
+            tree.insert("", "end", iid=f"{a}:{b}",
+                        values=(f"{similarity:.0%}", self.store.get(a).get('Name'), self.store.get(b).get('Name')))
+        suggestion = ttk.Label(window, wraplength=680, justify=tk.LEFT)
+        suggestion.pack(fill=tk.X, padx=5)
+
+        def selected_pair():
+            selection = tree.selection()
+            return tuple(int(k) for k in selection[0].split(":")) if selection else None
+
+        def on_select(event):
+            pair = selected_pair()
+            if not pair:
+                return
+            keep, other = self.store.get(pair[0]), self.store.get(pair[1])
+            changes = merge(keep, other)
+            text = f"Zusammenführen behält '{keep.get('Name')}' und löscht '{other.get('Name')}'"
+            if changes:
+                text += "; übernimmt " + ", ".join(changes)
+            suggestion.configure(text=text + ".")
+            self.select_recipe(pair[0])
+
+        def merge_pair():
+            pair = selected_pair()
+            if not pair:
+                return
+            keep_id, other_id = pair
+            other = self.store.get(other_id)
+            if not messagebox.askyesno("Zusammenführen", f"'{other.get('Name')}' in '{self.store.get(keep_id).get('Name')}' übernehmen und löschen?", parent=window):
+                return
+            try:
+                with self.change():
+                    recipe = self.store.update(keep_id, merge(self.store.get(keep_id), other))
+                    self.store.remove(other_id)
+                self.index_recipe(keep_id, recipe)
+                self.index_recipe(other_id)
+                self.total_recipes = len(self.store)
+            except Exception as e:
+                messagebox.showerror("Error", f"Could not merge recipes: {e}", parent=window)
+                return
+            for item in tree.get_children():
+                if str(other_id) in item.split(":"):
+                    tree.delete(item)
+            self.populate_recipe_list(self.search_var.get())
+            self.select_recipe(keep_id)
+
+        def ignore_pair():
+            for item in tree.selection():
+                tree.delete(item)
+
+        tree.bind('<<TreeviewSelect>>', on_select)
+        buttons = ttk.Frame(window)
+        buttons.pack(pady=5)
+        ttk.Button(buttons, text="Zusammenführen", command=merge_pair).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Ignorieren", command=ignore_pair).pack(side=tk.LEFT, padx=5)
+
+    def build_vorrat_index(self):
+        # the recipes are read here on the Tk thread, a database store only
+        # works on its own thread; the ingredients are parsed in the background
+        if self.vorrat_index is None:
+            documents = list(self.store)
+            def build():
+                with Messung("gui.vorrat_index", recipes=len(documents)):
+                    return ZutatenIndex(documents)
+            self.vorrat_index = self.background.submit(build)
+        return self.vorrat_index
+
+    def show_pantry(self):
+        # window with the recipes that can be cooked from the given ingredients
+        window = tk.Toplevel(self.root)
+        window.title("Vorrat")
+        window.geometry("800x400")
+        query = ttk.Frame(window)
+        query.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(query, text="Zutaten:").pack(side=tk.LEFT)
+        items_var = tk.StringVar()
+        items_entry = ttk.Entry(query, textvariable=items_var)
+        items_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        ttk.Label(query, text="fehlend:").pack(side=tk.LEFT)
+        missing_var = tk.StringVar(value="0")
+        missing_box = ttk.Spinbox(query, from_=0, to=5, width=3, textvariable=missing_var)
+        missing_box.pack(side=tk.LEFT, padx=5)
+        ttk.Label(query, text="Kapitel:").pack(side=tk.LEFT)
+        chapter_var = tk.StringVar()
+        ttk.Combobox(query, textvariable=chapter_var, width=20,
+                     values=[""] + sorted(k for k in self.store.chapters() if k)).pack(side=tk.LEFT, padx=5)
+        ttk.Label(query, text="Minuten:").pack(side=tk.LEFT)
+        dauer_var = tk.StringVar()
+        ttk.Entry(query, textvariable=dauer_var, width=5).pack(side=tk.LEFT, padx=5)
+        ttk.Label(query, text="Portionen:").pack(side=tk.LEFT)
+        serves_var = tk.StringVar()
+        ttk.Entry(query, textvariable=serves_var, width=3).pack(side=tk.LEFT, padx=5)
+        tree = ttk.Treeview(window, columns=("name", "missing"), show="headings")
+        tree.heading("name", text="Rezept")
+        tree.heading("missing", text="fehlt")
+        tree.pack(fill=tk.BOTH, expand=True)
+        result = ttk.Label(window)
+        result.pack(fill=tk.X, padx=5)
+        # "kochbar": at most `fehlend` ingredients missing, "alle": recipes using every ingredient
+        mode_var = tk.StringVar(value="kochbar")
+        poll_job = None
+        self.build_vorrat_index()
+
+        def search(*args):
+            nonlocal poll_job
+            poll_job = None
+            if not window.winfo_exists():
+                return
+            building = self.build_vorrat_index()
+            if not building.done():
+                result.configure(text="Zutaten werden eingelesen …")
+                poll_job = self.root.after(VORRAT_POLL, search)
+                return
+            try:
+                index = building.result()
+            except Exception as e:
+                self.vorrat_index = None
+                result.configure(text=f"Fehler beim Einlesen der Zutaten: {e}")
+                return
+            texts = [t.strip() for t in items_var.get().split(",") if t.strip()]
+            items = [item for item in map(index.item, texts) if item]
+            try:
+                max_missing = max(0, int(missing_var.get() or 0))
+                dauer = int(dauer_var.get()) if dauer_var.get().strip() else None
+                serves = int(serves_var.get()) if serves_var.get().strip() else None
+            except ValueError:
+                result.configure(text="Fehlend, Minuten und Portionen müssen Zahlen sein.")
+                return
+            limits = {"kapitel": chapter_var.get() or None, "dauer": dauer, "serves": serves}
+            using_all = mode_var.get() == "alle"
+            with Messung("gui.vorrat", items=len(items), missing=max_missing, mode=mode_var.get()):
+                if using_all:
+                    # an ingredient no recipe uses leaves no recipe that uses all of them
+                    bits = index.using_all(items, **limits) if len(items) == len(texts) else 0
+                else:
+                    bits = index.cookable(items, max_missing, **limits)
+                found = index.recipes(bits, items)
+            tree.delete(*tree.get_children())
+            for recipe_id, missing in found:
+                tree.insert("", "end", iid=str(recipe_id),
+                            values=(self.store.get(recipe_id).get('Name'), ", ".join(missing)))
+            unknown = len(texts) - len(items)
+            result.configure(text=f"{len(found)} Rezepte" + (f", {unknown} Zutaten in keinem Rezept" if unknown else ""))
+
+        def start_search(*args):
+            # a click while the index is built must not start a second poll
+            if poll_job is None:
+                search()
+
+        def on_mode():
+            missing_box.configure(state="disabled" if mode_var.get() == "alle" else "normal")
+            tree.heading("missing", text="weitere Zutaten" if mode_var.get() == "alle" else "fehlt")
+            start_search()
+
+        def on_select(event):
+            selection = tree.selection()
+            if selection:
+                self.select_recipe(int(selection[0]))
+
+        tree.bind('<<TreeviewSelect>>', on_select)
+        items_entry.bind('<Return>', start_search)
+        buttons = ttk.Frame(window)
+        buttons.pack(pady=5)
+        ttk.Radiobutton(buttons, text="Kochbar mit meinen Zutaten", variable=mode_var,
+                        value="kochbar", command=on_mode).pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(buttons, text="Verwendet alle Zutaten", variable=mode_var,
+                        value="alle", command=on_mode).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Suchen", command=start_search).pack(side=tk.LEFT, padx=5)
+        items_entry.focus_set()
+
+    def select_recipe(self, recipe_id):
+        chapter = self.chapter_iids.get(self.store.get(recipe_id).get('Kapitel'))
+        if chapter and self.recipe_list.exists(chapter):
+            self.load_chapter(chapter)
+            self.recipe_list.item(chapter, open=True)
+        if self.recipe_list.exists(str(recipe_id)):
+            self.recipe_list.selection_set(str(recipe_id))
+            self.recipe_list.see(str(recipe_id))
+        else:
+            self.display_recipe(self.store.get(recipe_id))
+
+    def delete_recipe(self):
+        recipe_id = self.selected_recipe_id()
+        if recipe_id is None:
             messagebox.showwarning("Warnung", "Bitte wählen Sie ein Rezept zum Löschen aus.")
             return
-        
-        recipe_name = self.recipe_list.item(selection[0])['values'][0]
+
+        recipe_name = self.store.get(recipe_id).get('Name') if recipe_id in self.store else ''
         if messagebox.askyesno("Löschen bestätigen", 
                              f"Möchten Sie das Rezept '{recipe_name}' wirklich löschen?"):
-            recipe_index = next((i for i, r in enumerate(self.recipes) 
-                               if r['Name'] == recipe_name), None)
-            
-            if recipe_index is not None:
-                # Remove the recipe
-                deleted_recipe = self.recipes.pop(recipe_index)
-                self.total_recipes -= 1
-                
+            if recipe_id in self.store:
                 # Save changes to file
                 try:
-                    with open('Kochbuch.json', 'w', encoding='utf-8') as f:
-                        json.dump({'total': self.total_recipes, 'documents': self.recipes}, 
-                                f, ensure_ascii=False, indent=4)
-                    
-                    # Remove image file if it exists
-                    if deleted_recipe.get('Bild'):
-                        image_path = os.path.join('Input', deleted_recipe['Bild'])
-                        if os.path.exists(image_path):
-                            try:
-                                os.remove(image_path)
-                            except Exception as e:
-                                print(f"Could not delete image file: {e}")
-                    
-                    messagebox.showinfo("Erfolg", "Rezept wurde erfolgreich gelöscht!")
+                    # Remove the recipe; its pictures stay in Bilder/ until
+                    # Bilder_Kochbuch.py gc, the deletion may not be saved yet
+                    with self.change():
+                        self.store.remove(recipe_id)
+                    self.index_recipe(recipe_id)
+                    self.total_recipes -= 1
                     
                     # Refresh the recipe list
                     self.populate_recipe_list(self.search_var.get())
@@ -263,71 +733,59 @@ class RecipeBook:
         self.ingredients_text.delete('1.0', tk.END)
         self.instructions_text.delete('1.0', tk.END)
         self.notes_text.delete('1.0', tk.END)
+        self.pending_image = None
         self.image_label.configure(image='', text='')
 
     def delete_image(self):
-        selection = self.recipe_list.selection()
-        if not selection:
+        recipe_id = self.selected_recipe_id()
+        if recipe_id is None:
             messagebox.showwarning("Warnung", "Bitte wählen Sie ein Rezept zum Speichern aus.")
             return
 
-        recipe_name = self.recipe_list.item(selection[0])['values'][0]
-        recipe_index = next((i for i, r in enumerate(self.recipes) if r['Name'] == recipe_name), None)
-        
-        if recipe_index is not None:
-            # Update recipe data
-            self.recipes[recipe_index].update({
-                'Bild': []
-            })
-
+        if recipe_id in self.store:
             # Save to file
             try:
-                with open('Kochbuch.json', 'w', encoding='utf-8') as f:
-                    json.dump({'total': self.total_recipes, 'documents': self.recipes}, 
-                            f, ensure_ascii=False, indent=4)
-                messagebox.showinfo("Success", "Recipe saved successfully!")
+                # Update recipe data, the files stay until Bilder_Kochbuch.py gc
+                with self.change():
+                    self.store.update(recipe_id, {
+                        'Bild': []
+                    })
                 
-                # Refresh the recipe list
-                self.populate_recipe_list(self.search_var.get())
+                # Update only its row
+                self.refresh_recipe(recipe_id)
             except Exception as e:
                 messagebox.showerror("Error", f"Could not save recipe: {e}")
 
     def save_recipe(self):
-        selection = self.recipe_list.selection()
-        if not selection:
+        recipe_id = self.selected_recipe_id()
+        if recipe_id is None:
             messagebox.showwarning("Warnung", "Bitte wählen Sie ein Rezept zum Speichern aus.")
             return
 
-        recipe_name = self.recipe_list.item(selection[0])['values'][0]
-        recipe_index = next((i for i, r in enumerate(self.recipes) if r['Name'] == recipe_name), None)
-        
-        if recipe_index is not None:
-            # Update recipe data
-            self.recipes[recipe_index].update({
-                'Name': self.name_var.get(),
-                'Kapitel': self.chapter_var.get(),
-                'Serves': int(self.serves_var.get()) if self.serves_var.get().isdigit() else 1,
-                'Dauer': int(self.duration_var.get()) if self.duration_var.get().isdigit() else 0,
-                'Zutaten': self.ingredients_text.get('1.0', tk.END).strip().split('\n'),
-                'Anleitung': self.instructions_text.get('1.0', tk.END).strip().split('\n'),
-                'Notes': self.notes_text.get('1.0', tk.END).strip()
-            })
-
+        if recipe_id in self.store:
             # Save to file
             try:
-                with open('Kochbuch.json', 'w', encoding='utf-8') as f:
-                    json.dump({'total': self.total_recipes, 'documents': self.recipes}, 
-                            f, ensure_ascii=False, indent=4)
-                messagebox.showinfo("Success", "Recipe saved successfully!")
+                # Update recipe data
+                with self.change():
+                    recipe = self.store.update(recipe_id, {
+                        'Name': self.name_var.get(),
+                        'Kapitel': self.chapter_var.get(),
+                        'Serves': int(self.serves_var.get()) if self.serves_var.get().isdigit() else 1,
+                        'Dauer': int(self.duration_var.get()) if self.duration_var.get().isdigit() else 0,
+                        'Zutaten': self.ingredients_text.get('1.0', tk.END).strip().split('\n'),
+                        'Anleitung': self.instructions_text.get('1.0', tk.END).strip().split('\n'),
+                        'Notes': self.notes_text.get('1.0', tk.END).strip()
+                    })
+                self.index_recipe(recipe_id, recipe)
                 
-                # Refresh the recipe list
-                self.populate_recipe_list(self.search_var.get())
+                # Update only its row
+                self.refresh_recipe(recipe_id)
             except Exception as e:
                 messagebox.showerror("Error", f"Could not save recipe: {e}")
 
     def add_recipe(self):
         recipe_name = self.name_var.get()
-        self.recipes.append({
+        recipe = {
             'Name': self.name_var.get(),
             'Kapitel': self.chapter_var.get(),
             'Serves': int(self.serves_var.get()) if self.serves_var.get().isdigit() else 1,
@@ -335,14 +793,14 @@ class RecipeBook:
             'Zutaten': self.ingredients_text.get('1.0', tk.END).strip().split('\n'),
             'Anleitung': self.instructions_text.get('1.0', tk.END).strip().split('\n'),
             'Notes': self.notes_text.get('1.0', tk.END).strip()
-        })
+        }
 
         # Save to file
         try:
-            with open('Kochbuch.json', 'w', encoding='utf-8') as f:
-                json.dump({'total': len(self.recipes), 'documents': self.recipes}, 
-                        f, ensure_ascii=False, indent=4)
-            messagebox.showinfo("Success", "Recipe saved successfully!")
+            with self.change():
+                recipe_id = self.store.add(recipe)
+            self.index_recipe(recipe_id, recipe)
+            self.total_recipes = len(self.store)
             
             # Refresh the recipe list
             self.populate_recipe_list(self.search_var.get())
@@ -350,48 +808,36 @@ class RecipeBook:
             messagebox.showerror("Error", f"Could not save recipe: {e}")                
 
     def add_image(self):
-        selection = self.recipe_list.selection()
-        if not selection:
+        recipe_id = self.selected_recipe_id()
+        if recipe_id is None:
             messagebox.showwarning("Warnung", "Bitte wählen Sie ein Rezept zum Speichern aus.")
             return
 
-        recipe_name = self.recipe_list.item(selection[0])['values'][0]
-        recipe_index = next((i for i, r in enumerate(self.recipes) if r['Name'] == recipe_name), None)
-        
-        if recipe_index is not None:
+        if recipe_id in self.store:
             # Open file dialog to select image
             file_path = filedialog.askopenfilename(title="Bild auswählen", 
                                                    filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.gif;*.bmp")])
             if file_path:
-                image_name = os.path.basename(file_path)
-                dest_path = os.path.join(IMAGE_PATH, image_name)
-                
-                # Copy image to Bilder directory
+                # Store the image in Bilder by content, an identical picture is reused
                 try:
-                    os.makedirs(IMAGE_PATH, exist_ok=True)
-                    if file_path != dest_path:
-                        with open(file_path, 'rb') as src_file:
-                            with open(dest_path, 'wb') as dest_file:
-                                dest_file.write(src_file.read())
+                    image_name = self.bilder.add(file_path)
+                    self.bilder.save_index()
                 except Exception as e:
-                    pass
-                    #messagebox.showerror("Error", f"Could not add image: {e}")
+                    messagebox.showerror("Error", f"Could not add image: {e}")
+                    return
 
-                # Update recipe data
-                current_images = self.recipes[recipe_index].get('Bild', [])
+                # Update recipe data and save to file
+                current_images = image_list(self.store.get(recipe_id))
+                if image_name in current_images:
+                    return
                 current_images.append(image_name)
-                self.recipes[recipe_index]['Bild'] = current_images
-
-                # Save to file
-                with open('Kochbuch.json', 'w', encoding='utf-8') as f:
-                    json.dump({'total': self.total_recipes, 'documents': self.recipes}, 
-                            f, ensure_ascii=False, indent=4)
-                messagebox.showinfo("Success", "Image added successfully!")
+                with self.change():
+                    self.store.update(recipe_id, {'Bild': current_images})
                 
-                # Refresh the recipe list
-                self.populate_recipe_list(self.search_var.get())
+                # Update only its row
+                self.refresh_recipe(recipe_id)
                     
 if __name__ == "__main__":
     root = tk.Tk()
-    app = RecipeBook(root)
+    app = RecipeBook(root, sys.argv[1] if len(sys.argv) > 1 else 'Kochbuch.json')
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,429 @@
+import os
+import sys
+import gzip
+import json
+import asyncio
+import hashlib
+import argparse
+from collections import OrderedDict
+from urllib.parse import unquote, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+from Extend_Kochbuch import Kochbuch
+from Store_Kochbuch import ID, NAME, KAPITEL, JOURNAL_SUFFIX
+from Archiv_Kochbuch import INDEX_SUFFIX, data_path
+from Suche_Kochbuch import SuchIndex
+from Bilder_Kochbuch import BildCache, image_list, resolve
+from Html_Kochbuch import THUMB_WIDTHS, SEARCH_LIMIT
+from TeX_Kochbuch import BUILD_PATH
+import Messung_Kochbuch
+from Messung_Kochbuch import Messung, count, TRACE_PATH, PROFILE_PATH
+
+HOST = "127.0.0.1"
+PORT = 8080
+# scaled pictures on disk, one file per picture and width, see thumbnail
+THUMB_PATH = os.path.join(BUILD_PATH, "api-bilder")
+THUMB_INDEX_PATH = os.path.join(BUILD_PATH, "api-bilder.json")
+THUMB_BUDGET = 64 * 1024 * 1024
+DEFAULT_WIDTH = THUMB_WIDTHS[0]
+# pre-serialised answers per book version: recipes, chapters, search results
+CACHE_BUDGET = 64 * 1024 * 1024
+# most results of one search, also for limit=0
+MAX_SEARCH_LIMIT = 500
+# smaller bodies are sent as they are
+GZIP_MIN_SIZE = 1024
+# how often the book files are checked, and how long they have to stay unchanged before a reload
+RELOAD_INTERVAL = 1.0
+RELOAD_DELAY = 0.5
+MAX_HEAD = 16 * 1024
+
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 431: "Request Header Fields Too Large"}
+JSON_TYPE = "application/json; charset=utf-8"
+IMAGE_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".gif": "image/gif", ".webp": "image/webp"}
+
+def watched_files(path):
+    """The files a change of the book shows up in."""
+    if path.endswith(".db"):
+        return [path, path + "-wal"]
+    if path.endswith(INDEX_SUFFIX):
+        return [path, data_path(path)]
+    return [path, path + JOURNAL_SUFFIX]
+
+def stamp(path):
+    """(mtime, size) of the files of the book, None for missing ones."""
+    found = []
+    for file_path in watched_files(path):
+        try:
+            st = os.stat(file_path)
+            found.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            found.append(None)
+    return tuple(found)
+
+def load_kapitel(store):
+    """The chapters in the order of Kapitel.json, unknown ones at the end.
+    Unlike KochbuchTex.load_chapters, Kapitel.json is not written."""
+    try:
+        with open("Kapitel.json", "r", encoding="utf-8") as kap_file:
+            kapitel = json.load(kap_file)
+    except Exception:
+        kapitel = []
+    known = set(store.chapters())
+    return [kap for kap in kapitel if kap in known] + [kap for kap in store.chapters() if kap not in set(kapitel)]
+
+class Antwort():
+    """A complete HTTP response, serialised once and sent to every client
+    asking for it. The ETag is the hash of the body, so a client keeps its
+    copy across reloads of the book as long as the answer is the same."""
+
+    def __init__(self, body, status=200, content_type=JSON_TYPE, cache_control="no-cache"):
+        self.status = status
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.headers = (f"Content-Type: {content_type}\r\n"
+                        f"Cache-Control: {cache_control}\r\n"
+                        f"ETag: {self.etag}\r\n"
+                        "Access-Control-Allow-Origin: *\r\n")
+        self.zippable = content_type == JSON_TYPE and len(body) >= GZIP_MIN_SIZE
+        if self.zippable:
+            self.headers += "Vary: Accept-Encoding\r\n"
+        # (gzip, keep_alive) -> status line and headers, built on first use;
+        # the body is sent after them, not copied into every variant
+        self.heads = {}
+        self.gzipped = None
+        self.size = len(body)
+
+    def json(data, status=200):
+        return Antwort(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), status)
+
+    def error(status, message):
+        return Antwort.json({"Fehler": message}, status)
+
+    def budget_size(self):
+        """Bytes counted against a cache: the body and, if it may be asked for, its gzip variant."""
+        return 2 * len(self.body) if self.zippable else len(self.body)
+
+    def encode(self, zipped, keep_alive, head=False, not_modified=False):
+        """The response as a list of bytes to write one after the other."""
+        if not_modified:
+            return [(f"HTTP/1.1 304 Not Modified\r\nETag: {self.etag}\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1")]
+        body = self.body
+        if zipped:
+            if self.gzipped is None:
+                self.gzipped = gzip.compress(self.body, 6, mtime=0)
+                self.size += len(self.gzipped)
+            body = self.gzipped
+        key = (zipped, keep_alive)
+        data = self.heads.get(key)
+        if data is None:
+            extra = "Content-Encoding: gzip\r\n" if zipped else ""
+            data = self.heads[key] = (f"HTTP/1.1 {self.status} {REASONS[self.status]}\r\n{self.headers}{extra}"
+                                      f"Content-Length: {len(body)}\r\n"
+                                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1")
+        return [data] if head else [data, body]
+
+class Bestand():
+    """One loaded version of the book and the answers built from it."""
+
+    def __init__(self, path):
+        # taken before reading, a change during the load triggers another one
+        self.stamp = stamp(path)
+        with Messung("api.load", book=path):
+            # the editor may be writing the journal at the same time
+            kochbuch = Kochbuch(path, read_only=True)
+            self.store = kochbuch.store
+            self.overview = {}
+            self.by_chapter = {}
+            for recipe_id, name, kap in self.store.overview():
+                entry = self.overview[recipe_id] = {ID: recipe_id, NAME: name, KAPITEL: kap}
+                self.by_chapter.setdefault(kap, []).append(entry)
+            self.kapitel = load_kapitel(self.store)
+        with Messung("api.index", recipes=len(self.overview)):
+            self.index = SuchIndex((doc[ID], doc) for doc in self.store)
+            self.bilder = {image_file for doc in kochbuch.kochbuch["documents"] for image_file in image_list(doc)}
+        # raw request target -> Antwort, least recently used first, up to CACHE_BUDGET bytes
+        self.antworten = OrderedDict()
+        self.antwort_bytes = 0
+        self.fixed = {
+            "/": Antwort.json({
+                "rezepte": "/rezepte",
+                "rezept": "/rezepte/{ID}",
+                "kapitel": "/kapitel",
+                "kapitel_rezepte": "/kapitel/{Kapitel}",
+                "suche": "/suche?q={Wörter}&limit={N}",
+                "bild": "/bilder/{Datei}?breite={" + "|".join(map(str, THUMB_WIDTHS)) + "}",
+            }),
+            "/rezepte": Antwort.json(list(self.overview.values())),
+            "/kapitel": Antwort.json([{KAPITEL: kap, "Rezepte": len(self.by_chapter.get(kap, ()))} for kap in self.kapitel]),
+        }
+
+    def close(self):
+        close = getattr(self.store, "close", None)
+        if close:
+            close()
+
+    def answer(self, path, query):
+        """The Antwort for a GET of path, None for a picture (see RezeptServer.thumbnail)."""
+        fixed = self.fixed.get(path.rstrip("/") or "/")
+        if fixed is not None:
+            return fixed
+        # split before unquoting, a chapter may have a / in its name
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        if len(parts) == 2 and parts[0] == "rezepte":
+            try:
+                doc = self.store.get(int(parts[1]))
+            except ValueError:
+                doc = None
+            if doc is None:
+                return Antwort.error(404, f"kein Rezept {parts[1]}")
+            return Antwort.json(dict(doc))
+        if len(parts) == 2 and parts[0] == "kapitel":
+            kap = parts[1]
+            if kap not in self.by_chapter:
+                return Antwort.error(404, f"kein Kapitel {kap}")
+            return Antwort.json(self.by_chapter[kap])
+        if parts == ["suche"]:
+            params = parse_qs(query)
+            try:
+                limit = int(params.get("limit", [SEARCH_LIMIT])[0])
+            except ValueError:
+                return Antwort.error(400, "limit ist keine Zahl")
+            limit = min(limit, MAX_SEARCH_LIMIT) if limit > 0 else MAX_SEARCH_LIMIT
+            found = self.index.search(params.get("q", [""])[0], limit)
+            return Antwort.json([self.overview[recipe_id] for recipe_id in found if recipe_id in self.overview])
+        if len(parts) == 2 and parts[0] == "bilder":
+            return None
+        return Antwort.error(404, f"unbekannt: {path}")
+
+class RezeptServer():
+    """Read-only HTTP API over a Kochbuch (JSON, SQLite or archive).
+
+    Every answer is serialised once per version of the book and kept as
+    bytes, including its gzip variant, up to CACHE_BUDGET bytes; a request
+    for a known target is a dict lookup and one writelines of the cached
+    headers and body. Conditional requests (If-None-Match) get a
+    304 without a body. Pictures are scaled to THUMB_WIDTHS through
+    BildCache (on disk under THUMB_PATH) and kept in memory up to
+    THUMB_BUDGET bytes. The files of the book are polled for changes;
+    the new version is loaded in a thread while the old one keeps
+    answering, then swapped in."""
+
+    def __init__(self, path):
+        self.path = path
+        self.bestand = Bestand(path)
+        self.scaler = ThreadPoolExecutor(max_workers=2)
+        self.caches = {width: BildCache(cache_path=THUMB_PATH, max_width=width, index_path=THUMB_INDEX_PATH)
+                       for width in THUMB_WIDTHS}
+        # one set of hashes of the originals for all widths, saved by close()
+        hashes = self.caches[THUMB_WIDTHS[0]].hashes
+        for cache in self.caches.values():
+            cache.hashes = hashes
+        # (source path, mtime, width) -> Antwort
+        self.thumbnails = OrderedDict()
+        self.thumbnail_bytes = 0
+
+    def respond(self, method, target, headers):
+        """Antwort for a request, or an awaitable of one for a picture which is not in memory yet."""
+        if method not in ("GET", "HEAD"):
+            return Antwort.error(405, "nur GET und HEAD")
+        bestand = self.bestand
+        antwort = bestand.antworten.get(target)
+        if antwort is not None:
+            bestand.antworten.move_to_end(target)
+            return antwort
+        path, _, query = target.partition("?")
+        antwort = bestand.answer(path, query)
+        if antwort is None:
+            return self.thumbnail(bestand, target, unquote(path.strip("/").split("/")[1]), query)
+        if antwort.status == 200:
+            self.remember(bestand, target, antwort)
+        return antwort
+
+    def remember(self, bestand, target, antwort):
+        if target in bestand.antworten:
+            return
+        bestand.antworten[target] = antwort
+        bestand.antwort_bytes += antwort.budget_size()
+        while bestand.antwort_bytes > CACHE_BUDGET and len(bestand.antworten) > 1:
+            _, old = bestand.antworten.popitem(last=False)
+            bestand.antwort_bytes -= old.budget_size()
+
+    def thumbnail(self, bestand, target, image_file, query):
+        # only pictures of the book, nothing else from Bilder/ or Quellen/
+        if image_file not in bestand.bilder or "/" in image_file or image_file.startswith("."):
+            return Antwort.error(404, f"kein Bild {image_file}")
+        src = resolve(image_file)
+        if src is None:
+            return Antwort.error(404, f"Bild {image_file} fehlt")
+        try:
+            width = int(parse_qs(query).get("breite", [DEFAULT_WIDTH])[0])
+        except ValueError:
+            width = 0
+        if width not in self.caches:
+            return Antwort.error(400, f"breite muss eine von {', '.join(map(str, THUMB_WIDTHS))} sein")
+        key = (src, os.stat(src).st_mtime_ns, width)
+        antwort = self.thumbnails.get(key)
+        if antwort is not None:
+            self.thumbnails.move_to_end(key)
+            self.remember(bestand, target, antwort)
+            return antwort
+        return self.scale(bestand, target, key, image_file)
+
+    async def scale(self, bestand, target, key, image_file):
+        def job():
+            with Messung("api.thumbnail", image=image_file, width=key[2]):
+                path = self.caches[key[2]].derivative(image_file)
+                with open(path, "rb") as f:
+                    return path, f.read()
+        path, body = await asyncio.get_running_loop().run_in_executor(self.scaler, job)
+        content_type = IMAGE_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+        antwort = Antwort(body, content_type=content_type, cache_control="max-age=86400")
+        self.thumbnails[key] = antwort
+        self.thumbnail_bytes += antwort.size
+        while self.thumbnail_bytes > THUMB_BUDGET and len(self.thumbnails) > 1:
+            _, old = self.thumbnails.popitem(last=False)
+            self.thumbnail_bytes -= old.size
+        self.remember(bestand, target, antwort)
+        return antwort
+
+    async def watch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(RELOAD_INTERVAL)
+            current = stamp(self.path)
+            if current == self.bestand.stamp:
+                continue
+            # Review_Kochbuch may still be writing the journal
+            await asyncio.sleep(RELOAD_DELAY)
+            if stamp(self.path) != current:
+                continue
+            print(f"{self.path} changed, reloading")
+            try:
+                bestand = await loop.run_in_executor(None, Bestand, self.path)
+            except Exception as e:
+                print(f"⚠️ Could not reload {self.path}: {e}", file=sys.stderr)
+                # not again before the next change
+                self.bestand.stamp = current
+                continue
+            old, self.bestand = self.bestand, bestand
+            old.close()
+            print(f"Reloaded {len(bestand.overview)} recipes")
+
+    def close(self):
+        self.scaler.shutdown()
+        self.caches[THUMB_WIDTHS[0]].save_index()
+        self.bestand.close()
+
+class Verbindung(asyncio.Protocol):
+    """One client connection: HTTP/1.1 with keep-alive and pipelining,
+    answers are written in the order of the requests."""
+
+    def __init__(self, server):
+        self.server = server
+        self.buffer = bytearray()
+        self.transport = None
+        # a picture is being scaled, later requests wait in the buffer
+        self.waiting = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.buffer += data
+        if not self.waiting:
+            self.process()
+
+    def process(self):
+        while self.transport is not None and not self.transport.is_closing():
+            end = self.buffer.find(b"\r\n\r\n")
+            if end < 0:
+                if len(self.buffer) > MAX_HEAD:
+                    self.send(Antwort.error(431, "Kopf zu groß"), False, False, False)
+                return
+            head = self.buffer[:end].decode("latin-1")
+            del self.buffer[:end + 4]
+            lines = head.split("\r\n")
+            request = lines[0].split(" ")
+            if len(request) != 3:
+                self.send(Antwort.error(400, "ungültige Anfrage"), False, False, False)
+                return
+            method, target, version = request
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+            if "content-length" in headers or "transfer-encoding" in headers:
+                # no request bodies in a read-only API
+                self.send(Antwort.error(400, "kein Inhalt erwartet"), False, False, False)
+                return
+            count("api.requests")
+            antwort = self.server.respond(method, target, headers)
+            if isinstance(antwort, Antwort):
+                self.reply(antwort, method, headers, keep_alive)
+                if not keep_alive:
+                    return
+                continue
+            self.waiting = True
+            asyncio.ensure_future(self.later(antwort, method, headers, keep_alive))
+            return
+
+    async def later(self, pending, method, headers, keep_alive):
+        try:
+            antwort = await pending
+        except Exception as e:
+            print(f"⚠️ {e}", file=sys.stderr)
+            antwort = Antwort.error(404, "Bild nicht lesbar")
+        self.waiting = False
+        if self.transport is None:
+            return
+        self.reply(antwort, method, headers, keep_alive)
+        if keep_alive:
+            self.process()
+
+    def reply(self, antwort, method, headers, keep_alive):
+        not_modified = antwort.status == 200 and headers.get("if-none-match") in (antwort.etag, "*")
+        zipped = antwort.zippable and "gzip" in headers.get("accept-encoding", "")
+        self.send(antwort, zipped, keep_alive, method == "HEAD", not_modified)
+
+    def send(self, antwort, zipped, keep_alive, head=False, not_modified=False):
+        self.transport.writelines(antwort.encode(zipped, keep_alive, head, not_modified))
+        if not keep_alive:
+            self.transport.close()
+
+    def connection_lost(self, exc):
+        self.transport = None
+
+async def serve(server, host=HOST, port=PORT):
+    loop = asyncio.get_running_loop()
+    listener = await loop.create_server(lambda: Verbindung(server), host, port, reuse_address=True)
+    watcher = asyncio.ensure_future(server.watch())
+    print(f"Serving {len(server.bestand.overview)} recipes on http://{host}:{port}/")
+    try:
+        await listener.serve_forever()
+    finally:
+        watcher.cancel()
+
+def main():
+    parser = argparse.ArgumentParser(description="Kochbuch als JSON-Schnittstelle über HTTP (nur lesend)")
+    parser.add_argument("--book", default="Kochbuch.json", help="Kochbuch.json, eine SQLite-Datenbank (*.db) oder ein Archiv (*.archiv)")
+    parser.add_argument("--host", default=HOST, help=f"Adresse (Standard {HOST}, nur dieser Rechner)")
+    parser.add_argument("--port", type=int, default=PORT, help=f"Port (Standard {PORT})")
+    parser.add_argument("--trace", nargs="?", const=TRACE_PATH, help=f"Zeitmessung als Chrome-Trace (Standard {TRACE_PATH}) und Übersicht auf stderr")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_PATH, help=f"mit cProfile messen (Standard {PROFILE_PATH})")
+    args = parser.parse_args()
+    Messung_Kochbuch.start(args.trace, args.profile)
+
+    server = RezeptServer(args.book)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    main()
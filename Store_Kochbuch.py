@@ -0,0 +1,347 @@
+import os
+import json
+import time
+import threading
+import contextlib
+
+from Messung_Kochbuch import Messung, count
+
+ID = "ID"
+NAME = "Name"
+KAPITEL = "Kapitel"
+
+BOOK_PATH = "Kochbuch.json"
+JOURNAL_SUFFIX = ".journal"
+# journal entries after which the book is rewritten and the journal emptied
+COMPACT_AFTER = 200
+# Autosave: seconds without a further change before writing, and the longest a change waits
+AUTOSAVE_DELAY = 0.5
+AUTOSAVE_MAX_DELAY = 5.0
+
+class RecipeStore():
+    """The documents of Kochbuch.json with a stable ID per recipe and
+    dict indexes by ID, name and chapter.
+
+    The store works on the documents list it is given, so
+    kochbuch["documents"] stays the list that is rendered and saved. Recipes
+    without an "ID" get the next free one. All changes have to go through
+    add/update/remove to keep the indexes consistent."""
+
+    def __init__(self, documents=None, journal=None):
+        self.documents = documents if documents is not None else []
+        # KochbuchDatei which records every change, see below
+        self.journal = journal
+        self.by_id = {}
+        self.by_name = {}     # name -> {id: None}, insertion ordered
+        self.by_chapter = {}  # chapter -> {id: None}
+        self.next_id = 1 + max((doc[ID] for doc in self.documents if isinstance(doc.get(ID), int)), default=0)
+        for doc in self.documents:
+            if not isinstance(doc.get(ID), int) or doc[ID] in self.by_id:
+                doc[ID] = self.next_id
+                self.next_id += 1
+            self.index(doc)
+
+    def index(self, doc):
+        self.by_id[doc[ID]] = doc
+        self.by_name.setdefault(doc.get(NAME), {})[doc[ID]] = None
+        self.by_chapter.setdefault(doc.get(KAPITEL), {})[doc[ID]] = None
+
+    def unindex(self, doc):
+        for index, key in ((self.by_name, doc.get(NAME)), (self.by_chapter, doc.get(KAPITEL))):
+            ids = index.get(key)
+            if ids is not None:
+                ids.pop(doc[ID], None)
+                if not ids:
+                    del index[key]
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __iter__(self):
+        return iter(self.documents)
+
+    def __contains__(self, recipe_id):
+        return recipe_id in self.by_id
+
+    def get(self, recipe_id):
+        return self.by_id.get(recipe_id)
+
+    def overview(self):
+        """(ID, Name, Kapitel) of every recipe, in book order."""
+        for doc in self.documents:
+            yield doc[ID], doc.get(NAME), doc.get(KAPITEL)
+
+    def has_name(self, name):
+        return name in self.by_name
+
+    def find(self, name):
+        """All recipes called name."""
+        return [self.by_id[i] for i in self.by_name.get(name, ())]
+
+    def chapter(self, kapitel):
+        return [self.by_id[i] for i in self.by_chapter.get(kapitel, ())]
+
+    def chapters(self):
+        return list(self.by_chapter)
+
+    def add(self, doc, recipe_id=None):
+        """Append doc to the book and return its ID."""
+        doc[ID] = recipe_id or self.next_id
+        self.next_id = max(self.next_id, doc[ID] + 1)
+        self.documents.append(doc)
+        self.index(doc)
+        if self.journal:
+            self.journal.log({"op": "add", "doc": doc})
+        return doc[ID]
+
+    def update(self, recipe_id, changes):
+        doc = self.by_id[recipe_id]
+        self.unindex(doc)
+        doc.update(changes)
+        doc[ID] = recipe_id
+        self.index(doc)
+        if self.journal:
+            self.journal.log({"op": "update", "id": recipe_id, "changes": changes})
+        return doc
+
+    def remove(self, recipe_id):
+        doc = self.by_id.pop(recipe_id)
+        self.unindex(doc)
+        # deleting is rare, a scan of the list keeps the document order intact
+        for i, other in enumerate(self.documents):
+            if other is doc:
+                del self.documents[i]
+                break
+        if self.journal:
+            self.journal.log({"op": "remove", "id": recipe_id})
+        return doc
+
+    def apply(self, entry):
+        """Replay one journal entry."""
+        if entry["op"] == "add":
+            self.add(entry["doc"], entry["doc"].get(ID))
+        elif entry["op"] == "update":
+            self.update(entry["id"], entry["changes"])
+        elif entry["op"] == "remove":
+            self.remove(entry["id"])
+
+def write_json_atomic(path, data):
+    """Write data to a temp file next to path, fsync it and rename it over
+    path, so a crash leaves either the old or the new file."""
+    tmp = f"{path}.tmp"
+    with Messung("json.dump", path=path), open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    try:
+        # make the rename itself durable (not possible on Windows)
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+class KochbuchDatei():
+    """Kochbuch.json plus an append-only journal of changes (JSON Lines in
+    Kochbuch.json.journal).
+
+    Every add/update/remove of a RecipeStore opened through load() is
+    appended to the journal and fsynced, so an edit costs the size of the
+    change instead of a rewrite of the whole book. Readers replay the journal
+    on load. save() compacts: it writes the full book atomically and
+    empties the journal. Entries carry a sequence number and the book stores
+    the last one it contains, so a crash between the two steps does not
+    apply an entry twice."""
+
+    def __init__(self, path=BOOK_PATH, compact_after=COMPACT_AFTER):
+        self.path = path
+        self.journal_path = path + JOURNAL_SUFFIX
+        self.compact_after = compact_after
+        self.seq = 0
+        self.pending = 0
+        # journal lines of the open batch(), written and fsynced together
+        self.buffer = None
+
+    def load(self, read_only=True):
+        """Read the book, replay the journal and return (data, store).
+
+        By default the files are not changed, as a reader may run next to an
+        editor: a torn journal tail is skipped instead of cut off, and the
+        store does not journal changes. Writers pass read_only=False."""
+        with Messung("json.load", path=self.path), open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        store = RecipeStore(data["documents"])
+        self.seq = data.get("seq", 0)
+        self.pending = 0
+        for entry in self.read_journal(read_only):
+            if entry["seq"] > self.seq:
+                store.apply(entry)
+                self.seq = entry["seq"]
+                self.pending += 1
+        data["total"] = len(store)
+        if not read_only:
+            store.journal = self
+        return data, store
+
+    def read_journal(self, read_only=True):
+        entries = []
+        try:
+            f = open(self.journal_path, "rb" if read_only else "r+b")
+        except FileNotFoundError:
+            return entries
+        with f:
+            good = 0
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("no line end")
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # a torn last line from a crash, cut it off so new entries start clean;
+                    # a reader leaves it, it may be a line the editor is still writing
+                    print("⚠️ Ignoring incomplete journal entry in", self.journal_path)
+                    if not read_only:
+                        f.truncate(good)
+                    break
+                good += len(line)
+        return entries
+
+    def log(self, entry):
+        self.seq += 1
+        line = json.dumps(dict(entry, seq=self.seq), ensure_ascii=False) + "\n"
+        self.pending += 1
+        if self.buffer is not None:
+            self.buffer.append(line)
+            return
+        self.write_lines([line])
+
+    def write_lines(self, lines):
+        count("journal.lines", len(lines))
+        with Messung("journal.write", lines=len(lines)), open(self.journal_path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Collect the journal entries of many changes and write them with a
+        single fsync, e.g. for a bulk import."""
+        self.buffer = []
+        try:
+            yield
+        finally:
+            lines, self.buffer = self.buffer, None
+            if lines:
+                self.write_lines(lines)
+
+    def write_buffer(self):
+        """Write the journal lines collected so far and go on collecting."""
+        if self.buffer:
+            self.write_lines(self.buffer)
+            self.buffer = []
+
+    def save(self, data):
+        """Compact: write the whole book and empty the journal."""
+        data["total"] = len(data["documents"])
+        data["seq"] = self.seq
+        write_json_atomic(self.path, data)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.pending = 0
+
+    def maybe_compact(self, data):
+        if self.pending >= self.compact_after:
+            self.save(data)
+
+class Autosave():
+    """Makes the changes of a store durable in a background thread.
+
+    The caller changes the store in memory inside change(), which holds
+    self.lock, and returns right away. The worker waits until no change
+    came for `delay` seconds (at most `max_delay` after the first one) and
+    then calls flush() under the same lock, so a burst of edits costs one
+    write. A failed flush is kept dirty and tried again; close() writes
+    what is left."""
+
+    def __init__(self, flush, delay=AUTOSAVE_DELAY, max_delay=AUTOSAVE_MAX_DELAY):
+        self.flush = flush
+        self.delay = delay
+        self.max_delay = max_delay
+        self.lock = threading.RLock()       # held while the store is changed or flushed
+        self.cond = threading.Condition()   # guards the state below
+        self.changes = 0        # changes not yet flushed
+        self.first = 0.0        # monotonic time of the oldest of them
+        self.last = 0.0         # and of the newest
+        self.saving = False
+        self.saved = None       # time.time() of the last successful flush
+        self.error = None
+        self.closing = False
+        self.thread = threading.Thread(target=self.run, name="Autosave", daemon=True)
+        self.thread.start()
+
+    @contextlib.contextmanager
+    def change(self):
+        with self.lock:
+            yield
+        with self.cond:
+            self.last = time.monotonic()
+            if not self.changes:
+                self.first = self.last
+            self.changes += 1
+            self.cond.notify()
+
+    def status(self):
+        """(unsaved changes, saving, time of the last save, last error)."""
+        with self.cond:
+            return self.changes, self.saving, self.saved, self.error
+
+    def wait_for_changes(self):
+        # returns the number of changes to flush, 0 when closed
+        with self.cond:
+            while not self.changes and not self.closing:
+                self.cond.wait()
+            while not self.closing:
+                due = min(self.last + self.delay, self.first + self.max_delay)
+                now = time.monotonic()
+                if now >= due:
+                    break
+                self.cond.wait(due - now)
+            self.saving = bool(self.changes)
+            return self.changes
+
+    def run(self):
+        while True:
+            changes = self.wait_for_changes()
+            if not changes:
+                return
+            try:
+                with self.lock, Messung("autosave.flush", changes=changes):
+                    self.flush()
+                error = None
+            except Exception as e:
+                error = e
+            with self.cond:
+                self.saving = False
+                self.error = error
+                if error is None:
+                    self.changes -= changes
+                    self.first = self.last
+                    self.saved = time.time()
+                else:
+                    # try again after the next delay
+                    self.first = self.last = time.monotonic()
+                    if self.closing:
+                        return
+
+    def close(self):
+        """Stop the worker after writing the pending changes; raises the
+        error of that last write if it failed."""
+        with self.cond:
+            self.closing = True
+            self.cond.notify()
+        self.thread.join()
+        if self.changes and self.error:
+            raise self.error
@@ -0,0 +1,165 @@
+import re
+import heapq
+import unicodedata
+from bisect import bisect_left, insort
+
+# how much a hit in each field counts for the ranking
+FIELD_WEIGHTS = {
+    "Name": 8,
+    "Kapitel": 4,
+    "Zutaten": 3,
+    "Anleitung": 1,
+    "Notes": 1,
+}
+# whole-word hits rank above prefix hits
+EXACT_BONUS = 2
+# German compounds: 'kuchen' should find 'Apfelkuchen', so word endings of
+# at least MIN_SUFFIX letters are indexed too (at half the weight)
+COMPOUND_FIELDS = ("Name", "Kapitel", "Zutaten")
+MIN_SUFFIX = 4
+
+FOLDING = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss", "é": "e", "è": "e", "à": "a"})
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# DIN 5007: umlauts sort like their base letter, see collation_key
+COLLATION = str.maketrans({"ä": "a", "ö": "o", "ü": "u", "ß": "ss", "é": "e", "è": "e", "à": "a"})
+LEADING_PATTERN = re.compile(r"^\W+")
+# accents left over by NFKD: 'brûlée' -> 'brulee', 'jalapeño' -> 'jalapeno'
+COMBINING_PATTERN = re.compile(r"[\u0300-\u036f]")
+
+def strip_accents(text):
+    """'crème fraîche' -> 'creme fraiche'."""
+    if text.isascii():
+        return text
+    return COMBINING_PATTERN.sub("", unicodedata.normalize("NFKD", text))
+
+def fold(text):
+    """Lower case with umlauts and ß spelled out and other accents removed,
+    so 'Käse', 'kaese' and 'KAESE' are the same, and so are 'Crème brûlée'
+    and 'creme brulee'."""
+    return strip_accents(str(text).lower().translate(FOLDING))
+
+def collation_key(text):
+    """Sort key for German words like a dictionary: 'Äpfel' next to 'Apfel'
+    instead of after 'Zwiebel', case, umlauts, accents and leading quotes
+    only decide between otherwise equal words."""
+    text = str(text)
+    lower = LEADING_PATTERN.sub("", text.lower())
+    return strip_accents(lower.translate(COLLATION)), lower, text
+
+def tokenize(text):
+    """Split a German text into folded words; '1-2 Eier, Mehl/Zucker' -> ['1', '2', 'eier', 'mehl', 'zucker']."""
+    return TOKEN_PATTERN.findall(fold(text))
+
+class SuchIndex():
+    """Inverted index over the recipes for the search box of Review_Kochbuch.
+
+    Every word of Name, Kapitel, Zutaten, Anleitung and Notes points to the
+    keys of the recipes containing it, weighted by field. Query words match
+    as prefixes, all words of a query have to match, results are ranked by
+    the summed weights."""
+
+    def __init__(self, recipes=None):
+        self.postings = {}   # word -> {key: weight}
+        self.words = []      # sorted vocabulary for prefix lookups
+        self.terms = {}      # key -> {word: weight}, to remove a recipe again
+        # bulk load: fill the postings first and sort the vocabulary once
+        for key, recipe in recipes or []:
+            terms = self.terms[key] = SuchIndex.recipe_terms(recipe)
+            for word, weight in terms.items():
+                self.postings.setdefault(word, {})[key] = weight
+        self.words = sorted(self.postings)
+
+    def recipe_terms(recipe):
+        terms = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            value = recipe.get(field)
+            if not value:
+                continue
+            if isinstance(value, list):
+                value = " ".join(str(v) for v in value)
+            for word in tokenize(value):
+                terms[word] = terms.get(word, 0) + weight
+                if field in COMPOUND_FIELDS:
+                    for i in range(1, len(word) - MIN_SUFFIX + 1):
+                        suffix = word[i:]
+                        terms[suffix] = terms.get(suffix, 0) + max(weight // 2, 1)
+        return terms
+
+    def add(self, key, recipe):
+        if key in self.terms:
+            self.remove(key)
+        terms = SuchIndex.recipe_terms(recipe)
+        self.terms[key] = terms
+        for word, weight in terms.items():
+            posting = self.postings.get(word)
+            if posting is None:
+                posting = self.postings[word] = {}
+                insort(self.words, word)
+            posting[key] = weight
+
+    def remove(self, key):
+        for word in self.terms.pop(key, {}):
+            posting = self.postings[word]
+            del posting[key]
+            if not posting:
+                del self.postings[word]
+                del self.words[bisect_left(self.words, word)]
+
+    update = add
+
+    def expand(self, word):
+        """All indexed words starting with word."""
+        found = []
+        for i in range(bisect_left(self.words, word), len(self.words)):
+            if not self.words[i].startswith(word):
+                break
+            found.append(self.words[i])
+        return found
+
+    def matches(self, word, candidates):
+        """{key: score} of all recipes containing one of the candidates for word."""
+        scores = {}
+        for candidate in candidates:
+            bonus = EXACT_BONUS if candidate == word else 1
+            for key, weight in self.postings[candidate].items():
+                scores[key] = scores.get(key, 0) + weight * bonus
+        return scores
+
+    def score(self, key, word, candidates):
+        """Score of word for a single recipe, 0 if it does not contain it."""
+        total = 0
+        for term, weight in self.terms[key].items():
+            if term in candidates:
+                total += weight * (EXACT_BONUS if term == word else 1)
+        return total
+
+    def search(self, query, limit=None):
+        """Keys of the recipes matching all words of query, best match first."""
+        words = tokenize(query)
+        if not words:
+            return list(self.terms)
+        expanded = []
+        for word in dict.fromkeys(words):
+            candidates = self.expand(word)
+            size = sum(len(self.postings[c]) for c in candidates)
+            if not size:
+                return []
+            expanded.append((size, word, candidates))
+        # start with the rarest word; once few recipes are left, check the
+        # remaining words per recipe instead of walking their postings
+        expanded.sort(key=lambda e: e[0])
+        size, word, candidates = expanded[0]
+        scores = self.matches(word, candidates)
+        for size, word, candidates in expanded[1:]:
+            if len(scores) * 64 < size:
+                candidates = set(candidates)
+                scores = {key: score + extra for key, score in scores.items()
+                          if (extra := self.score(key, word, candidates))}
+            else:
+                hits = self.matches(word, candidates)
+                scores = {key: score + hits[key] for key, score in scores.items() if key in hits}
+            if not scores:
+                return []
+        if limit:
+            return heapq.nlargest(limit, scores, key=scores.get)
+        return sorted(scores, key=scores.get, reverse=True)
@@ -1,22 +1,63 @@
 import os
 import re
+import sys
+import glob
 import json
+import time
+import shutil
+import hashlib
+import argparse
+import itertools
+import subprocess
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
 from Extend_Kochbuch import Kochbuch
+from Bilder_Kochbuch import BildCache, file_hash, resolve, PRINT_DPI
+from Store_Kochbuch import ID
+from Einkauf_Kochbuch import ZutatenTabelle, format_entry, format_number, select
+from Suche_Kochbuch import collation_key
+from Vorrat_Kochbuch import ZutatenIndex, positions
+from Parser_Kochbuch import HEADING_PATTERN
+import Messung_Kochbuch
+from Messung_Kochbuch import Messung, TRACE_PATH, PROFILE_PATH
 
 OUT_PATH = "Kochbuch.tex"
+OUTPUT_PATH = "Output"
 PICTURES_PATH = "Bilder"
+BUILD_PATH = "Build"
+MANIFEST_PATH = os.path.join(BUILD_PATH, "manifest.json")
+WRITE_BUFFER = 1 << 20
+LATEX_AUX_FILES = ["aux", "log", "idx", "ind", "toc", "out", "ilg", "lof"]
+# read by the next pdflatex run, kept in BUILD_PATH between builds, see build_pdf
+LATEX_KEEP_FILES = ["aux", "toc", "lof", "out"]
+AUX_PATH = os.path.join(BUILD_PATH, "Kochbuch.aux")
+LABEL_PATTERN = re.compile(r"\\newlabel\{(rezept:[^}]*)\}\{(.*)\}\s*$")
+
+# same result as re.sub(r'([#\$%&\~_\^\{\\\}])', r'\\\1', s), without the regex
+LATEX_ESCAPES = str.maketrans({c: "\\" + c for c in "#$%&~_^{}\\"})
+SPLIT_PATTERN = re.compile(r'[\r\n]+|,')
+# what item_key leaves of headings ('Für die Füllung:'), amounts ('Backpulver 1') and '+ 2 EL Sesamöl'
+NOT_AN_INGREDIENT = re.compile(r"[:\d+]")
 
 class KochbuchTex(Kochbuch):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, path="Kochbuch.json"):
+        # rendering never changes the book, see KochbuchDatei.load
+        super().__init__(path, read_only=True)
+        # Bild -> path used in the TeX, see prepare_images
+        self.image_paths = None
+        self.image_dpi = None
+        # TeX inserted before Postfix.tex, see render_einkaufsliste
+        self.appendix = ""
+        # label -> (page, anchor) of the last pdflatex run, see read_labels
+        self.labels = {}
 
     def latex_escape(s: str) -> str:
         if not isinstance(s, str):
             s = str(s)
-        
+
         # minimal escaping for common LaTeX special chars
-        return re.sub(r'([#\$%&\~_\^\{\\\}])', r'\\\1', s)
+        return s.translate(LATEX_ESCAPES)
 
     def normalize_list(field):
         if field is None:
@@ -25,7 +66,7 @@ class KochbuchTex(Kochbuch):
             return [str(x) for x in field]
         if isinstance(field, str):
             # split by newlines or commas
-            parts = [p.strip() for p in re.split(r'[\r\n]+|,', field) if p.strip()]
+            parts = [p.strip() for p in SPLIT_PATTERN.split(field) if p.strip()]
             return parts
         # fallback: try iterate
         try:
@@ -33,104 +74,613 @@ class KochbuchTex(Kochbuch):
         except Exception:
             return [str(field)]
 
-    def generate_tex(self, out_path, prefix="Prefix.tex", postfix="Postfix.tex"):    
-        with open(out_path, "w", encoding="utf-8") as f:
-            # write prefix
-            if prefix and os.path.isfile(prefix):
-                with open(prefix, "r", encoding="utf-8") as pf:
-                    f.write(pf.read() + "\n")
-
-            # read existing chapters
-            try:
-                with open("Kapitel.json", "r", encoding="utf-8") as kap_file:
-                    kapitel = json.load(kap_file)
-            except Exception:
-                kapitel = []
-
-            # collect chapters from documents
-            for doc in self.kochbuch["documents"]:
-                kap = doc.get("Kapitel", "Lost and Found")
-                if kap not in kapitel:
-                    kapitel.append(kap)
-
-            count = 0
-            with open("Kapitel.json", "w", encoding="utf-8") as kap_file:
-                json.dump(kapitel, kap_file, indent=4, ensure_ascii=False)
-
-            # loop capturse
-            for kap in kapitel:
-                kap_title = kap
-                print("Writing chapter: ", kap_title)
-                kap_title_tex = KochbuchTex.latex_escape(kap_title)
-                f.write(f"\\chapter{{{kap_title_tex}}}\n")
-
-                for doc in self.kochbuch["documents"]:
-                    if doc.get("Kapitel") != kap:
-                        continue
-                    count += 1
-                    title = doc.get("Name","Unnamed")
-                    print(f"Considering receipy {count}: ", title)
-                    # common field names                
-                    ingredients_field = doc.get("Zutaten", [])
-                    instructions_field = doc.get("Anleitung", [])
-                    notes = doc.get("Notes", "")
-                    serves = doc.get("Serves", 1)
-                    time = doc.get("Dauer", 10)
-
-                    title_tex = KochbuchTex.latex_escape(title)
-                    f.write(f"\\section{{{title_tex}}}\n")
-                    f.write(f"\\index{{{title_tex}}}\n")
-
-                    f.write("\\RecipeMeta{" + f"{serves}" + "}{" + f"{time}" + "}\n")
-
-                    ingredients = KochbuchTex.normalize_list(ingredients_field)
-                    if ingredients:
-                        f.write("\\begin{ingredients}\n")
-                        for ing in ingredients:
-                            f.write(f"  \\item {KochbuchTex.latex_escape(ing)}\n")
-                        f.write("\\end{ingredients}\n")
-
-
-                    instructions = KochbuchTex.normalize_list(instructions_field)
-                    if instructions:
-                        f.write("\\begin{directions}\n")
-                        for ing in instructions:
-                            f.write(f"  \\item {KochbuchTex.latex_escape(ing)}\n")
-                        f.write("\\end{directions}\n")
-
-                    if doc.get("Bild"):
-                        image_files = doc.get("Bild")
-                        if isinstance(image_files, list) and len(image_files) > 0:
-                            f.write("\\begin{figure}[h]\n")
-                            f.write("\\centering\n")
-                            for image_file in image_files:
-                                file_path = f"{PICTURES_PATH}/{image_file}"
-                                if os.path.isfile(file_path):
-                                    f.write(f"\\includegraphics[width=0.8\\textwidth]{{{KochbuchTex.latex_escape(file_path)}}}\n")
-                            f.write(f"\\caption{{{title_tex}}}\n")
-                            f.write("\\end{figure}\n")
-
-                    if notes:
-                        f.write("\\Notes{" + KochbuchTex.latex_escape(notes) + "}\n")
-
-                    f.write("\\newpage\n")
-            
-            # write postfix
-            if postfix and os.path.isfile(postfix):
-                with open(postfix, "r", encoding="utf-8") as pf:
-                    f.write(pf.read() + "\n")
+    def recipe_label(doc):
+        return f"rezept:{doc.get(ID)}"
+
+    def read_text(path):
+        if path and os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as pf:
+                return pf.read() + "\n"
+        return ""
+
+    def load_chapters(self):
+        # read existing chapters
+        try:
+            with open("Kapitel.json", "r", encoding="utf-8") as kap_file:
+                kapitel = json.load(kap_file)
+        except Exception:
+            kapitel = []
+
+        # collect chapters from documents
+        known = set(kapitel)
+        for doc in self.kochbuch["documents"]:
+            kap = doc.get("Kapitel", "Lost and Found")
+            if kap not in known:
+                known.add(kap)
+                kapitel.append(kap)
+
+        with open("Kapitel.json", "w", encoding="utf-8") as kap_file:
+            json.dump(kapitel, kap_file, indent=4, ensure_ascii=False)
+        return kapitel
+
+    def group_documents(self, kapitel):
+        """Bucket the documents by Kapitel in a single pass, in the order of kapitel.
+        Documents are kept in their original order within each chapter."""
+        groups = {kap: [] for kap in kapitel}
+        for doc in self.kochbuch["documents"]:
+            bucket = groups.get(doc.get("Kapitel"))
+            if bucket is not None:
+                bucket.append(doc)
+        return groups
+
+    def render_chapter(self, kap, docs, count=0, verbose=True):
+        """Yield the TeX of one chapter, one chunk per recipe."""
+        kap_title = kap
+        if verbose:
+            print("Writing chapter: ", kap_title)
+        yield f"\\chapter{{{KochbuchTex.latex_escape(kap_title)}}}\n"
+
+        # the span includes the time the consumer takes to write the chunks
+        with Messung("tex.chapter", kapitel=kap, recipes=len(docs)):
+            for doc in docs:
+                count += 1
+                if verbose:
+                    print(f"Considering receipy {count}: ", doc.get("Name","Unnamed"))
+                yield self.render_recipe(doc)
+
+    def write_chapter(self, f, kap, docs, count=0):
+        f.writelines(self.render_chapter(kap, docs, count))
+        return count + len(docs)
+
+    def render_recipe(self, doc):
+        escape = KochbuchTex.latex_escape
+        title = doc.get("Name","Unnamed")
+        # common field names
+        ingredients_field = doc.get("Zutaten", [])
+        instructions_field = doc.get("Anleitung", [])
+        notes = doc.get("Notes", "")
+        serves = doc.get("Serves", 1)
+        time = doc.get("Dauer", 10)
+
+        title_tex = escape(title)
+        out = [
+            f"\\section{{{title_tex}}}\n",
+            f"\\label{{{KochbuchTex.recipe_label(doc)}}}\n",
+            f"\\RecipeMeta{{{serves}}}{{{time}}}\n",
+        ]
+
+        ingredients = KochbuchTex.normalize_list(ingredients_field)
+        if ingredients:
+            out.append("\\begin{ingredients}\n")
+            out.extend(f"  \\item {escape(ing)}\n" for ing in ingredients)
+            out.append("\\end{ingredients}\n")
+
+        instructions = KochbuchTex.normalize_list(instructions_field)
+        if instructions:
+            out.append("\\begin{directions}\n")
+            out.extend(f"  \\item {escape(ing)}\n" for ing in instructions)
+            out.append("\\end{directions}\n")
+
+        image_files = doc.get("Bild")
+        if image_files and isinstance(image_files, list):
+            out.append("\\begin{figure}[h]\n\\centering\n")
+            for image_file in image_files:
+                if self.image_paths is not None:
+                    file_path = self.image_paths.get(image_file)
+                else:
+                    file_path = resolve(image_file)
+                if file_path:
+                    out.append(f"\\includegraphics[width=0.8\\textwidth]{{{escape(file_path)}}}\n")
+            out.append(f"\\caption{{{title_tex}}}\n\\end{{figure}}\n")
+
+        if notes:
+            out.append("\\Notes{" + escape(notes) + "}\n")
+
+        out.append("\\newpage\n")
+        return "".join(out)
+
+    def render_einkaufsliste(self, selection, portionen=None):
+        """Appendix with the shopping list for the recipes in selection (names or IDs)."""
+        escape = KochbuchTex.latex_escape
+        recipe_ids = select(self.store, selection)
+        docs = [self.store.get(recipe_id) for recipe_id in recipe_ids]
+        # a recipe picked twice is on the list twice, but in the table once
+        tabelle = ZutatenTabelle({doc[ID]: doc for doc in docs}.values())
+        out = ["\\appendix\n", "\\chapter{Einkaufsliste}\n"]
+        if portionen:
+            out.append(f"Alle Rezepte für {format_number(portionen)} Portionen:\n")
+        out.append("\\begin{itemize}[leftmargin=*]\n")
+        out.extend(f"  \\item {escape(doc.get('Name', 'Unnamed'))}\n" for doc in docs)
+        out.append("\\end{itemize}\n\\begin{itemize}[leftmargin=*]\n")
+        out.extend(f"  \\item {escape(format_entry(*entry))}\n" for entry in tabelle.einkaufsliste(recipe_ids, portionen))
+        out.append("\\end{itemize}\n\\newpage\n")
+        return "".join(out)
+
+    def page_ref(self, label):
+        found = self.labels.get(label)
+        if found is None:
+            # not typeset yet, pdflatex resolves it in the next run
+            return f"\\pageref{{{label}}}"
+        page, anchor = found
+        return f"\\hyperlink{{{anchor}}}{{{page}}}" if anchor else page
+
+    def index_initial(key):
+        """Heading of a collation_key in the index, '#' for names not starting with a letter."""
+        return key[0][0].upper() if key[0][:1].isalpha() else "#"
+
+    def index_ingredient(name):
+        """Whether name belongs into the index by ingredient: not a heading
+        line, no amount left in it and not just adjectives ('abgezogene')."""
+        return not NOT_AN_INGREDIENT.search(name) and not HEADING_PATTERN.match(name) and \
+            any(word[:1].isupper() for word in name.split())
+
+    def render_index(self, docs):
+        """The recipe index and the index by ingredient of docs (in book
+        order), sorted like a German dictionary and with the page numbers
+        of self.labels. Replaces \\index and the makeindex run."""
+        escape = KochbuchTex.latex_escape
+        initial = KochbuchTex.index_initial
+        with Messung("tex.index", recipes=len(docs)):
+            # once per recipe, the ingredient index lists a recipe once per ingredient
+            names = [doc.get("Name", "Unnamed") for doc in docs]
+            escaped = [escape(name) for name in names]
+            refs = [self.page_ref(KochbuchTex.recipe_label(doc)) for doc in docs]
+            keys = [collation_key(name) for name in names]
+            order = sorted(range(len(docs)), key=keys.__getitem__)
+            rank = [0] * len(docs)
+            for r, position in enumerate(order):
+                rank[position] = r
+
+            def entries(command, sorted_positions):
+                # recipes of the same name are one entry with all their pages
+                for _, same in itertools.groupby(sorted_positions, names.__getitem__):
+                    same = list(same)
+                    yield f"{command}{{{escaped[same[0]]}}}{{{', '.join(refs[p] for p in same)}}}\n"
+
+            out = ["\\begin{RezeptIndex}{Rezepte von A bis Z}\n"]
+            for first, group in itertools.groupby(order, lambda p: initial(keys[p])):
+                out.append(f"\\IndexGruppe{{{escape(first)}}}\n")
+                out.extend(entries("\\IndexEintrag", group))
+            out.append("\\end{RezeptIndex}\n")
+
+            # ingredients keyed like the shopping list, 'Mehl, gesiebt' is 'Mehl';
+            # spellings that differ in umlauts and accents only ('Apfel', 'Äpfel',
+            # 'Crème fraîche', 'Creme fraiche') are one entry under the most used one
+            zutaten = ZutatenIndex(docs)
+            merged = {}     # folded name -> [bits, Counter of spellings]
+            for item, bits in zutaten.bits.items():
+                name = zutaten.names[item]
+                if KochbuchTex.index_ingredient(name):
+                    entry = merged.setdefault(collation_key(name)[0], [0, Counter()])
+                    entry[0] |= bits
+                    entry[1][name] += bin(bits).count("1")
+            items = sorted((collation_key(spellings.most_common(1)[0][0]), bits) for bits, spellings in merged.values())
+            out.append("\\begin{RezeptIndex}{Rezepte nach Zutaten}\n")
+            for first, group in itertools.groupby(items, lambda entry: initial(entry[0])):
+                out.append(f"\\IndexGruppe{{{escape(first)}}}\n")
+                for key, bits in group:
+                    out.append(f"\\IndexZutat{{{escape(key[2])}}}\n")
+                    out.extend(entries("\\IndexUnter", sorted(positions(bits), key=rank.__getitem__)))
+            out.append("\\end{RezeptIndex}\n")
+        return "".join(out)
+
+    def prepare_images(self, dpi=PRINT_DPI, workers=None):
+        """Scale all pictures of the book to dpi and reference the scaled copies in the TeX."""
+        image_files = [image_file for doc in self.kochbuch["documents"]
+                       if isinstance(doc.get("Bild"), list) for image_file in doc["Bild"]]
+        with Messung("tex.images", images=len(image_files)):
+            self.image_paths = BildCache(dpi=dpi).prepare(image_files, workers)
+        self.image_dpi = dpi
+
+    def iter_tex(self, prefix="Prefix.tex", postfix="Postfix.tex", verbose=True):
+        """Yield the complete Kochbuch.tex in chunks, e.g. to pipe it into another process."""
+        yield KochbuchTex.read_text(prefix)
+
+        kapitel = self.load_chapters()
+        groups = self.group_documents(kapitel)
+
+        # loop capturse
+        count = 0
+        for kap in kapitel:
+            yield from self.render_chapter(kap, groups[kap], count, verbose)
+            count += len(groups[kap])
+
+        yield self.appendix
+        yield self.render_index([doc for kap in kapitel for doc in groups[kap]])
+        yield KochbuchTex.read_text(postfix)
+
+    def generate_tex(self, out_path, prefix="Prefix.tex", postfix="Postfix.tex"):
+        with open(out_path, "w", encoding="utf-8", buffering=WRITE_BUFFER) as f:
+            f.writelines(self.iter_tex(prefix, postfix))
+
+    # === Incremental build ===
+    def load_manifest():
+        try:
+            with open(MANIFEST_PATH, "r", encoding="utf-8") as mf:
+                return json.load(mf)
+        except Exception:
+            return {}
+
+    def save_manifest(manifest):
+        os.makedirs(BUILD_PATH, exist_ok=True)
+        with open(MANIFEST_PATH, "w", encoding="utf-8") as mf:
+            json.dump(manifest, mf, indent=4, ensure_ascii=False)
+
+    def image_hash(file_path, image_cache):
+        return file_hash(file_path, image_cache) or "missing"
+
+    def recipe_hash(doc, image_cache):
+        h = hashlib.sha1(json.dumps(dict(doc), sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        image_files = doc.get("Bild")
+        if isinstance(image_files, list):
+            for image_file in image_files:
+                file_path = resolve(image_file) or f"{PICTURES_PATH}/{image_file}"
+                h.update(f"{file_path}:{KochbuchTex.image_hash(file_path, image_cache)}".encode("utf-8"))
+        return h.hexdigest()
+
+    def chapter_file(kap):
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', str(kap)).strip('_') or "Kapitel"
+        digest = hashlib.sha1(str(kap).encode("utf-8")).hexdigest()[:8]
+        return f"{BUILD_PATH}/{slug}-{digest}.tex"
+
+    def generate_tex_incremental(self, out_path, prefix="Prefix.tex", postfix="Postfix.tex"):
+        """Write one fragment per chapter into BUILD_PATH and only rewrite the
+        fragments whose recipes (or referenced images) changed since the last
+        build. Returns the hash of the whole book, which main() compares to the
+        hash of the last successful PDF build."""
+        manifest = KochbuchTex.load_manifest()
+        image_cache = manifest.get("images", {})
+        old_chapters = manifest.get("chapters", {})
+        os.makedirs(BUILD_PATH, exist_ok=True)
+
+        kapitel = self.load_chapters()
+        groups = self.group_documents(kapitel)
+        chapters = {}
+        book_hash = hashlib.sha1()
+        count = 0
+        for kap in kapitel:
+            docs = groups[kap]
+            h = hashlib.sha1(json.dumps([kap, self.image_dpi], ensure_ascii=False).encode("utf-8"))
+            for doc in docs:
+                h.update(KochbuchTex.recipe_hash(doc, image_cache).encode("utf-8"))
+            kap_hash = h.hexdigest()
+            kap_file = KochbuchTex.chapter_file(kap)
+            chapters[str(kap)] = {"file": kap_file, "hash": kap_hash}
+            book_hash.update(f"{kap_file}:{kap_hash}".encode("utf-8"))
+
+            old = old_chapters.get(str(kap))
+            if old and old["hash"] == kap_hash and os.path.isfile(kap_file):
+                print("Chapter unchanged: ", kap)
+                count += len(docs)
+                continue
+            with open(kap_file, "w", encoding="utf-8", buffering=WRITE_BUFFER) as f:
+                count = self.write_chapter(f, kap, docs, count)
+
+        main_tex = KochbuchTex.read_text(prefix)
+        for kap in kapitel:
+            main_tex += "\\input{" + chapters[str(kap)]["file"] + "}\n"
+        main_tex += self.appendix
+        main_tex += self.render_index([doc for kap in kapitel for doc in groups[kap]])
+        main_tex += KochbuchTex.read_text(postfix)
+        book_hash.update(main_tex.encode("utf-8"))
+
+        main_hash = hashlib.sha1(main_tex.encode("utf-8")).hexdigest()
+        if manifest.get("main") != main_hash or not os.path.isfile(out_path):
+            with open(out_path, "w", encoding="utf-8") as f:
+                f.write(main_tex)
+
+        # drop fragments of chapters which no longer exist
+        for kap, old in old_chapters.items():
+            if kap not in chapters and os.path.isfile(old["file"]):
+                os.remove(old["file"])
+
+        manifest.update({
+            "main": main_hash,
+            "chapters": chapters,
+            "images": image_cache,
+            "book": book_hash.hexdigest(),
+        })
+        KochbuchTex.save_manifest(manifest)
+        return manifest["book"]
+
+def run_latex(tex_path, *options):
+    # nonstopmode so a broken recipe fails the run instead of waiting for input
+    with Messung("pdflatex", tex=tex_path):
+        result = subprocess.run(["pdflatex", "-quiet", "-interaction=nonstopmode", *options, tex_path])
+    return result.returncode == 0
+
+def split_groups(text):
+    """Top level brace groups, '{a}{b{c}}{\\}}' -> ['a', 'b{c}', '\\}']."""
+    groups = []
+    depth = 0
+    start = 0
+    escaped = False
+    for i, c in enumerate(text):
+        if escaped:
+            escaped = False
+        elif c == "\\":
+            escaped = True
+        elif c == "{":
+            if depth == 0:
+                start = i + 1
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                groups.append(text[start:i])
+    return groups
+
+def read_labels(paths, anchors=True):
+    """label -> (page, hyperref anchor) of the recipe labels in the .aux files.
+    hyperref writes \\newlabel{rezept:1}{{1.1}{7}{Name}{section.1.1}{}}."""
+    labels = {}
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as aux:
+                for line in aux:
+                    match = LABEL_PATTERN.match(line)
+                    if match:
+                        groups = split_groups(match.group(2))
+                        if len(groups) >= 2:
+                            anchor = groups[3] if anchors and len(groups) >= 4 else ""
+                            labels[match.group(1)] = (groups[1], anchor)
+        except OSError:
+            pass
+    return labels
+
+def clean_latex_files(directory="."):
+    for ext in LATEX_AUX_FILES:
+        for path in glob.glob(os.path.join(directory, f"*.{ext}")):
+            os.remove(path)
+
+def publish(path, move=False):
+    if not os.path.isfile(path):
+        print(f"❌ {path} was not created")
+        return False
+    os.makedirs(OUTPUT_PATH, exist_ok=True)
+    target = os.path.join(OUTPUT_PATH, os.path.basename(path))
+    if move:
+        os.replace(path, target)
+    else:
+        shutil.copy2(path, target)
+    return True
+
+def latex_state():
+    """Everything a pdflatex run of Kochbuch.tex reads back from the run before."""
+    return read_parts(f"Kochbuch.{ext}" for ext in LATEX_KEEP_FILES)
+
+def build_pdf(write_tex, labels, max_rounds=4):
+    """Run pdflatex until its .aux, .toc, .lof and .out stop changing.
+
+    These files of the last build are kept in BUILD_PATH and put back first,
+    so a book whose page numbers did not change needs a single run. When
+    the labels of the recipes moved, write_tex(labels) writes Kochbuch.tex
+    again with the new page numbers in the index.
+
+    Returns True if the last pdflatex run succeeded and Kochbuch.pdf was
+    published; under nonstopmode a failed run may still write a PDF, which
+    is published but must not count as up to date."""
+    for ext in LATEX_KEEP_FILES:
+        kept = os.path.join(BUILD_PATH, f"Kochbuch.{ext}")
+        if os.path.isfile(kept):
+            shutil.copy2(kept, f"Kochbuch.{ext}")
+    for _ in range(max_rounds):
+        before = latex_state()
+        ok = run_latex(OUT_PATH)
+        if latex_state() == before:
+            break
+        new_labels = read_labels(["Kochbuch.aux"])
+        if new_labels != labels:
+            labels = new_labels
+            write_tex(labels)
+    else:
+        print("Page numbers did not settle, the index may be off")
+    os.makedirs(BUILD_PATH, exist_ok=True)
+    for ext in LATEX_KEEP_FILES:
+        if os.path.isfile(f"Kochbuch.{ext}"):
+            shutil.copy2(f"Kochbuch.{ext}", os.path.join(BUILD_PATH, f"Kochbuch.{ext}"))
+    clean_latex_files()
+    if not ok:
+        print("pdflatex reported errors for ", OUT_PATH)
+    return publish("Kochbuch.pdf", move=True) and ok
+
+# === Parallel build ===
+def split_prefix(prefix="Prefix.tex"):
+    """Split the prefix into the preamble and the front matter after \begin{document}."""
+    text = KochbuchTex.read_text(prefix)
+    preamble, _, body = text.partition("\\begin{document}")
+    return preamble, body
+
+def chapter_job(kap_file):
+    return os.path.splitext(kap_file)[0] + "_kapitel"
+
+def write_chapter_document(kap_file, number, offset, preamble, body):
+    """Wrap one chapter fragment into a standalone document, starting at the
+    given chapter number and page so that its toc and lof entries and the
+    page numbers of its labels can be used for the book unchanged."""
+    # title and table of contents belong to the book only, but the toc/lof files are still written
+    body = body.replace("\\maketitle", "").replace("\\tableofcontents", "")
+    with open(chapter_job(kap_file) + ".tex", "w", encoding="utf-8") as f:
+        f.write(preamble)
+        f.write("\\begin{document}\n")
+        f.write("\\makeatletter\n")
+        f.write("\\newwrite\\tf@toc\\immediate\\openout\\tf@toc\\jobname.toc\n")
+        f.write("\\newwrite\\tf@lof\\immediate\\openout\\tf@lof\\jobname.lof\n")
+        f.write("\\makeatother\n")
+        f.write(body)
+        f.write(f"\\setcounter{{page}}{{{offset}}}\n")
+        f.write(f"\\setcounter{{chapter}}{{{number}}}\n")
+        f.write("\\input{" + kap_file + "}\n")
+        f.write("\\end{document}\n")
+
+def compile_chapter(kap_file):
+    """(pages, success) of one chapter document."""
+    job = chapter_job(kap_file)
+    ok = run_latex(job + ".tex", f"-output-directory={BUILD_PATH}")
+    if not ok:
+        print("pdflatex reported errors for ", job)
+    try:
+        with open(job + ".log", "r", encoding="utf-8", errors="replace") as log:
+            match = re.search(r"Output written on .*?\((\d+) pages?", log.read(), re.S)
+    except OSError:
+        match = None
+    return (int(match.group(1)) if match else 0), ok
+
+def read_parts(paths):
+    parts = []
+    for path in paths:
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                parts.append(f.read())
+    return "".join(parts)
+
+def build_pdf_parallel(render_index, jobs=None, prefix="Prefix.tex", postfix="Postfix.tex", max_rounds=4, appendix=""):
+    """Compile every chapter as its own document in a pool of `jobs` pdflatex
+    processes, then merge the chapter PDFs and tables of contents into
+    Kochbuch.pdf and add the appendix and the index, render_index(labels),
+    with the page numbers of the chapter documents.
+
+    The page offset of a chapter depends on the length of all chapters before
+    it, so chapters are recompiled until the offsets are stable. The offsets
+    are kept in the manifest, which makes a rebuild after a small change a
+    single round in most cases. Chapters whose last run failed are compiled
+    again. Returns True if every chapter and the book compiled."""
+    manifest = KochbuchTex.load_manifest()
+    compiled = manifest.get("compiled", {})
+    chapters = list(manifest.get("chapters", {}).items())
+    preamble, body = split_prefix(prefix)
+
+    # failed chapters are retried once per build, not in every round
+    tried = set()
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        for _ in range(max_rounds):
+            todo = []
+            offset = 1
+            for number, (kap, info) in enumerate(chapters):
+                state = compiled.get(kap, {})
+                wanted = {"hash": info["hash"], "offset": offset, "number": number}
+                if any(state.get(k) != v for k, v in wanted.items()) or \
+                        (state.get("ok") is False and kap not in tried) or \
+                        not os.path.isfile(chapter_job(info["file"]) + ".pdf"):
+                    write_chapter_document(info["file"], number, offset, preamble, body)
+                    todo.append((kap, info["file"], wanted))
+                # unknown length counts as one page until the chapter is compiled
+                offset += max(state.get("pages", 1), 1)
+            if not todo:
+                break
+            print(f"Compiling {len(todo)} chapters")
+            futures = [(kap, wanted, pool.submit(compile_chapter, kap_file)) for kap, kap_file, wanted in todo]
+            for kap, wanted, future in futures:
+                pages, ok = future.result()
+                compiled[kap] = dict(wanted, pages=pages, ok=ok)
+                tried.add(kap)
+            manifest["compiled"] = compiled
+            KochbuchTex.save_manifest(manifest)
+        else:
+            print("Page offsets did not settle, page numbers may be off")
+
+    # merge toc and list of figures of all chapters into the book
+    jobs_in_order = [chapter_job(info["file"]) for _, info in chapters]
+    for ext in ("toc", "lof"):
+        with open(f"Kochbuch.{ext}", "w", encoding="utf-8") as f:
+            f.write(read_parts(job + "." + ext for job in jobs_in_order))
+    # the links of the chapter documents do not survive \includepdf, only the page numbers
+    labels = read_labels([job + ".aux" for job in jobs_in_order], anchors=False)
+
+    book_path = os.path.join(BUILD_PATH, "Buch.tex")
+    with open(book_path, "w", encoding="utf-8") as f:
+        f.write(preamble)
+        f.write("\\usepackage{pdfpages}\n")
+        f.write("\\begin{document}")
+        f.write(body)
+        for job in jobs_in_order:
+            f.write("\\includepdf[pages=-]{" + job + ".pdf}\n")
+        f.write(appendix)
+        f.write(render_index(labels))
+        f.write(KochbuchTex.read_text(postfix))
+    ok = run_latex(book_path, "-jobname=Kochbuch")
+    if not ok:
+        print("pdflatex reported errors for ", book_path)
+    ok = ok and all(compiled.get(kap, {}).get("ok", True) for kap, _ in chapters)
+    clean_latex_files()
+    return publish("Kochbuch.pdf", move=True) and ok
 
 def main():
-    kochbuch = KochbuchTex()
-    kochbuch.generate_tex(OUT_PATH)
-    print(f"Wrote LaTeX to {OUT_PATH}")
-    os.system(f"pdflatex -quiet {OUT_PATH}")
-    os.system(f"makeindex Kochbuch.idx")
-    os.system(f"pdflatex -quiet {OUT_PATH}")
-    os.system("del *.aux *.log *.idx *.ind *.toc *.out *.ilg *.lof")
-    os.system("move Kochbuch.pdf Output")
-    os.system("move Kochbuch.tex Output")
-    os.system("copy *.json Output")
+    parser = argparse.ArgumentParser(description="Kochbuch nach LaTeX/PDF übersetzen")
+    parser.add_argument("--book", default="Kochbuch.json", help="Kochbuch.json, eine SQLite-Datenbank (*.db) oder ein Archiv (*.archiv)")
+    parser.add_argument("--stdout", action="store_true", help="TeX auf stdout ausgeben")
+    parser.add_argument("--incremental", action="store_true", help="nur geänderte Kapitel neu erzeugen")
+    parser.add_argument("--parallel", action="store_true", help="Kapitel parallel übersetzen (impliziert --incremental)")
+    parser.add_argument("--jobs", type=int, default=None, help="Anzahl paralleler pdflatex-Prozesse")
+    parser.add_argument("--dpi", type=int, default=PRINT_DPI, help="Auflösung der Bilder im PDF")
+    parser.add_argument("--original-images", action="store_true", help="Bilder unverändert einbinden")
+    parser.add_argument("--einkaufsliste", nargs="+", metavar="REZEPT", help="Einkaufsliste für diese Rezepte (Namen oder IDs) als Anhang")
+    parser.add_argument("--portionen", type=float, default=None, help="Einkaufsliste auf so viele Portionen je Rezept umrechnen")
+    parser.add_argument("--trace", nargs="?", const=TRACE_PATH, help=f"Zeitmessung als Chrome-Trace (Standard {TRACE_PATH}) und Übersicht auf stderr")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_PATH, help=f"mit cProfile messen (Standard {PROFILE_PATH})")
+    args = parser.parse_args()
+    Messung_Kochbuch.start(args.trace, args.profile)
+
+    start = time.perf_counter()
+    with Messung("tex.load", book=args.book):
+        kochbuch = KochbuchTex(args.book)
+    if args.einkaufsliste:
+        try:
+            kochbuch.appendix = kochbuch.render_einkaufsliste(args.einkaufsliste, args.portionen)
+        except KeyError as e:
+            print(f"❌ {e.args[0]}", file=sys.stderr)
+            sys.exit(1)
+    if not args.original_images:
+        kochbuch.prepare_images(args.dpi, args.jobs)
+        if not args.stdout:
+            print(f"Prepared {len(kochbuch.image_paths)} images at {args.dpi} dpi")
+    # page numbers for the index from the last build
+    kochbuch.labels = read_labels([AUX_PATH])
+    if args.stdout:
+        sys.stdout.reconfigure(encoding="utf-8")
+        sys.stdout.writelines(kochbuch.iter_tex(verbose=False))
+        return
+    if args.incremental or args.parallel:
+        book_hash = kochbuch.generate_tex_incremental(OUT_PATH)
+        print(f"Wrote LaTeX to {OUT_PATH}")
+        manifest = KochbuchTex.load_manifest()
+        if manifest.get("pdf") == book_hash and os.path.isfile(os.path.join(OUTPUT_PATH, "Kochbuch.pdf")):
+            print("Kochbuch is up to date, skipping pdflatex")
+            return
+        if args.parallel:
+            def render_index(labels):
+                kochbuch.labels = labels
+                groups = kochbuch.group_documents(kochbuch.load_chapters())
+                return kochbuch.render_index([doc for docs in groups.values() for doc in docs])
+            built = build_pdf_parallel(render_index, args.jobs, appendix=kochbuch.appendix)
+        else:
+            def write_tex(labels):
+                nonlocal book_hash
+                kochbuch.labels = labels
+                book_hash = kochbuch.generate_tex_incremental(OUT_PATH)
+            built = build_pdf(write_tex, kochbuch.labels)
+        publish(OUT_PATH)
+        if built:
+            manifest = KochbuchTex.load_manifest()
+            manifest["pdf"] = book_hash
+            KochbuchTex.save_manifest(manifest)
+        else:
+            print("Kochbuch.pdf is not recorded as up to date, the next build runs pdflatex again")
+    else:
+        kochbuch.generate_tex(OUT_PATH)
+        print(f"Wrote LaTeX to {OUT_PATH}")
+        def write_tex(labels):
+            kochbuch.labels = labels
+            kochbuch.generate_tex(OUT_PATH)
+        build_pdf(write_tex, kochbuch.labels)
+        publish(OUT_PATH, move=True)
+
+    for path in glob.glob("*.json"):
+        publish(path)
+
+    pdf_path = os.path.join(OUTPUT_PATH, "Kochbuch.pdf")
+    if os.path.isfile(pdf_path):
+        print(f"Build took {time.perf_counter() - start:.1f} s, Kochbuch.pdf has {os.path.getsize(pdf_path) / 1e6:.1f} MB")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,188 @@
+import sys
+import bisect
+import argparse
+
+from Extend_Kochbuch import Kochbuch
+from Parser_Kochbuch import ingredients
+from Einkauf_Kochbuch import item_key
+from Store_Kochbuch import ID, NAME, KAPITEL
+
+# positions of the set bits of every byte value, see positions()
+BYTE_BITS = [tuple(i for i in range(8) if byte >> i & 1) for byte in range(256)]
+
+def positions(bits):
+    """Positions of the set bits of the int bits, ascending."""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    found = []
+    for i, byte in enumerate(data):
+        if byte:
+            base = i * 8
+            found.extend(base + j for j in BYTE_BITS[byte])
+    return found
+
+def bitset(positions, size):
+    """Int with the bits at positions set. ORing bit by bit into an int
+    would copy the growing int every time, a bytearray is changed in place."""
+    data = bytearray((size + 7) // 8)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(data, "little")
+
+def as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class ZutatenIndex():
+    """Which recipes use which ingredient, as one bitset per ingredient.
+
+    A bitset is a Python int with bit i set for the recipe at position i,
+    so combining ingredients, chapters and Dauer/Serves limits is a handful
+    of AND/OR over the whole book at once instead of a loop over recipes.
+    Ingredients are keyed like the shopping list (item_key): 'Mehl',
+    '200 g Mehl' and 'Mehl, gesiebt' are the same one."""
+
+    def __init__(self, documents):
+        self.ids = []               # position -> recipe ID
+        self.names = {}             # item -> display name
+        self.items = []             # position -> items of the recipe
+        recipes = {}                # item -> positions
+        chapters = {}
+        dauer = {}
+        serves = {}
+        sizes = {}                  # number of items -> positions
+        for position, doc in enumerate(documents):
+            items = []
+            for entry in ingredients(doc):
+                name, item = item_key(entry["Zutat"] or entry["Text"])
+                if not item or item in items:
+                    continue
+                if item not in recipes:
+                    recipes[item] = []
+                    self.names[item] = name
+                recipes[item].append(position)
+                items.append(item)
+            self.ids.append(doc.get(ID))
+            self.items.append(tuple(items))
+            chapters.setdefault(doc.get(KAPITEL), []).append(position)
+            for values, value in ((dauer, as_int(doc.get("Dauer"))), (serves, as_int(doc.get("Serves")))):
+                if value is not None:
+                    values.setdefault(value, []).append(position)
+            if items:
+                sizes.setdefault(len(items), []).append(position)
+        size = len(self.ids)
+        self.all = (1 << size) - 1
+        self.bits = {item: bitset(p, size) for item, p in recipes.items()}       # item -> bitset of recipes
+        self.chapter_bits = {kap: bitset(p, size) for kap, p in chapters.items()}
+        # recipes by their number of ingredients, see cookable
+        self.size_bits = {n: bitset(p, size) for n, p in sizes.items()}
+        # cumulative bitsets: Dauer at most / Serves at least a value
+        self.dauer_values, self.dauer_upto = self.cumulative({v: bitset(p, size) for v, p in dauer.items()})
+        self.serves_values, self.serves_from = self.cumulative({v: bitset(p, size) for v, p in serves.items()}, reverse=True)
+
+    def cumulative(self, by_value, reverse=False):
+        values = sorted(by_value, reverse=reverse)
+        running = 0
+        cumulative = []
+        for value in values:
+            running |= by_value[value]
+            cumulative.append(running)
+        return values, cumulative
+
+    def __len__(self):
+        return len(self.ids)
+
+    def item(self, text):
+        """The ingredient key of text, None if no recipe uses it."""
+        item = item_key(text)[1]
+        return item if item in self.bits else None
+
+    def filter(self, kapitel=None, dauer=None, serves=None):
+        """Bitset of the recipes in kapitel, taking at most dauer minutes and for at least serves people."""
+        bits = self.all
+        if kapitel is not None:
+            bits &= self.chapter_bits.get(kapitel, 0)
+        if dauer is not None:
+            i = bisect.bisect_right(self.dauer_values, dauer)
+            bits &= self.dauer_upto[i - 1] if i else 0
+        if serves is not None:
+            # serves_values is descending
+            i = bisect.bisect_right([-v for v in self.serves_values], -serves)
+            bits &= self.serves_from[i - 1] if i else 0
+        return bits
+
+    def using_all(self, items, **limits):
+        """Bitset of the recipes which use every one of items."""
+        bits = self.filter(**limits)
+        for item in items:
+            bits &= self.bits.get(item, 0)
+        return bits
+
+    def cookable(self, pantry, max_missing=0, **limits):
+        """Bitset of the recipes which need at most max_missing ingredients
+        that are not in pantry.
+
+        Only the pantry's ingredients are walked, usually a few dozen of
+        thousands: hits[j] has the bit of a recipe set once at least j + 1
+        of its ingredients are in the pantry (a bit-sliced counter), and a
+        recipe of n ingredients needs n - max_missing hits."""
+        levels = max(self.size_bits, default=0) - max_missing
+        hits = [0] * max(levels, 0)
+        for item in set(pantry):
+            bits = self.bits.get(item, 0)
+            for j in range(levels - 1, 0, -1):
+                hits[j] |= hits[j - 1] & bits
+            if levels > 0:
+                hits[0] |= bits
+        found = 0
+        for n, bits in self.size_bits.items():
+            found |= bits if n <= max_missing else bits & hits[n - max_missing - 1]
+        return self.filter(**limits) & found
+
+    def recipes(self, bits, pantry=()):
+        """[(recipe ID, [missing ingredients])] of the bitset, fewest missing first."""
+        pantry = set(pantry)
+        found = []
+        for position in positions(bits):
+            missing = [self.names[item] for item in self.items[position] if item not in pantry]
+            found.append((self.ids[position], missing))
+        found.sort(key=lambda e: len(e[1]))
+        return found
+
+def main():
+    parser = argparse.ArgumentParser(description="Was kann ich mit meinen Vorräten kochen?")
+    parser.add_argument("zutaten", nargs="+", help="vorhandene Zutaten")
+    parser.add_argument("--book", default="Kochbuch.json", help="Kochbuch.json, eine SQLite-Datenbank (*.db) oder ein Archiv (*.archiv)")
+    parser.add_argument("--alle", action="store_true", help="stattdessen Rezepte, die alle genannten Zutaten verwenden")
+    parser.add_argument("--fehlend", type=int, default=0, help="so viele Zutaten dürfen fehlen")
+    parser.add_argument("--kapitel", default=None, help="nur Rezepte dieses Kapitels")
+    parser.add_argument("--dauer", type=int, default=None, help="höchstens so viele Minuten")
+    parser.add_argument("--portionen", type=int, default=None, help="für mindestens so viele Personen")
+    args = parser.parse_args()
+
+    kochbuch = Kochbuch(args.book, read_only=True)
+    index = ZutatenIndex(kochbuch.store)
+    sys.stdout.reconfigure(encoding="utf-8")
+    items = []
+    for text in args.zutaten:
+        item = index.item(text)
+        if item is None:
+            print(f"⚠️ Kein Rezept verwendet '{text}'", file=sys.stderr)
+        else:
+            items.append(item)
+    limits = {"kapitel": args.kapitel, "dauer": args.dauer, "serves": args.portionen}
+    if args.alle:
+        bits = index.using_all(items, **limits) if len(items) == len(args.zutaten) else 0
+    else:
+        bits = index.cookable(items, args.fehlend, **limits)
+    found = index.recipes(bits, items)
+    for recipe_id, missing in found:
+        line = f"- {kochbuch.store.get(recipe_id).get(NAME)} ({recipe_id})"
+        if missing and not args.alle:
+            line += ", fehlt: " + ", ".join(missing)
+        print(line)
+    print(f"{len(found)} Rezepte")
+
+if __name__ == "__main__":
+    main()